@@ -22,18 +22,35 @@ import threading
 import time
 import json
 
+from rdftool.goal_cache import goal_cache_from_env, goal_cache_key
+from rdftool.goal_classifier import describe_problem, goal_classifier
+from rdftool.goal_prompt import GoalAnswerStats, goal_prompt, parse_goal_answer, retry_prompt
+from rdftool.graph_backends import open_backend
+from rdftool.graph_service import GraphService
+from rdftool.memory_stats import memory_report, start_from_env
+from rdftool.metric_views import metric_views
+from rdftool.model_search import model_search
+from rdftool.ollama_pool import pool_from_env
 from rdftool.rdfCode import (
-    load_graph, get_problems, get_cover_tags, search_metrics_by_modalities, get_models_for_problem, get_models_for_problem_and_tag,
-    find_metrics_by_model, get_model_details, get_problems_for_cover_tag, get_all_metrics, get_modalities_input,
-    get_modalities_output, search_metrics_by_cover_tag
+    load_graph, get_problems, get_cover_tags, get_model_details, get_problems_for_cover_tag, get_modalities_input,
+    get_modalities_output, narrow_problems
 )
-from ollama import Client
 
 # Whether to go on spinning or interrupt
 running = False
 
-# Global variable of the graph
-graph = None
+# Ollama client kept for the node's lifetime, so tasks reuse its connections
+ollama_pool = pool_from_env()
+llm_model = "llama3"
+
+# Goals already chosen for a problem; SUSTAINML_GOAL_CACHE sets the SQLite file, empty disables it
+goal_cache = goal_cache_from_env(os.path.dirname(__file__) + '/goal_cache.sqlite')
+
+# Goals the local classifier picks with at least this confidence skip the LLM; above 1 always asks the LLM
+goal_classifier_threshold = float(os.environ.get("SUSTAINML_GOAL_CLASSIFIER_THRESHOLD", "0.6"))
+
+# How the LLM's answers to the numbered goal prompt were read, and the retries that saved
+goal_answer_stats = GoalAnswerStats()
 
 unsupported_goals = [
                 "any-to-any",
@@ -83,6 +100,42 @@ unsupported_goals = [
                 "zero-shot-object-detection"
             ]
 
+unsupported_modality = [
+                "audio",
+                "cv",
+                "multimodal",
+                "other",
+                "rl",
+                "tabular"
+            ]
+
+def load_catalog(graph_path):
+    # SUSTAINML_COMPACT_GRAPH=1 loads the queried part of the graph from a memory-mapped store instead
+    # of parsing the Turtle file: less memory in each process, but not shared by them (see compact_store)
+    compact = os.environ.get("SUSTAINML_COMPACT_GRAPH", "0") == "1"
+    # SUSTAINML_GRAPH_BACKEND picks what answers the queries: "index" (default) serves the
+    # catalog lookups from indexes built once here, "rdflib" and "oxigraph" run SPARQL every call
+    backend = os.environ.get("SUSTAINML_GRAPH_BACKEND", "index")
+    # The node loads the same graph as the provider node and leaves out unsupported goals and
+    # modalities when it lists them. SUSTAINML_DROP_UNSUPPORTED_GOALS=1 drops the unsupported goals
+    # and the models only solving them while loading instead: a smaller graph, of this process only.
+    # It stays off by default because it is not only a smaller graph:
+    # "metrics, problem: <unsupported goal>" comes back empty and the cover tag and modality metrics
+    # lose what only those models measure, where the full graph answers them as before
+    if os.environ.get("SUSTAINML_DROP_UNSUPPORTED_GOALS", "0") == "1":
+        loaded = load_graph(graph_path, compact=compact, exclude_problems=unsupported_goals)
+    else:
+        loaded = load_graph(graph_path, compact=compact)
+    catalog = open_backend(loaded, backend)
+    # Build the metric views, the model search index and the goal classifier now rather than on first use
+    metric_views(catalog)
+    model_search(catalog)
+    goal_classifier(catalog)
+    return catalog
+
+# Current graph snapshot, its initial load with retries and its hot reload; see rdftool.graph_service
+graph_service = GraphService(load_catalog)
+
 # Signal handler
 def signal_handler(sig, frame):
     print("\nExiting")
@@ -111,7 +164,6 @@ def get_llm_response(client, model_version, problem_definition, prompt):
 def task_callback(user_input, node_status, ml_model_metadata):
 
     # Callback implementation here
-    global graph
     print (f"Received Task: {user_input.task_id().problem_id()},{user_input.task_id().iteration_id()}")
 
     try:
@@ -140,30 +192,32 @@ def task_callback(user_input, node_status, ml_model_metadata):
     except Exception as e:
         print(f"No extra data was found: {e}")
 
-    client = Client(host='http://localhost:11434')
+    client = ollama_pool
+
+    # The explicit goal shortcut above does not need the graph, everything below does
+    graph = graph_service.current_graph()
+    if graph is None:
+        print(f"{graph_service.unavailable_message()}, cannot determine ML goal for task {user_input.task_id()}.")
+        ml_model_metadata.ml_model_metadata().clear()
+        error_info = {"error": f"Failed to extract metadata: {graph_service.unavailable_message()}."}
+        ml_model_metadata.extra_data(json.dumps(error_info).encode("utf-8"))
+        return
 
     # Retrieve Possible Ml Goals from graph
     try:
         raw_goals = get_problems(graph)
         inputs = [str(g) for g in raw_goals]
         goals = [goal for goal in inputs if goal not in unsupported_goals]
+        # The modality and the known inputs and outputs rule goals out before anything is asked
+        goals = narrow_problems(graph, goals, user_input.modality(), user_input.inputs(), user_input.outputs())
+        print(f"Candidate goals: {goals}")
     except Exception as e:
         print(f"Error in getting problems from MLModel graph: {e}")
         return
 
-    # Select MLGoal Using Ollama llama 3
-    prompt = f"Which of the following machine learning Goals can be used to solve this problem: {goals}?. Answer with only one of the Machine learning goals and nothing more, just the goal name without "" or ''. If you are not sure, answer with 'None'."
-    if(user_input.modality() != ""):
-        prompt = f"{prompt} Using the modality {user_input.modality()}."
-    # Add metrics to the prompt
-    if(user_input.inputs()):
-        prompt = f"{prompt} The user inputs known are {', '.join(user_input.inputs())}."
-    if(user_input.outputs()):
-        prompt = f"{prompt} The user outputs known are {', '.join(user_input.outputs())}."
-    if isinstance(user_input.minimum_samples(), int) and user_input.minimum_samples() > 0:
-        prompt = f"{prompt} Have into account that needs to have {user_input.minimum_samples()} minimum samples."
-    if isinstance(user_input.maximum_samples(), int) and user_input.maximum_samples() > 0:
-        prompt = f"{prompt} Have into account that needs to have {user_input.maximum_samples()} maximum samples."
+    # Select MLGoal Using Ollama llama 3, which answers with the number of a goal in the list
+    prompt = goal_prompt(goals, user_input.modality(), user_input.inputs(), user_input.outputs(),
+                         user_input.minimum_samples(), user_input.maximum_samples())
 
     problem = user_input.problem_short_description()
     if(user_input.problem_definition() != ""):
@@ -172,17 +226,45 @@ def task_callback(user_input, node_status, ml_model_metadata):
     print (f"Complete problem defined: {problem}")
     print (f"Complete prompt use: {prompt}")
 
+    # The same problem with the same candidate goals and model gets the goal chosen for it before
+    cache_key = goal_cache_key(user_input.problem_short_description(), user_input.problem_definition(),
+                               user_input.modality(), user_input.inputs(), user_input.outputs(),
+                               user_input.minimum_samples(), user_input.maximum_samples(), goals, llm_model)
     mlgoal = None
-    max_attempts = 3
-    attempt = 0
-    while attempt < max_attempts:
-        mlgoal = get_llm_response(client, "llama3", problem, prompt).strip().lower()
-        if mlgoal is not None and mlgoal in goals:
-            break
-        attempt += 1
-        prompt = f"Your previous answer '{mlgoal}' was not valid. {prompt}"
-        print(f"Retry {attempt}: Response '{mlgoal}' is not among available goals. Retrying...")
-        print(f"Using new prompt: {prompt}")
+    if len(goals) == 1:
+        mlgoal = goals[0]
+        print(f"Only one goal fits the modality, inputs and outputs: {mlgoal}")
+    elif goal_cache is not None:
+        mlgoal = goal_cache.get(cache_key)
+        if mlgoal is not None:
+            print(f"Goal cache hit: {mlgoal}")
+
+    if mlgoal is None:
+        # Clear-cut problems are answered locally, the LLM only gets the ones the classifier is unsure of
+        text = describe_problem(user_input.problem_short_description(), user_input.problem_definition())
+        guess, confidence = goal_classifier(graph).classify(text, goals)
+        if guess is not None and confidence >= goal_classifier_threshold:
+            mlgoal = guess
+            print(f"Goal classified locally: {mlgoal} (confidence {confidence:.2f})")
+
+    if mlgoal is None:
+        max_attempts = 3
+        attempt = 0
+        while attempt < max_attempts:
+            answer = get_llm_response(client, llm_model, problem, prompt)
+            # The number, a goal name in the answer or the closest goal name; only unreadable answers retry
+            mlgoal, how = parse_goal_answer(answer, goals)
+            goal_answer_stats.record(answer, mlgoal, how, goals)
+            if mlgoal is not None:
+                print(f"LLM answer '{answer}' read by {how}: {mlgoal}")
+                break
+            attempt += 1
+            prompt = retry_prompt(answer, goals, prompt)
+            print(f"Retry {attempt}: Response '{answer}' is not among available goals. Retrying...")
+            print(f"Using new prompt: {prompt}")
+
+        if mlgoal is not None and mlgoal in goals and goal_cache is not None:
+            goal_cache.put(cache_key, mlgoal)
 
     if mlgoal is not None and mlgoal in goals:
         ml_model_metadata.ml_model_metadata().append(mlgoal)
@@ -201,7 +283,19 @@ def task_callback(user_input, node_status, ml_model_metadata):
 def configuration_callback(req, res):
 
     # Callback for configuration implementation here
-    global graph
+    # Only the requests that query the graph wait for it, the stats requests answer while it loads
+    stats_request = req.configuration().startswith("stats, ")
+    graph = graph_service.current_graph(wait=not stats_request)
+    if graph is None and not stats_request:
+        res.node_id(req.node_id())
+        res.transaction_id(req.transaction_id())
+        error_msg = graph_service.unavailable_message()
+        res.configuration(json.dumps({"error": error_msg}))
+        res.success(False)
+        res.err_code(1) # 0: No error || 1: Error
+        print(error_msg)
+        return
+
     if req.configuration() == "modality":
         res.node_id(req.node_id())
         res.transaction_id(req.transaction_id())
@@ -209,14 +303,6 @@ def configuration_callback(req, res):
             # Retrieve Possible Ml Goals from graph
             raw_modality = get_cover_tags(graph)
             inputs = [str(m) for m in raw_modality]
-            unsupported_modality = [
-                "audio",
-                "cv",
-                "multimodal",
-                "other",
-                "rl",
-                "tabular"
-            ]
             supported_modality = [modality for modality in inputs if modality not in unsupported_modality]
             sorted_modalities = ', '.join(sorted(supported_modality))
 
@@ -250,6 +336,30 @@ def configuration_callback(req, res):
             res.success(False)
             res.err_code(1) # 0: No error || 1: Error
 
+    elif req.configuration().startswith("model_search"):
+        # Checked before the other requests, the query text may contain any of their names
+        res.node_id(req.node_id())
+        res.transaction_id(req.transaction_id())
+
+        try:
+            text = req.configuration()[len("model_search, "):]  # "model_search, <query>[, <k>]"
+            query, _, k = text.rpartition(",")
+            if query and k.strip().isdigit():
+                k = int(k)
+            else:
+                query, k = text, 10
+            models = model_search(graph).search(query, k)
+
+            # No match is an answer too, search-as-you-type asks for partial names
+            res.success(True)
+            res.err_code(0)  # 0: No error || 1: Error
+            print(f"Model search for {query.strip()}: {len(models)} models")  #debug
+            res.configuration(json.dumps(dict(models=models)))
+        except Exception as e:
+            print(f"Error searching models from request: {e}")
+            res.success(False)
+            res.err_code(1)
+
     elif "in_out_modalities" in req.configuration():
         res.node_id(req.node_id())
         res.transaction_id(req.transaction_id())
@@ -288,70 +398,32 @@ def configuration_callback(req, res):
             metric_req_type = metric_req_type.strip()
             req_type_values = req_type_values.strip()
 
+            # Precomputed per graph version, so each request is a lookup
+            views = metric_views(graph)
+
             if metric_req_type == "cover_tag":
                 parts = req_type_values.split(',')
-                if len(parts) >= 2:
-                    cover_tag = parts[0].strip()
-                    tag = parts[1].strip()
-                    metrics = search_metrics_by_cover_tag(graph, cover_tag)
-                else:
-                    cover_tag = req_type_values.strip()
-                    metrics = search_metrics_by_cover_tag(graph, cover_tag)
-
-                all_metrics = []
-                for problem, metrics_list in metrics.items():
-                    for model, m in metrics_list.items():
-                        if isinstance(m, list):
-                            for metric in m:
-                                if metric not in all_metrics:
-                                    all_metrics.append(metric)
-                        else:
-                            if m not in all_metrics:
-                                all_metrics.append(m)
-                sorted_metrics = ', '.join(sorted(all_metrics))
+                cover_tag = parts[0].strip()
+                sorted_metrics = ', '.join(views.for_cover_tag(cover_tag))
 
             elif metric_req_type == "modality":
                 input_modality, output_modality = req_type_values.split(",", 1)
                 input_modality = input_modality.strip()
                 output_modality = output_modality.strip()
-                metrics = search_metrics_by_modalities(graph, input_modality, output_modality)
-                all_metrics = []
-                for problem, metrics_list in metrics.items():
-                    for model, m in metrics_list.items():
-                        if isinstance(m, list):
-                            for metric in m:
-                                if metric not in all_metrics:
-                                    all_metrics.append(metric)
-                        else:
-                            if m not in all_metrics:
-                                all_metrics.append(m)
-                sorted_metrics = ', '.join(sorted(all_metrics))
+                sorted_metrics = ', '.join(views.for_modalities(input_modality, output_modality))
 
             elif metric_req_type == "problem":
                 parts = req_type_values.split(',')
                 if len(parts) >= 2:
                     problem_name = parts[0].strip()
                     tag = parts[1].strip()
-                    models = get_models_for_problem_and_tag(graph, problem_name, tag)
+                    sorted_metrics = ', '.join(views.for_problem(problem_name, tag))
                 else:
                     problem_name = req_type_values.strip()
-                    models = get_models_for_problem(graph, problem_name)
-
-                  # Pass problem name and tag
-                all_metrics = []
-
-                for model,downloads in models:
-                    metrics = find_metrics_by_model(graph, model)
-                    if isinstance(metrics, list):
-                        all_metrics.extend(metrics)
-                    else:
-                        all_metrics.append(metrics)
-
-                sorted_metrics = ', '.join(sorted(all_metrics))
+                    sorted_metrics = ', '.join(views.for_problem(problem_name))
 
             elif metric_req_type == "all":
-                metrics = get_all_metrics(graph)
-                sorted_metrics = ', '.join(sorted(metrics))
+                sorted_metrics = ', '.join(views.all)
 
             else:
                 res.success(False)
@@ -418,6 +490,43 @@ def configuration_callback(req, res):
             res.success(False)
             res.err_code(1)
 
+    elif req.configuration() == "stats, ollama":
+        res.node_id(req.node_id())
+        res.transaction_id(req.transaction_id())
+        res.configuration(json.dumps(dict(ollama=ollama_pool.stats())))
+        res.success(True)
+        res.err_code(0)  # 0: No error || 1: Error
+
+    elif req.configuration() == "stats, goal_cache":
+        res.node_id(req.node_id())
+        res.transaction_id(req.transaction_id())
+        stats = goal_cache.stats() if goal_cache is not None else {"enabled": False}
+        res.configuration(json.dumps(dict(goal_cache=stats)))
+        res.success(True)
+        res.err_code(0)  # 0: No error || 1: Error
+
+    elif req.configuration() == "stats, goal_prompt":
+        res.node_id(req.node_id())
+        res.transaction_id(req.transaction_id())
+        res.configuration(json.dumps(dict(goal_prompt=goal_answer_stats.stats())))
+        res.success(True)
+        res.err_code(0)  # 0: No error || 1: Error
+
+    elif req.configuration() == "stats, memory":
+        res.node_id(req.node_id())
+        res.transaction_id(req.transaction_id())
+
+        try:
+            report = memory_report(graph)
+            res.configuration(json.dumps(dict(memory=report)))
+            res.success(True)
+            res.err_code(0)  # 0: No error || 1: Error
+
+        except Exception as e:
+            print(f"Error getting memory stats from request: {e}")
+            res.success(False)
+            res.err_code(1)
+
     else:
         res.node_id(req.node_id())
         res.transaction_id(req.transaction_id())
@@ -430,8 +539,13 @@ def configuration_callback(req, res):
 
 # Main workflow routine
 def run():
-    global graph
-    graph = load_graph(os.path.dirname(__file__)+'/graph_v2.ttl')
+    # SUSTAINML_TRACE_MEMORY=1 attributes Python allocations for "stats, memory"; RSS is sampled every
+    # SUSTAINML_RSS_SAMPLE_INTERVAL seconds. Started first so the graph load is accounted for
+    start_from_env()
+    graph_path = os.path.dirname(__file__)+'/graph_v2.ttl'
+    # SUSTAINML_GRAPH_BACKGROUND_LOAD=1 brings the node up on the bus first and loads the graph concurrently
+    graph_service.start(graph_path)
+
     node = MLModelMetadataNode(callback=task_callback, service_callback=configuration_callback)
     global running
     running = True
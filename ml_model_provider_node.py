@@ -23,13 +23,28 @@ import time
 import json
 
 from rdftool.ModelONNXCodebase import model
-from rdftool.rdfCode import load_graph, get_models_for_problem, get_models_for_problem_and_tag, get_problems, get_model_details, print_models
+from rdftool.graph_backends import open_backend
+from rdftool.graph_service import GraphService
+from rdftool.memory_stats import memory_report, start_from_env
+from rdftool.rdfCode import (
+    load_graph, get_models_for_problem, get_models_for_problem_and_tag, iter_models_for_problem,
+    iter_models_for_problem_and_tag, get_problems, get_model_details, print_models
+)
 
 # Whether to go on spinning or interrupt
 running = False
 
-# Global variable of the graph
-graph = None
+def load_catalog(graph_path):
+    # SUSTAINML_COMPACT_GRAPH=1 loads the queried part of the graph from a memory-mapped store instead
+    # of parsing the Turtle file: less memory in each process, but not shared by them (see compact_store)
+    compact = os.environ.get("SUSTAINML_COMPACT_GRAPH", "0") == "1"
+    # SUSTAINML_GRAPH_BACKEND picks what answers the queries: "index" (default) serves the
+    # catalog lookups from indexes built once here, "rdflib" and "oxigraph" run SPARQL every call
+    backend = os.environ.get("SUSTAINML_GRAPH_BACKEND", "index")
+    return open_backend(load_graph(graph_path, compact=compact), backend)
+
+# Current graph snapshot, its initial load with retries and its hot reload; see rdftool.graph_service
+graph_service = GraphService(load_catalog)
 
 # Signal handler
 def signal_handler(sig, frame):
@@ -77,16 +92,20 @@ def task_callback(ml_model_metadata,
             metadata = ml_model_metadata.ml_model_metadata()[0]
 
             # Model selection and information retrieval
-            global graph
+            graph = graph_service.current_graph()
+            if graph is None:
+                raise Exception(graph_service.unavailable_message())
+
+            # Models are yielded in download order; the walk below stops at the first usable one
             if type is not None:
                 print(f"Limiting search to models with tag: {type}")
-                suggested_models = get_models_for_problem_and_tag(graph, metadata, type)
+                suggested_models = iter_models_for_problem_and_tag(graph, metadata, type)
             else:
-                suggested_models = get_models_for_problem(graph, metadata)
+                suggested_models = iter_models_for_problem(graph, metadata)
 
             # model_info = get_model_details(graph, suggested_models)
             # model_names = [info['name'] for info in model_info]
-            model_names = [model[0] for model in suggested_models]
+            model_names = (model[0] for model in suggested_models)
 
             # Random Model is selected here. In the Final code there should be some sort of selection to choose between Possible Models
             for model_use in model_names:
@@ -123,7 +142,19 @@ def task_callback(ml_model_metadata,
 def configuration_callback(req, res):
 
     # Callback for configuration implementation here
-    global graph
+    # Only the requests that query the graph wait for it, the stats requests answer while it loads
+    stats_request = req.configuration().startswith("stats, ")
+    graph = graph_service.current_graph(wait=not stats_request)
+    if graph is None and not stats_request:
+        res.node_id(req.node_id())
+        res.transaction_id(req.transaction_id())
+        error_msg = graph_service.unavailable_message()
+        res.configuration(json.dumps({"error": error_msg}))
+        res.success(False)
+        res.err_code(1) # 0: No error || 1: Error
+        print(error_msg)
+        return
+
     if 'model_from_goal' in req.configuration():
         res.node_id(req.node_id())
         res.transaction_id(req.transaction_id())
@@ -156,6 +187,21 @@ def configuration_callback(req, res):
             res.success(False)
             res.err_code(1)
 
+    elif req.configuration() == "stats, memory":
+        res.node_id(req.node_id())
+        res.transaction_id(req.transaction_id())
+
+        try:
+            report = memory_report(graph)
+            res.configuration(json.dumps(dict(memory=report)))
+            res.success(True)
+            res.err_code(0)  # 0: No error || 1: Error
+
+        except Exception as e:
+            print(f"Error getting memory stats from request: {e}")
+            res.success(False)
+            res.err_code(1)
+
     else:
         res.node_id(req.node_id())
         res.transaction_id(req.transaction_id())
@@ -168,8 +214,13 @@ def configuration_callback(req, res):
 
 # Main workflow routine
 def run():
-    global graph
-    graph = load_graph(os.path.dirname(__file__)+'/graph_v2.ttl')
+    # SUSTAINML_TRACE_MEMORY=1 attributes Python allocations for "stats, memory"; RSS is sampled every
+    # SUSTAINML_RSS_SAMPLE_INTERVAL seconds. Started first so the graph load is accounted for
+    start_from_env()
+    graph_path = os.path.dirname(__file__)+'/graph_v2.ttl'
+    # SUSTAINML_GRAPH_BACKGROUND_LOAD=1 brings the node up on the bus first and loads the graph concurrently
+    graph_service.start(graph_path)
+
     node = MLModelNode(callback=task_callback, service_callback=configuration_callback)
     global running
     running = True
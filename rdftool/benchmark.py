@@ -0,0 +1,721 @@
+"""Benchmarks for the rdftool graph helpers.
+
+Run from the repository root, e.g.:
+
+    python -m rdftool.benchmark startup graph_v2.ttl
+    python -m rdftool.benchmark index graph_v2.ttl
+    python -m rdftool.benchmark search graph_v2.ttl
+    python -m rdftool.benchmark prepared graph_v2.ttl
+    python -m rdftool.benchmark paged graph_v2.ttl
+    python -m rdftool.benchmark backends graph_v2.ttl
+    python -m rdftool.benchmark stress graph_v2.ttl --threads 1 4 16
+    python -m rdftool.benchmark shared graph_v2.ttl --processes 2
+    python -m rdftool.benchmark classifier graph_v2.ttl replay.jsonl --llm
+    python -m rdftool.benchmark scaling --sizes 1000 10000 100000 --output report.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import rdflib
+from rdflib.plugins.sparql import prepareQuery
+
+from rdftool.catalog_index import CatalogIndex
+from rdftool.compact_store import compact_path
+from rdftool.goal_classifier import GoalClassifier, describe_problem
+from rdftool.goal_prompt import GoalAnswerStats, goal_prompt, parse_goal_answer, retry_prompt
+from rdftool.graph_backends import BACKENDS, open_backend
+from rdftool.graph_generator import generate_graph
+from rdftool.graph_snapshot import ReadOnlyGraphError, SnapshotHolder
+from rdftool.memory_stats import smaps_memory
+from rdftool.ollama_pool import pool_from_env
+from rdftool.rdfCode import (
+    load_graph, get_problems, get_cover_tags,
+    get_models_for_problem, get_models_for_problem_and_tag, get_problems_for_cover_tag,
+    find_metrics_by_model, get_model_details, find_problem_by_input_modality, find_problem_by_modalities,
+    search_metrics_by_cover_tag, search_metrics_by_input_modalities, search_metrics_by_modalities,
+    get_modalities_input, get_modalities_output, get_all_metrics, get_models_with_higher_score,
+    get_models_with_max_size, iter_models_for_problem, get_models_for_problem_page,
+    get_models_for_problems, narrow_problems, QUERIES, query_stats,
+    query_cache
+)
+from rdftool.schema import CONN, METRIC, MODALITY, NAMESPACES
+
+def time_call(func, repeat):
+    ###########################################################
+    ### run func repeat times, return timings and result:   ###
+    ###########################################################
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+def print_timings(label, timings):
+    ###########################################################
+    ### print min / median / max of a list of timings:      ###
+    ###########################################################
+    print(f"{label:<28} min {min(timings) * 1000:10.2f} ms   "
+          f"median {statistics.median(timings) * 1000:10.2f} ms   "
+          f"max {max(timings) * 1000:10.2f} ms")
+
+def bench_startup(file_path, repeat):
+    ###########################################################
+    ### cold Turtle parse against binary snapshot load:     ###
+    ###########################################################
+    cold, graph = time_call(lambda: load_graph(file_path, use_snapshot=False), repeat)
+    print(f"Graph {file_path}: {len(graph)} triples")
+
+    # load_graph writes the snapshot under the key it looks it up with, without the delta
+    load_graph(file_path)
+    warm, _ = time_call(lambda: load_graph(file_path), repeat)
+
+    print_timings("cold parse", cold)
+    print_timings("snapshot load", warm)
+    print(f"Speedup (median): {statistics.median(cold) / statistics.median(warm):.1f}x")
+
+def catalog_calls(graph, sample_size):
+    ###########################################################
+    ### (label, function, args) for every indexed lookup,   ###
+    ### with arguments sampled from the graph:              ###
+    ###########################################################
+    problems = [str(p) for p in get_problems(graph)]
+    cover_tags = [str(c) for c in get_cover_tags(graph)]
+    tags = sorted({str(o) for _, _, o in graph.triples((None, CONN.hasTag, None))})[:sample_size]
+    model_names = sorted({str(o) for _, _, o in graph.triples((None, CONN.model_name, None))})[:sample_size]
+
+    calls = []
+    calls += [("get_models_for_problem", get_models_for_problem, (p,)) for p in problems]
+    calls += [("get_models_for_problem_and_tag", get_models_for_problem_and_tag, (p, t)) for p in problems for t in tags]
+    calls += [("get_problems_for_cover_tag", get_problems_for_cover_tag, (c,)) for c in cover_tags]
+    calls += [("find_metrics_by_model", find_metrics_by_model, (m,)) for m in model_names]
+    calls += [("get_model_details", get_model_details, (m,)) for m in model_names]
+
+    # thresholds spread over the value range, so range results vary from empty to everything
+    parameters = sorted(o.value for _, _, o in graph.triples((None, CONN.parameters, None)))
+    scores = sorted(float(o) for _, _, o in graph.triples((None, METRIC.hasScore, None)))
+    fractions = [i / 4 for i in range(5)]
+    calls += [("get_models_with_max_size", get_models_with_max_size, ())]
+    if parameters:
+        calls += [("get_models_with_max_size", get_models_with_max_size, (parameters[int(f * (len(parameters) - 1))],))
+                  for f in fractions]
+    metric_pairs = sorted({(str(n), str(d)) for m, _, n in graph.triples((None, METRIC.metricName, None))
+                           for d in graph.objects(m, METRIC.onDataset)})[:sample_size]
+    if scores:
+        calls += [("get_models_with_higher_score", get_models_with_higher_score,
+                   (n, d, scores[int(f * (len(scores) - 1))])) for n, d in metric_pairs for f in fractions]
+    return calls
+
+def all_calls(graph, sample_size):
+    ###########################################################
+    ### (label, function, args) for every public lookup:    ###
+    ###########################################################
+    calls = catalog_calls(graph, sample_size)
+    calls += [
+        ("get_cover_tags", get_cover_tags, ()),
+        ("get_problems", get_problems, ()),
+        ("get_modalities_input", get_modalities_input, ()),
+        ("get_modalities_output", get_modalities_output, ()),
+        ("get_all_metrics", get_all_metrics, ()),
+    ]
+    calls += [("find_problem_by_input_modality", find_problem_by_input_modality, (str(m),))
+              for m in get_modalities_input(graph)]
+    calls += [("find_problem_by_modalities", find_problem_by_modalities, (str(i), str(o)))
+              for i in get_modalities_input(graph) for o in get_modalities_output(graph)]
+    calls += [("search_metrics_by_cover_tag", search_metrics_by_cover_tag, (str(c),))
+              for c in get_cover_tags(graph)]
+    calls += [("search_metrics_by_input_modalities", search_metrics_by_input_modalities, (str(m),))
+              for m in get_modalities_input(graph)]
+    calls += [("search_metrics_by_modalities", search_metrics_by_modalities, (str(i), str(o)))
+              for i in get_modalities_input(graph) for o in get_modalities_output(graph)]
+    calls += [("get_models_for_problems", get_models_for_problems, (tuple(str(p) for p in get_problems(graph)),))]
+    calls += [("get_models_for_problem_page", get_models_for_problem_page, (str(p), 0, 10))
+              for p in get_problems(graph)]
+    return calls
+
+def bench_index(file_path, sample_size):
+    ###########################################################
+    ### indexed lookups against the SPARQL path:            ###
+    ###########################################################
+    graph = load_graph(file_path)
+    build, (index,) = time_call(lambda: [CatalogIndex(graph)], 1)
+    print(f"Graph {file_path}: {len(graph)} triples, index built in {build[0] * 1000:.2f} ms")
+
+    sparql_times = {}
+    index_times = {}
+    mismatches = 0
+    for label, func, args in catalog_calls(graph, sample_size):
+        (sparql_time,), expected = time_call(lambda: func(graph, *args), 1)
+        (index_time,), result = time_call(lambda: func(index, *args), 1)
+        sparql_times.setdefault(label, []).append(sparql_time)
+        index_times.setdefault(label, []).append(index_time)
+        if label in ("find_metrics_by_model", "get_problems_for_cover_tag",
+                     "get_models_with_max_size", "get_models_with_higher_score"):
+            # these queries have no ORDER BY
+            expected, result = sorted(expected, key=str), sorted(result, key=str)
+        if result != expected:
+            mismatches += 1
+            print(f"Mismatch in {label}{args}")
+
+    for label in sparql_times:
+        print(f"{label} ({len(sparql_times[label])} calls)")
+        print_timings("  SPARQL", sparql_times[label])
+        print_timings("  index", index_times[label])
+    print(f"Mismatches: {mismatches}")
+
+class CountingGraph:
+    """Graph proxy counting the SPARQL queries run against it."""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.queries = 0
+
+    def query(self, *args, **kwargs):
+        self.queries += 1
+        return self.graph.query(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.graph, name)
+
+def n_plus_one_search(graph, problems):
+    ###########################################################
+    ### previous search_metrics_* implementation: one query ###
+    ### per problem plus one query per model:               ###
+    ###########################################################
+    metrics_for_all_problems = {}
+    for problem in problems:
+        models_with_metrics = {}
+        for model, downloads in get_models_for_problem(graph, problem):
+            models_with_metrics[model] = find_metrics_by_model(graph, model)
+        metrics_for_all_problems[problem] = models_with_metrics
+    return metrics_for_all_problems
+
+def bench_search(file_path):
+    ###########################################################
+    ### query count and latency of search_metrics_* before  ###
+    ### and after the bulk rewrite:                         ###
+    ###########################################################
+    graph = load_graph(file_path)
+    cases = []
+    for cover_tag in get_cover_tags(graph):
+        cases.append((f"cover_tag {cover_tag}",
+                      lambda g, c=cover_tag: search_metrics_by_cover_tag(g, c),
+                      lambda g, c=cover_tag: n_plus_one_search(g, get_problems_for_cover_tag(g, c))))
+    for input_modality in sorted({str(o) for _, _, o in graph.triples((None, MODALITY.hasInput, None))}):
+        cases.append((f"input {input_modality}",
+                      lambda g, i=input_modality: search_metrics_by_input_modalities(g, i),
+                      lambda g, i=input_modality: n_plus_one_search(g, find_problem_by_input_modality(g, i))))
+        for output_modality in sorted({str(o) for _, _, o in graph.triples((None, MODALITY.hasOutput, None))}):
+            cases.append((f"modalities {input_modality} -> {output_modality}",
+                          lambda g, i=input_modality, o=output_modality: search_metrics_by_modalities(g, i, o),
+                          lambda g, i=input_modality, o=output_modality: n_plus_one_search(g, find_problem_by_modalities(g, i, o))))
+
+    print(f"Graph {file_path}: {len(graph)} triples")
+    print(f"{'case':<40} {'queries before':>15} {'ms before':>12} {'queries after':>15} {'ms after':>12}")
+    for label, bulk, n_plus_one in cases:
+        before = CountingGraph(graph)
+        (before_time,), expected = time_call(lambda: n_plus_one(before), 1)
+        after = CountingGraph(graph)
+        (after_time,), result = time_call(lambda: bulk(after), 1)
+        status = "" if normalize_metrics(result) == normalize_metrics(expected) else "  MISMATCH"
+        print(f"{label:<40} {before.queries:>15} {before_time * 1000:>12.2f} "
+              f"{after.queries:>15} {after_time * 1000:>12.2f}{status}")
+
+def normalize_metrics(metrics_for_all_problems):
+    ###########################################################
+    ### comparable form of a search_metrics_* result:       ###
+    ###########################################################
+    return {str(problem): {str(model): sorted(metrics) for model, metrics in models.items()}
+            for problem, models in metrics_for_all_problems.items()}
+
+def bench_prepared(file_path, sample_size, repeat):
+    ###########################################################
+    ### parse/translate time of every registered query      ###
+    ### against its execution time:                         ###
+    ###########################################################
+    graph = load_graph(file_path)
+    calls = all_calls(graph, sample_size)
+    for label, func, args in calls:
+        func(graph, *args)
+
+    print(f"Graph {file_path}: {len(graph)} triples")
+    print(f"{'query':<28} {'parse+translate ms':>19} {'runs':>6} {'mean exec ms':>13} {'parse share':>12}")
+    for name, stats in sorted(query_stats().items()):
+        if "{values}" in QUERIES[name]:
+            # filled in and parsed per call by run_values_query, so already part of the execution time
+            continue
+        parse, _ = time_call(lambda: prepareQuery(QUERIES[name], initNs=NAMESPACES), repeat)
+        parse_time = statistics.median(parse)
+        mean_exec = stats["execute_seconds"] / max(stats["executions"], 1)
+        # share of a call spent parsing when the query text is passed to graph.query every time
+        share = parse_time / (parse_time + mean_exec)
+        print(f"{name:<28} {parse_time * 1000:>19.2f} {stats['executions']:>6} "
+              f"{mean_exec * 1000:>13.2f} {share * 100:>11.1f}%")
+
+def bench_paged(file_path, page_size):
+    ###########################################################
+    ### full model listing against the first row of the     ###
+    ### generator and the first page, per problem:          ###
+    ###########################################################
+    graph = load_graph(file_path)
+    index = CatalogIndex(graph)
+    print(f"Graph {file_path}: {len(graph)} triples")
+    print(f"{'problem':<32} {'backend':<8} {'models':>7} {'full ms':>10} {'first ms':>10} {'page ms':>10}")
+    for problem in get_problems(graph):
+        problem = str(problem)
+        for backend, target in (("sparql", graph), ("index", index)):
+            (full_time,), models = time_call(lambda: get_models_for_problem(target, problem), 1)
+            (first_time,), first = time_call(lambda: next(iter_models_for_problem(target, problem), None), 1)
+            (page_time,), page = time_call(lambda: get_models_for_problem_page(target, problem, 0, page_size), 1)
+            status = "" if page == models[:page_size] and first == (models[0] if models else None) else "  MISMATCH"
+            print(f"{problem:<32} {backend:<8} {len(models):>7} {full_time * 1000:>10.2f} "
+                  f"{first_time * 1000:>10.2f} {page_time * 1000:>10.2f}{status}")
+
+def rss_bytes():
+    ###########################################################
+    ### resident set size of this process, from /proc:      ###
+    ###########################################################
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+# lookups whose results come in ORDER BY order; the order is part of what they return
+ORDERED_LOOKUPS = ("get_models_for_problem", "get_models_for_problem_and_tag", "get_models_for_problems",
+                   "get_models_for_problem_page")
+
+def comparable(result, ordered=False):
+    ###########################################################
+    ### type-insensitive form of a result, for backend      ###
+    ### parity checks; lists are sorted unless ordered:     ###
+    ###########################################################
+    if isinstance(result, dict):
+        return sorted((str(key), comparable(value, ordered)) for key, value in result.items())
+    if isinstance(result, list) and ordered:
+        return [comparable(value) for value in result]
+    if isinstance(result, (list, tuple, set)):
+        return sorted((comparable(value) for value in result), key=repr)
+    return str(result)
+
+def bench_backends(file_path, backends, sample_size, repeat):
+    ###########################################################
+    ### parity of every lookup across graph backends, with  ###
+    ### their build time, memory and per-lookup latency:    ###
+    ###########################################################
+    graph = load_graph(file_path)
+    print(f"Graph {file_path}: {len(graph)} triples")
+    calls = all_calls(graph, sample_size)
+
+    built = {}
+    for name in backends:
+        rss = rss_bytes()
+        (build_time,), (backend,) = time_call(lambda: [open_backend(graph, name)], 1)
+        built[name] = backend
+        print(f"{name:<10} built in {build_time * 1000:10.2f} ms, RSS +{(rss_bytes() - rss) / 2 ** 20:8.1f} MiB")
+
+    reference = backends[0]
+    timings = {name: {} for name in backends}
+    mismatches = {name: 0 for name in backends}
+    for label, func, args in calls:
+        expected = None
+        for name, backend in built.items():
+            times, result = time_call(lambda: func(backend, *args), repeat)
+            timings[name].setdefault(label, []).append(statistics.median(times))
+            if name == reference:
+                expected = comparable(result, label in ORDERED_LOOKUPS)
+            elif comparable(result, label in ORDERED_LOOKUPS) != expected:
+                mismatches[name] += 1
+                print(f"Mismatch in {label}{args}: {name} differs from {reference}")
+
+    print(f"{'lookup':<34}" + "".join(f"{name + ' ms':>14}" for name in backends))
+    for label in timings[reference]:
+        print(f"{label:<34}" + "".join(f"{statistics.median(timings[name][label]) * 1000:>14.3f}"
+                                      for name in backends))
+    for name in backends[1:]:
+        print(f"Mismatches {name} vs {reference}: {mismatches[name]}")
+
+def bench_scaling(sizes, output, backend, sample_size, repeat, seed):
+    ###########################################################
+    ### load_graph and every public lookup on generated     ###
+    ### graphs of growing size; writes a JSON report that   ###
+    ### can be diffed between versions:                     ###
+    ###########################################################
+    report = {
+        "python": platform.python_version(),
+        "rdflib": rdflib.__version__,
+        "backend": backend,
+        "seed": seed,
+        "repeat": repeat,
+        "scales": [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for models in sizes:
+            path = os.path.join(tmp, f"graph_{models}.ttl")
+            with open(path, "w", encoding="utf-8") as out:
+                triples = generate_graph(out, models, seed)
+
+            (parse_time,), graph = time_call(lambda: load_graph(path, use_snapshot=False), 1)
+            load_graph(path)
+            (snapshot_time,), graph = time_call(lambda: load_graph(path), 1)
+            # tracemalloc slows everything it traces, so peaks come from separate, untimed runs
+            load_peak = traced_peak(lambda: load_graph(path, use_snapshot=False))
+
+            (build_time,), (target,) = time_call(lambda: [open_backend(graph, backend)], 1)
+            calls = all_calls(graph, sample_size)
+            queries = {}
+            for label, func, args in calls:
+                times, _ = time_call(lambda: func(target, *args), repeat)
+                queries.setdefault(label, []).append(statistics.median(times))
+            query_peak = traced_peak(lambda: [func(target, *args) for label, func, args in calls])
+
+            scale = {
+                "models": models,
+                "triples": triples,
+                "file_bytes": os.path.getsize(path),
+                "load": {"parse_seconds": parse_time, "snapshot_seconds": snapshot_time, "peak_bytes": load_peak},
+                "backend_build_seconds": build_time,
+                "query_peak_bytes": query_peak,
+                "queries": {label: {"calls": len(times), "median_seconds": statistics.median(times),
+                                    "max_seconds": max(times)}
+                            for label, times in sorted(queries.items())},
+            }
+            report["scales"].append(scale)
+            slowest = max(scale["queries"].items(), key=lambda item: item[1]["median_seconds"])
+            print(f"{models:>9} models {triples:>10} triples: parse {parse_time:8.2f} s, "
+                  f"snapshot {snapshot_time:8.2f} s, load peak {load_peak / 2 ** 20:8.1f} MiB, "
+                  f"slowest {slowest[0]} {slowest[1]['median_seconds'] * 1000:.2f} ms")
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Report written to {output}")
+
+def _shared_worker(file_path, compact, backend, sample_size, ready, done):
+    # one node process: load, build the backend, run the catalog lookups once, then hold still to be measured
+    loaded = load_graph(file_path, compact=compact)
+    graph = open_backend(loaded, backend)
+    for label, func, args in catalog_calls(loaded, sample_size):
+        func(graph, *args)
+    ready.set()
+    done.wait()
+
+def bench_shared(file_path, backends, processes, sample_size):
+    ###########################################################
+    ### memory of several node processes serving one graph, ###
+    ### from /proc/<pid>/smaps: how much of it is pages of  ###
+    ### the compact store they all map, how much is their   ###
+    ### own (decoded terms, indexes, rdflib objects):       ###
+    ###########################################################
+    if smaps_memory() is None:
+        print("shared needs /proc/<pid>/smaps, which this system does not have")
+        return
+    # build the snapshot and the compact store once, before the processes race to
+    load_graph(file_path, compact=True)
+    store = compact_path(file_path)
+    print(f"Graph {file_path}: compact store {os.path.getsize(store) / 2 ** 20:.1f} MiB, "
+          f"{processes} processes per round")
+    print(f"{'backend':<10} {'compact':>8} {'rss MiB':>10} {'pss MiB':>10} {'private MiB':>12} "
+          f"{'store rss':>10} {'store pss':>10} {'shared %':>9}")
+
+    context = multiprocessing.get_context("spawn")
+    for backend in backends:
+        for compact in (False, True):
+            done = context.Event()
+            workers = []
+            for _ in range(processes):
+                ready = context.Event()
+                worker = context.Process(target=_shared_worker,
+                                         args=(file_path, compact, backend, sample_size, ready, done))
+                worker.start()
+                workers.append((worker, ready))
+            for worker, ready in workers:
+                while not ready.wait(1):
+                    if not worker.is_alive():
+                        done.set()
+                        raise RuntimeError(f"a {backend} worker exited before it was ready")
+            whole = [smaps_memory(worker.pid) for worker, _ in workers]
+            mapped = [smaps_memory(worker.pid, store) for worker, _ in workers]
+            done.set()
+            for worker, _ in workers:
+                worker.join()
+
+            mib = lambda values: statistics.mean(values) / 2 ** 20
+            rss = mib([m["rss_bytes"] for m in whole])
+            private = mib([m["private_clean_bytes"] + m["private_dirty_bytes"] for m in whole])
+            store_rss = mib([m["rss_bytes"] for m in mapped])
+            store_pss = mib([m["pss_bytes"] for m in mapped])
+            shared = statistics.mean(m["shared_clean_bytes"] + m["shared_dirty_bytes"] for m in mapped)
+            print(f"{backend:<10} {str(compact):>8} {rss:>10.1f} {mib([m['pss_bytes'] for m in whole]):>10.1f} "
+                  f"{private:>12.1f} {store_rss:>10.1f} {store_pss:>10.1f} "
+                  f"{shared / statistics.mean(m['rss_bytes'] for m in whole) * 100:>9.1f}")
+    print("per process means; shared % is the part of RSS that is store pages mapped by the other processes too")
+
+def bench_stress(file_path, backend, thread_counts, seconds, reload_interval, sample_size):
+    ###########################################################
+    ### concurrent lookups on published graph snapshots     ###
+    ### while new snapshots are published, checking every   ###
+    ### result against a sequential run:                    ###
+    ###########################################################
+    loaded = load_graph(file_path)
+    snapshots = SnapshotHolder()
+    graph = snapshots.publish(open_backend(loaded, backend)).graph
+    calls = all_calls(loaded, sample_size)
+    expected = [comparable(func(graph, *args)) for label, func, args in calls]
+    print(f"Graph {file_path}: {len(loaded)} triples, {backend} backend, {len(calls)} lookups")
+
+    # the oxigraph backend holds a copy of the graph and has no write methods to check
+    writable = getattr(graph, "graph", graph)
+    if hasattr(writable, "add"):
+        try:
+            writable.add((CONN.Model, CONN.Model, CONN.Model))
+            print("Warning: the published snapshot accepted a write")
+        except ReadOnlyGraphError:
+            pass
+
+    for thread_count in thread_counts:
+        deadline = time.perf_counter() + seconds
+        counts = [0] * thread_count
+        mismatches = []
+        errors = []
+        versions = set()
+
+        def reader(worker):
+            position = worker
+            while time.perf_counter() < deadline:
+                # pinned for the whole lookup, as the node callbacks do
+                snapshot = snapshots.current()
+                versions.add(snapshot.version)
+                label, func, args = calls[position % len(calls)]
+                try:
+                    result = comparable(func(snapshot.graph, *args))
+                except Exception as e:
+                    errors.append(f"{label}{args}: {e!r}")
+                else:
+                    if result != expected[position % len(calls)]:
+                        mismatches.append(f"{label}{args} on snapshot {snapshot.version}")
+                counts[worker] += 1
+                position += thread_count
+
+        def publisher():
+            while time.perf_counter() + reload_interval < deadline:
+                time.sleep(reload_interval)
+                snapshots.publish(open_backend(load_graph(file_path), backend))
+
+        threads = [threading.Thread(target=reader, args=(worker,)) for worker in range(thread_count)]
+        if reload_interval > 0:
+            threads.append(threading.Thread(target=publisher))
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        print(f"{thread_count:>3} threads: {sum(counts):8d} lookups, {sum(counts) / elapsed:10.1f} lookups/s, "
+              f"{len(versions)} snapshots seen, {len(mismatches)} mismatches, {len(errors)} errors")
+        for problem in (mismatches + errors)[:5]:
+            print(f"    {problem}")
+
+def llm_goal(pool, model, goals, record, answer_stats, max_attempts=3):
+    ###########################################################
+    ### ask the LLM for the goal of a replayed task, with   ###
+    ### the prompt, parser and retries of the metadata      ###
+    ### node:                                               ###
+    ###########################################################
+    prompt = goal_prompt(goals, record.get("modality", ""), record.get("inputs", ()), record.get("outputs", ()))
+    problem = record.get("problem_short_description", "")
+    if record.get("problem_definition"):
+        problem = f"{problem}. {record['problem_definition']}."
+    goal = None
+    for attempt in range(1, max_attempts + 1):
+        try:
+            response = pool.chat(model=model, messages=[
+                {"role": "user", "content": f"Given the following Information: \"{problem}\". {prompt}"}])
+            answer = response["message"]["content"]
+        except Exception as e:
+            print(f"Error in getting response from Ollama: {e}")
+            answer = None
+        goal, how = parse_goal_answer(answer, goals)
+        answer_stats.record(answer, goal, how, goals)
+        if goal is not None:
+            break
+        prompt = retry_prompt(answer, goals, prompt)
+    return goal, attempt
+
+def bench_classifier(file_path, replay_path, thresholds, use_llm, model):
+    ###########################################################
+    ### accuracy and latency of the local goal classifier   ###
+    ### against the LLM on a replay set of labelled tasks:  ###
+    ###########################################################
+    graph = load_graph(file_path)
+    (build_time,), classifier = time_call(lambda: GoalClassifier(graph), 1)
+    with open(replay_path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    print(f"Graph {file_path}: {len(classifier.goals)} goals, classifier built in {build_time * 1000:.1f} ms, "
+          f"{len(records)} replayed tasks")
+    pool = pool_from_env() if use_llm else None
+    answer_stats = GoalAnswerStats()
+
+    predictions = []
+    for record in records:
+        # narrowed the way the metadata node narrows them before asking
+        goals = narrow_problems(graph, classifier.goals, record.get("modality"), record.get("inputs"),
+                                record.get("outputs"))
+        text = describe_problem(record.get("problem_short_description"), record.get("problem_definition"))
+        (classify_time,), (goal, confidence) = time_call(lambda: classifier.classify(text, goals), 1)
+        llm_time, llm_answer, attempts = None, None, 0
+        if len(goals) == 1:
+            # the node answers these without the classifier or the LLM
+            goal, confidence, classify_time = goals[0], 1.0, 0.0
+            llm_time, llm_answer = 0.0, goals[0]
+        elif use_llm:
+            (llm_time,), (llm_answer, attempts) = time_call(
+                lambda: llm_goal(pool, model, goals, record, answer_stats), 1)
+        predictions.append({"expected": record["goal"], "goal": goal, "confidence": confidence,
+                            "seconds": classify_time, "llm_goal": llm_answer, "llm_seconds": llm_time,
+                            "attempts": attempts, "candidates": len(goals)})
+
+    print(f"Candidate goals per task: {statistics.mean(p['candidates'] for p in predictions):.1f} of "
+          f"{len(classifier.goals)}, {sum(p['candidates'] == 1 for p in predictions)} tasks narrowed to one")
+    print_timings("classifier", [p["seconds"] for p in predictions])
+    if use_llm:
+        print_timings("llm", [p["llm_seconds"] for p in predictions])
+        llm_correct = sum(p["llm_goal"] == p["expected"] for p in predictions)
+        print(f"LLM accuracy {llm_correct / len(predictions):.3f}")
+        # retries saved: answers the exact comparison of the old prompt would have sent back to the LLM
+        asked = [p for p in predictions if p["attempts"]]
+        stats = answer_stats.stats()
+        print(f"LLM attempts per task {statistics.mean(p['attempts'] for p in asked) if asked else 0.0:.2f}, "
+              f"retries {sum(p['attempts'] - 1 for p in asked)}, retries saved {stats['retries_saved']}, "
+              f"answers read by {stats['by_method']}")
+
+    print(f"{'threshold':>10} {'coverage':>10} {'accuracy':>10}" + (f" {'combined':>10} {'mean s':>10}" if use_llm else ""))
+    for threshold in thresholds:
+        confident = [p for p in predictions if p["goal"] is not None and p["confidence"] >= threshold]
+        correct = sum(p["goal"] == p["expected"] for p in confident)
+        line = (f"{threshold:>10.2f} {len(confident) / len(predictions):>10.3f} "
+                f"{correct / len(confident) if confident else 0.0:>10.3f}")
+        if use_llm:
+            # what the node does: the classifier's answer when confident, the LLM's otherwise
+            local = {id(p) for p in confident}
+            answered = [p["goal"] if id(p) in local else p["llm_goal"] for p in predictions]
+            combined = sum(goal == p["expected"] for goal, p in zip(answered, predictions))
+            seconds = [p["seconds"] + (0 if id(p) in local else p["llm_seconds"]) for p in predictions]
+            line += f" {combined / len(predictions):>10.3f} {statistics.mean(seconds):>10.3f}"
+        print(line)
+
+def traced_peak(func):
+    ###########################################################
+    ### peak Python memory allocated while running func:    ###
+    ###########################################################
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="rdftool benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    startup = subparsers.add_parser("startup", help="cold parse vs snapshot load of a graph file")
+    startup.add_argument("graph", help="path to the Turtle graph file")
+    startup.add_argument("--repeat", type=int, default=5)
+
+    index = subparsers.add_parser("index", help="catalog index vs SPARQL lookups")
+    index.add_argument("graph", help="path to the Turtle graph file")
+    index.add_argument("--sample-size", type=int, default=20,
+                       help="number of model names and tags to query")
+
+    search = subparsers.add_parser("search", help="query counts of the search_metrics_* functions")
+    search.add_argument("graph", help="path to the Turtle graph file")
+
+    prepared = subparsers.add_parser("prepared", help="parse/translate vs execution time per query")
+    prepared.add_argument("graph", help="path to the Turtle graph file")
+    prepared.add_argument("--sample-size", type=int, default=5,
+                          help="number of model names and tags to query")
+    prepared.add_argument("--repeat", type=int, default=5)
+
+    paged = subparsers.add_parser("paged", help="full model listing vs generator and paged variants")
+    paged.add_argument("graph", help="path to the Turtle graph file")
+    paged.add_argument("--page-size", type=int, default=10)
+
+    backends = subparsers.add_parser("backends", help="parity, latency and memory of the graph backends")
+    backends.add_argument("graph", help="path to the Turtle graph file")
+    backends.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS,
+                          help="backends to compare; the first one is the reference")
+    backends.add_argument("--sample-size", type=int, default=5,
+                          help="number of model names and tags to query")
+    backends.add_argument("--repeat", type=int, default=3)
+
+    stress = subparsers.add_parser("stress", help="concurrent lookups on graph snapshots while reloading")
+    stress.add_argument("graph", help="path to the Turtle graph file")
+    stress.add_argument("--backend", default="index", choices=BACKENDS)
+    stress.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16],
+                        help="numbers of reader threads to run, one round each")
+    stress.add_argument("--seconds", type=float, default=5.0, help="duration of each round")
+    stress.add_argument("--reload-interval", type=float, default=1.0,
+                        help="seconds between snapshot publications, 0 to never publish")
+    stress.add_argument("--sample-size", type=int, default=5,
+                        help="number of model names and tags to query")
+
+    shared = subparsers.add_parser("shared", help="memory shared between node processes mapping one compact store")
+    shared.add_argument("graph", help="path to the Turtle graph file")
+    shared.add_argument("--backends", nargs="+", default=["rdflib", "index"], choices=BACKENDS)
+    shared.add_argument("--processes", type=int, default=2, help="node processes to start per round")
+    shared.add_argument("--sample-size", type=int, default=3,
+                        help="number of model names and tags to query")
+
+    classifier = subparsers.add_parser("classifier", help="local goal classifier against the LLM on replayed tasks")
+    classifier.add_argument("graph", help="path to the Turtle graph file")
+    classifier.add_argument("replay", help="JSONL of tasks: problem_short_description, problem_definition, "
+                                           "modality, inputs, outputs and the expected goal")
+    classifier.add_argument("--thresholds", type=float, nargs="+", default=[0.2, 0.4, 0.6, 0.8, 1.0])
+    classifier.add_argument("--llm", action="store_true", help="also ask Ollama, see rdftool.ollama_pool")
+    classifier.add_argument("--model", default="llama3", help="Ollama model to ask")
+
+    scaling = subparsers.add_parser("scaling", help="load and query times on generated graphs of growing size")
+    scaling.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                         help="numbers of models to generate")
+    scaling.add_argument("--output", default="scaling_report.json", help="path of the JSON report")
+    scaling.add_argument("--backend", default="index", choices=BACKENDS)
+    scaling.add_argument("--sample-size", type=int, default=5,
+                         help="number of model names and tags to query")
+    scaling.add_argument("--repeat", type=int, default=3)
+    scaling.add_argument("--seed", type=int, default=1)
+
+    args = parser.parse_args()
+    # Measure the query paths themselves, not the result cache in front of them
+    query_cache.maxsize = 0
+    if args.command == "startup":
+        bench_startup(args.graph, args.repeat)
+    elif args.command == "index":
+        bench_index(args.graph, args.sample_size)
+    elif args.command == "search":
+        bench_search(args.graph)
+    elif args.command == "prepared":
+        bench_prepared(args.graph, args.sample_size, args.repeat)
+    elif args.command == "paged":
+        bench_paged(args.graph, args.page_size)
+    elif args.command == "backends":
+        bench_backends(args.graph, args.backends, args.sample_size, args.repeat)
+    elif args.command == "stress":
+        bench_stress(args.graph, args.backend, args.threads, args.seconds, args.reload_interval,
+                     args.sample_size)
+    elif args.command == "shared":
+        bench_shared(args.graph, args.backends, args.processes, args.sample_size)
+    elif args.command == "classifier":
+        bench_classifier(args.graph, args.replay, args.thresholds, args.llm, args.model)
+    elif args.command == "scaling":
+        bench_scaling(args.sizes, args.output, args.backend, args.sample_size, args.repeat, args.seed)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""Precomputed catalog indexes over a loaded graph.
+
+CatalogIndex walks the graph once and keeps the answers of the lookups the
+nodes run inside their DDS callbacks in plain dicts and lists, so those
+lookups no longer parse and evaluate SPARQL on every call. Pass the index
+wherever rdfCode expects a graph: the functions it covers answer from the
+index, every other function falls through to the wrapped graph. It is the
+"index" backend of graph_backends and can wrap any of the others.
+"""
+
+from array import array
+from bisect import bisect_right
+from collections import defaultdict
+
+from rdflib import RDF, XSD, BNode, Literal, URIRef
+
+from rdftool.graph_backends import GraphBackend, as_backend
+from rdftool.schema import CONN, METRIC
+
+def sparql_order_key(term):
+    """Sort key matching the ordering rdflib applies for ORDER BY."""
+    if isinstance(term, BNode):
+        return (1, term)
+    if isinstance(term, URIRef):
+        return (2, term)
+    if isinstance(term, Literal):
+        return (3, term)
+    return (0, term)
+
+def order_ranks(terms):
+    """Map each distinct term to its position in ORDER BY order."""
+    terms = set(terms)
+    datatypes = {term.datatype for term in terms if isinstance(term, Literal) and term.value is not None}
+    if len(datatypes) == 1 and all(isinstance(term, Literal) and term.value is not None for term in terms):
+        # Literals of one datatype compare by value; comparing the Python values skips
+        # rdflib's much slower Literal comparison
+        ordered = sorted(terms, key=lambda term: term.value)
+    else:
+        ordered = sorted(terms, key=sparql_order_key)
+    return {term: rank for rank, term in enumerate(ordered)}
+
+def _numeric(term):
+    # Python number of a numeric literal, None for anything else
+    if isinstance(term, Literal) and isinstance(term.value, (int, float)) and not isinstance(term.value, bool):
+        return term.value
+    return None
+
+def _sorted_columns(rows):
+    # (value, model) rows -> (array of sorted values, models in the same order)
+    rows.sort(key=lambda row: row[0])
+    return array("d", (row[0] for row in rows)), [row[1] for row in rows]
+
+def _string_literal(term, plain=False):
+    # whether the queries find term by a model name bound as an xsd:string literal: exactly,
+    # or with plain also by FILTER (?name = ?model_literal), which equals plain literals too
+    return isinstance(term, Literal) and (term.datatype == XSD.string or
+                                          plain and term.datatype is None and not term.language)
+
+def _first(values):
+    # the value ORDER BY puts first
+    return values[0] if len(values) == 1 else min(values, key=sparql_order_key)
+
+def _objects(graph, predicate):
+    values = defaultdict(list)
+    for s, _, o in graph.triples((None, predicate, None)):
+        values[s].append(o)
+    return values
+
+class CatalogIndex(GraphBackend):
+    """Dict/list indexes answering the rdfCode catalog lookups."""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.backend = as_backend(graph)
+        graph = self.backend
+
+        models = [s for s, _, _ in graph.triples((None, RDF.type, CONN.Model))]
+        model_set = set(models)
+        problems = {s for s, _, _ in graph.triples((None, RDF.type, CONN.Problem))}
+        names = _objects(graph, CONN.model_name)
+        model_problems = _objects(graph, CONN.hasProblem)
+        tags = _objects(graph, CONN.hasTag)
+        downloads = _objects(graph, CONN.downloads)
+        metrics = _objects(graph, METRIC.hasMetric)
+
+        # problem -> [(model, downloads)] and (problem, tag) -> [(model, downloads)]
+        models_by_problem = defaultdict(list)
+        models_by_problem_and_tag = defaultdict(list)
+        for model in models:
+            for problem in model_problems.get(model, ()):
+                for count in downloads.get(model, ()):
+                    row = (model, count)
+                    models_by_problem[str(problem)].append(row)
+                    for tag in tags.get(model, ()):
+                        models_by_problem_and_tag[(str(problem), str(tag))].append(row)
+        # ORDER BY DESC(?downloads) ?model
+        ranks = order_ranks(count for values in downloads.values() for count in values)
+        model_ranks = order_ranks(models)
+        by_downloads = lambda row: (-ranks[row[1]], model_ranks[row[0]])
+        self._models_by_problem = {k: sorted(v, key=by_downloads) for k, v in models_by_problem.items()}
+        self._models_by_problem_and_tag = {k: sorted(v, key=by_downloads)
+                                           for k, v in models_by_problem_and_tag.items()}
+
+        # cover tag -> [problem]
+        self._problems_by_cover_tag = defaultdict(list)
+        for problem, cover_tags in _objects(graph, CONN.hasCoverTag).items():
+            if problem in problems:
+                for cover_tag in cover_tags:
+                    self._problems_by_cover_tag[str(cover_tag)].append(problem)
+
+        # model name -> [metric] (distinct, first seen order); find_metrics_by_model binds the name as an
+        # xsd:string literal and only finds the names in _string_names, the bulk search matches any name
+        self._metrics_by_model_name = defaultdict(dict)
+        self._string_names = set()
+        for model in models:
+            for name in names.get(model, ()):
+                if _string_literal(name):
+                    self._string_names.add(str(name))
+                for metric in metrics.get(model, ()):
+                    self._metrics_by_model_name[str(name)][str(metric)] = None
+
+        # model name -> details, the first row of the ordered model_details query: only models with
+        # every detail property, of those the first model in ORDER BY order when several have the
+        # name, and for each property the model has several values of, the first in ORDER BY order
+        detail_properties = [
+            ('id', _objects(graph, CONN.model_id)),
+            ('name', None),
+            ('problem', model_problems),
+            ('coverTag', _objects(graph, CONN.hasCoverTag)),
+            ('library', _objects(graph, CONN.usesLibrary)),
+            ('downloads', downloads),
+            ('likes', _objects(graph, CONN.likes)),
+            ('lastModified', _objects(graph, CONN.lastModified)),
+        ]
+        self._details_by_model_name = {}
+        for model in sorted(models, key=model_ranks.get):
+            if not all(values.get(model) for _, values in detail_properties if values is not None):
+                continue
+            # the names FILTER (?name = ?model_literal) finds the model by
+            found_by = defaultdict(list)
+            for name in names.get(model, ()):
+                if _string_literal(name, plain=True):
+                    found_by[str(name)].append(name)
+            for name, terms in found_by.items():
+                if name not in self._details_by_model_name:
+                    self._details_by_model_name[name] = dict(
+                        model_uri=model, **{key: _first(terms if values is None else values[model])
+                                            for key, values in detail_properties})
+
+        # Range indexes: models sorted by parameter count, and per (metric name, dataset) by score
+        parameter_rows = []
+        for model, values in _objects(graph, CONN.parameters).items():
+            if model in model_set:
+                parameter_rows += [(value, str(model)) for value in map(_numeric, values) if value is not None]
+        self._parameters, self._parameter_models = _sorted_columns(parameter_rows)
+
+        metric_nodes = {s for s, _, _ in graph.triples((None, RDF.type, METRIC.Metric))}
+        metric_names = _objects(graph, METRIC.metricName)
+        datasets = _objects(graph, METRIC.onDataset)
+        scores = _objects(graph, METRIC.hasScore)
+        score_rows = defaultdict(list)
+        for model in models:
+            for metric in metrics.get(model, ()):
+                if metric not in metric_nodes:
+                    continue
+                for name in metric_names.get(metric, ()):
+                    for dataset in datasets.get(metric, ()):
+                        for value in map(_numeric, scores.get(metric, ())):
+                            if value is not None:
+                                score_rows[(str(name), str(dataset))].append((value, str(model)))
+        self._scores = {key: _sorted_columns(rows) for key, rows in score_rows.items()}
+
+    # Backend interface, so functions that are not indexed run on the wrapped backend
+    @property
+    def kind(self):
+        return self.backend.kind
+
+    @property
+    def shared_queries(self):
+        return self.backend.shared_queries
+
+    def prepare(self, text):
+        return self.backend.prepare(text)
+
+    def select(self, query, bindings=None):
+        return self.backend.select(query, bindings)
+
+    def render(self, term):
+        return self.backend.render(term)
+
+    def triples(self, triple_pattern):
+        return self.backend.triples(triple_pattern)
+
+    def namespaces(self):
+        return self.backend.namespaces()
+
+    def __len__(self):
+        return len(self.backend)
+
+    # Indexed lookups, same results as the rdfCode functions of the same name
+    def get_models_for_problem(self, problem):
+        return list(self._models_by_problem.get(str(problem), ()))
+
+    def get_models_for_problem_and_tag(self, problem, tag):
+        return list(self._models_by_problem_and_tag.get((str(problem), str(tag)), ()))
+
+    def get_models_for_problems(self, problems, tag=None):
+        if tag is None:
+            return {problem: self.get_models_for_problem(problem) for problem in problems}
+        return {problem: self.get_models_for_problem_and_tag(problem, tag) for problem in problems}
+
+    def iter_models_for_problem(self, problem):
+        return iter(self._models_by_problem.get(str(problem), ()))
+
+    def iter_models_for_problem_and_tag(self, problem, tag):
+        return iter(self._models_by_problem_and_tag.get((str(problem), str(tag)), ()))
+
+    def get_models_for_problem_page(self, problem, offset=0, limit=None):
+        stop = None if limit is None else offset + limit
+        return list(self._models_by_problem.get(str(problem), ())[offset:stop])
+
+    def get_models_for_problem_and_tag_page(self, problem, tag, offset=0, limit=None):
+        stop = None if limit is None else offset + limit
+        return list(self._models_by_problem_and_tag.get((str(problem), str(tag)), ())[offset:stop])
+
+    def get_problems_for_cover_tag(self, cover_tag):
+        return list(self._problems_by_cover_tag.get(str(cover_tag), ()))
+
+    def find_metrics_by_model(self, model_name):
+        if str(model_name) not in self._string_names:
+            return []
+        return list(self._metrics_by_model_name.get(str(model_name), ()))
+
+    def search_metrics_for_problems(self, problems):
+        return {problem: {model: list(self._metrics_by_model_name.get(str(model), ())) for model, downloads in models}
+                for problem, models in self.get_models_for_problems(problems).items()}
+
+    def get_model_details(self, model_name):
+        return dict(self._details_by_model_name.get(str(model_name), {}))
+
+    # Range lookups, O(log n + k) by bisection
+    def get_models_with_max_size(self, max_parameters=None):
+        if max_parameters is None:
+            return list(self._parameter_models)
+        return self._parameter_models[:bisect_right(self._parameters, float(max_parameters))]
+
+    def get_models_with_higher_score(self, metric_name, dataset, score_threshold):
+        values, models = self._scores.get((str(metric_name), str(dataset)), ((), []))
+        # highest scores first
+        return models[bisect_right(values, float(score_threshold)):][::-1]
@@ -0,0 +1,280 @@
+"""Compact, memory-mapped, read-only triple store.
+
+A smaller way to load the graph: only the predicates rdfCode queries are
+written, terms are interned into integer ids and triples are kept as typed
+arrays in one file, which is mapped read-only and decoded into rdflib terms
+on first use, so the Turtle-parsed graph is never built.
+
+It does not share the graph between node processes. Only the mapped pages
+are shared, and the lookups decode most of the terms into per-process
+rdflib objects, results and indexes: `python -m rdftool.benchmark shared`
+measured the shared pages at 0.3% of a node's RSS, against about 3 MiB
+per process saved by not parsing the Turtle file (300-model graph).
+
+File layout (all sections 8-byte aligned):
+
+    magic | header length (uint32) | JSON header
+    term_offsets  uint64[n_terms + 1]   offsets of each encoded term in term_blob
+    term_blob     bytes                 encoded terms, sorted, so ids follow byte order
+    spo_s, spo_p, spo_o   uint32[n_triples]   triples sorted by (s, p, o)
+    pos_p, pos_o, pos_s   uint32[n_triples]   triples sorted by (p, o, s)
+
+Each ordering is stored column by column, so a lookup is a chain of bisections
+on plain arrays. The queries always bind the predicate, so there is no
+object-first ordering; a pattern binding only the object scans the triples.
+"""
+
+import json
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+
+from rdflib import Literal, URIRef, BNode
+from rdflib.store import Store
+
+from rdftool.schema import QUERIED_PREDICATES
+
+MAGIC = b"SMLCMP02"
+COMPACT_SUFFIX = ".compact"
+
+def compact_path(file_path, variant=None):
+    """Path of the compact store built from a graph file, or from a variant of it."""
+    if variant:
+        return f"{file_path}.{variant}{COMPACT_SUFFIX}"
+    return str(file_path) + COMPACT_SUFFIX
+
+def encode_term(term):
+    """Encode an rdflib term as bytes; the first byte tells the term kind."""
+    if isinstance(term, Literal):
+        return b"\x00".join([b"L" + str(term).encode("utf-8"),
+                             str(term.datatype or "").encode("utf-8"),
+                             (term.language or "").encode("utf-8")])
+    if isinstance(term, BNode):
+        return b"B" + str(term).encode("utf-8")
+    return b"U" + str(term).encode("utf-8")
+
+def decode_term(data):
+    """Inverse of encode_term."""
+    kind = data[:1]
+    if kind == b"L":
+        value, datatype, language = data[1:].decode("utf-8").split("\x00")
+        return Literal(value, datatype=datatype or None, lang=language or None)
+    if kind == b"B":
+        return BNode(data[1:].decode("utf-8"))
+    return URIRef(data[1:].decode("utf-8"))
+
+def _align(f):
+    padding = -f.tell() % 8
+    f.write(b"\x00" * padding)
+
+def write_compact_store(graph, path, key, predicates=QUERIED_PREDICATES):
+    """Write the triples of graph whose predicate is in predicates to path."""
+    triples = [t for t in graph if predicates is None or t[1] in predicates]
+
+    encoded = {}
+    for triple in triples:
+        for term in triple:
+            if term not in encoded:
+                encoded[term] = encode_term(term)
+    blobs = sorted(set(encoded.values()))
+    blob_ids = {blob: term_id for term_id, blob in enumerate(blobs)}
+    ids = {term: blob_ids[blob] for term, blob in encoded.items()}
+
+    spo = sorted({(ids[s], ids[p], ids[o]) for s, p, o in triples})
+    pos = sorted((p, o, s) for s, p, o in spo)
+
+    offsets = array("Q", [0])
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+
+    sections = [
+        ("term_offsets", offsets.tobytes()),
+        ("term_blob", b"".join(blobs)),
+        ("spo_s", array("I", (row[0] for row in spo)).tobytes()),
+        ("spo_p", array("I", (row[1] for row in spo)).tobytes()),
+        ("spo_o", array("I", (row[2] for row in spo)).tobytes()),
+        ("pos_p", array("I", (row[0] for row in pos)).tobytes()),
+        ("pos_o", array("I", (row[1] for row in pos)).tobytes()),
+        ("pos_s", array("I", (row[2] for row in pos)).tobytes()),
+    ]
+    header = {
+        "key": key,
+        "n_terms": len(blobs),
+        "n_triples": len(spo),
+        "namespaces": [(prefix, str(namespace)) for prefix, namespace in graph.namespaces()],
+        "sections": {},
+    }
+    # Section offsets are relative to the end of the header, so they can be
+    # computed before the header size is known
+    offset = 0
+    for name, data in sections:
+        header["sections"][name] = [offset, len(data)]
+        offset += len(data) + (-len(data) % 8)
+    header_bytes = json.dumps(header).encode("utf-8")
+
+    # Write to a temporary file first so readers never map a partial store
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        _align(f)
+        for name, data in sections:
+            f.write(data)
+            _align(f)
+    os.replace(tmp_path, path)
+
+def read_compact_key(path):
+    """Return the key stored in a compact store file, or None if unreadable."""
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            (length,) = struct.unpack("<I", f.read(4))
+            return json.loads(f.read(length)).get("key")
+    except (OSError, ValueError, struct.error):
+        return None
+
+class CompactStore(Store):
+    """Read-only rdflib store backed by a file written by write_compact_store."""
+
+    context_aware = False
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = False
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a compact graph store")
+        (length,) = struct.unpack_from("<I", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(self._mmap[start:start + length])
+        base = start + length + (-(start + length) % 8)
+
+        self.key = header["key"]
+        self.n_terms = header["n_terms"]
+        self.n_triples = header["n_triples"]
+        self._sections = {}
+        view = memoryview(self._mmap)
+        for name, (offset, size) in header["sections"].items():
+            self._sections[name] = view[base + offset:base + offset + size]
+        self._offsets = self._sections["term_offsets"].cast("Q")
+        self._blob = self._sections["term_blob"]
+        self._orders = {}
+        for order in ("spo", "pos"):
+            self._orders[order] = tuple(self._sections[f"{order}_{c}"].cast("I") for c in order)
+
+        self._terms = {}
+        self._term_ids = {}
+        self._namespaces = {}
+        self._prefixes = {}
+        for prefix, namespace in header["namespaces"]:
+            self.bind(prefix, URIRef(namespace))
+
+    def close(self, commit_pending_transaction=False):
+        self._sections.clear()
+        self._offsets = self._blob = None
+        self._orders.clear()
+        self._mmap.close()
+        self._file.close()
+
+    def mapped_bytes(self):
+        """Size of the shared, memory-mapped part of the store."""
+        return len(self._mmap)
+
+    def _blob_at(self, term_id):
+        return bytes(self._blob[self._offsets[term_id]:self._offsets[term_id + 1]])
+
+    def term(self, term_id):
+        """Decode the term with the given id."""
+        term = self._terms.get(term_id)
+        if term is None:
+            term = self._terms[term_id] = decode_term(self._blob_at(term_id))
+        return term
+
+    def term_id(self, term):
+        """Id of term in the store, or None when the store does not contain it."""
+        term_id = self._term_ids.get(term)
+        if term_id is None:
+            blob = encode_term(term)
+            i = bisect_left(range(self.n_terms), blob, key=self._blob_at)
+            if i == self.n_terms or self._blob_at(i) != blob:
+                return None
+            term_id = self._term_ids[term] = i
+        return term_id
+
+    def _rows(self, order, prefix):
+        # Narrow the row range one column at a time; each column is sorted
+        # within the range selected by the previous ones
+        columns = self._orders[order]
+        lo, hi = 0, self.n_triples
+        for column, term_id in zip(columns, prefix):
+            lo = bisect_left(column, term_id, lo, hi)
+            hi = bisect_right(column, term_id, lo, hi)
+        return columns, range(lo, hi)
+
+    def triples(self, triple_pattern, context=None):
+        ids = []
+        for term in triple_pattern:
+            if term is None:
+                ids.append(None)
+                continue
+            term_id = self.term_id(term)
+            if term_id is None:
+                return
+            ids.append(term_id)
+        s, p, o = ids
+
+        if s is not None:
+            prefix = (s,) if p is None else (s, p) if o is None else (s, p, o)
+            (s_col, p_col, o_col), rows = self._rows("spo", prefix)
+        elif p is not None:
+            (p_col, o_col, s_col), rows = self._rows("pos", (p,) if o is None else (p, o))
+        else:
+            (s_col, p_col, o_col), rows = self._rows("spo", ())
+
+        term = self.term
+        for i in rows:
+            # the object alone, or with the subject, is the only pattern no ordering covers
+            if o is not None and o_col[i] != o:
+                continue
+            yield (term(s_col[i]), term(p_col[i]), term(o_col[i])), iter(())
+
+    def __len__(self, context=None):
+        return self.n_triples
+
+    def contexts(self, triple=None):
+        return iter(())
+
+    def add(self, triple, context, quoted=False):
+        raise TypeError("CompactStore is read-only")
+
+    def addN(self, quads):
+        raise TypeError("CompactStore is read-only")
+
+    def remove(self, triple, context=None):
+        raise TypeError("CompactStore is read-only")
+
+    def bind(self, prefix, namespace, override=True):
+        if not override and (prefix in self._namespaces or namespace in self._prefixes):
+            return
+        old = self._namespaces.get(prefix)
+        if old is not None:
+            self._prefixes.pop(old, None)
+        self._namespaces[prefix] = namespace
+        self._prefixes[namespace] = prefix
+
+    def namespace(self, prefix):
+        return self._namespaces.get(prefix)
+
+    def prefix(self, namespace):
+        return self._prefixes.get(namespace)
+
+    def namespaces(self):
+        yield from self._namespaces.items()
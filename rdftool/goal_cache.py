@@ -0,0 +1,161 @@
+"""Persistent cache of the ML goals the LLM picked for a problem.
+
+Users often submit the same problem again, worded the same or nearly so.
+GoalCache keeps the goal chosen for each one in a SQLite file, so the
+metadata node answers a repeated problem without asking Ollama.
+
+The key is a hash of the normalized problem fields (descriptions, modality,
+inputs, outputs, sample bounds), the set of candidate goals and the LLM
+model: a new graph with other goals, or another model, never reuses an
+answer given for different options. Entries expire after ttl seconds, and
+the least recently used ones are evicted beyond max_entries.
+
+    python -m rdftool.goal_cache goal_cache.sqlite            # stats
+    python -m rdftool.goal_cache goal_cache.sqlite --clear
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+def normalize_text(text):
+    """Lower-cased, NFKC-normalized text with runs of whitespace collapsed and outer punctuation dropped."""
+    text = unicodedata.normalize("NFKC", str(text or "")).lower()
+    return " ".join(text.split()).strip(" .,;:!?\"'")
+
+def goal_cache_key(problem_short_description, problem_definition, modality, inputs, outputs,
+                   minimum_samples, maximum_samples, goals, model):
+    """Hash of the normalized problem fields, the candidate goals and the model answering."""
+    fields = {
+        "short_description": normalize_text(problem_short_description),
+        "definition": normalize_text(problem_definition),
+        "modality": normalize_text(modality),
+        "inputs": sorted({normalize_text(i) for i in inputs or ()} - {""}),
+        "outputs": sorted({normalize_text(o) for o in outputs or ()} - {""}),
+        "minimum_samples": minimum_samples if isinstance(minimum_samples, int) and minimum_samples > 0 else None,
+        "maximum_samples": maximum_samples if isinstance(maximum_samples, int) and maximum_samples > 0 else None,
+        "goals": sorted(str(goal) for goal in goals),
+        "model": str(model),
+    }
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+class GoalCache:
+    """SQLite-backed key -> goal cache with a TTL, an LRU size cap and hit/miss counters."""
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_entries=10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # one connection shared by the callback threads, serialized by the lock
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS goals (
+                key TEXT PRIMARY KEY, goal TEXT, created REAL, last_used REAL, hits INTEGER DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS goals_last_used ON goals (last_used);
+        """)
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.stores = 0
+
+    def get(self, key):
+        """The cached goal for key, or None if there is none or it expired."""
+        now = time.time()
+        with self._lock:
+            row = self.db.execute("SELECT goal, created FROM goals WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                self.db.execute("DELETE FROM goals WHERE key = ?", (key,))
+                self.db.commit()
+                self.expired += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE goals SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self.db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, goal):
+        now = time.time()
+        with self._lock:
+            self.db.execute("INSERT OR REPLACE INTO goals (key, goal, created, last_used) VALUES (?, ?, ?, ?)",
+                            (key, goal, now, now))
+            self.stores += 1
+            (count,) = self.db.execute("SELECT COUNT(*) FROM goals").fetchone()
+            if count > self.max_entries:
+                if self.ttl:
+                    self.db.execute("DELETE FROM goals WHERE created < ?", (now - self.ttl,))
+                    (count,) = self.db.execute("SELECT COUNT(*) FROM goals").fetchone()
+                excess = count - self.max_entries
+                if excess > 0:
+                    self.db.execute("DELETE FROM goals WHERE key IN "
+                                    "(SELECT key FROM goals ORDER BY last_used LIMIT ?)", (excess,))
+                    self.evictions += excess
+            self.db.commit()
+
+    def clear(self):
+        with self._lock:
+            self.db.execute("DELETE FROM goals")
+            self.db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM goals").fetchone()[0]
+
+    def stats(self):
+        entries = len(self)
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "stores": self.stores,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+def goal_cache_from_env(default_path):
+    """GoalCache configured by the SUSTAINML_GOAL_CACHE* environment variables, or None if disabled."""
+    path = os.environ.get("SUSTAINML_GOAL_CACHE", default_path)
+    if not path:
+        return None
+    return GoalCache(path,
+                     ttl=float(os.environ.get("SUSTAINML_GOAL_CACHE_TTL", str(7 * 24 * 3600))),
+                     max_entries=int(os.environ.get("SUSTAINML_GOAL_CACHE_MAX_ENTRIES", "10000")))
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear a goal cache file")
+    parser.add_argument("cache", help="path to the goal cache SQLite file")
+    parser.add_argument("--clear", action="store_true", help="remove every cached goal")
+    args = parser.parse_args()
+
+    cache = GoalCache(args.cache)
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {args.cache}")
+    rows = cache.db.execute("SELECT goal, COUNT(*), SUM(hits) FROM goals GROUP BY goal ORDER BY COUNT(*) DESC")
+    print(f"{len(cache)} cached problems")
+    for goal, count, hits in rows:
+        print(f"{goal:<40} {count:>8} problems {hits:>8} hits")
+    cache.close()
+
+if __name__ == '__main__':
+    main()
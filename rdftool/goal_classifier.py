@@ -0,0 +1,196 @@
+"""Local goal classifier answering the clear-cut problems without the LLM.
+
+Most problem descriptions name their goal plainly ("summarize these
+reports", "translate to German"). GoalClassifier scores a description
+against every candidate goal with TF-IDF over a small document per goal:
+
+    - the words of the goal name ("text-to-speech" -> text, to, speech)
+    - hand-written keywords for the common goals (KEYWORDS)
+    - the tags and name words of the goal's models in the graph
+
+Words are stemmed crudely so "summarize", "summary" and "summarization"
+meet. classify() returns the best goal with a confidence, the margin of
+its score over the runner-up; the metadata node only skips the LLM when
+that confidence reaches a threshold. A margin alone says nothing when a
+single stray word matches one goal and nothing else ("detect fraud"
+scoring only for object-detection), so the confidence is 0 unless the
+description matches at least MIN_EVIDENCE separate words or phrases of
+the best goal and scores at least MIN_SCORE against it.
+
+    python -m rdftool.goal_classifier graph_v2.ttl "Summarize long news articles"
+"""
+
+import argparse
+import math
+import re
+import time
+from collections import Counter
+
+from rdftool.graph_backends import as_backend
+from rdftool.query_cache import built_for_graph, graph_version
+from rdftool.rdfCode import get_problems
+from rdftool.schema import CONN
+
+# words and phrases users write for a goal that its name does not contain
+KEYWORDS = {
+    "text-generation": "generate, write, compose, story, essay, chatbot, chat, assistant, continue, completion, "
+                       "llm, dialogue",
+    "summarization": "summarize, summary, abstract, shorten, condense, tldr, digest, key points",
+    "translation": "translate, language, english, spanish, german, french, chinese, multilingual",
+    "text-classification": "classify, sentiment, spam, topic, categorize, label, review, positive, negative",
+    "token-classification": "named entity, ner, tag, tokens, part of speech, pos",
+    "question-answering": "answer, question, questions, qa, faq, context, extractive",
+    "fill-mask": "mask, missing word, fill blank",
+    "text2text-generation": "rewrite, paraphrase, transform, correct, grammar",
+    "sentence-similarity": "similar, similarity, semantic, embedding, compare, sentences, duplicate",
+    "feature-extraction": "embedding, embeddings, vector, features, representation",
+    "zero-shot-classification": "zero shot, unseen labels",
+    "image-classification": "image, photo, picture, classify, recognize, category",
+    "object-detection": "detect, detection, locate, bounding box, boxes, objects",
+    "image-segmentation": "segment, segmentation, mask, pixels, regions",
+    "image-to-text": "caption, describe, image, photo, picture",
+    "text-to-image": "generate, image, picture, draw, illustration, art",
+    "automatic-speech-recognition": "transcribe, transcription, speech, audio, voice, dictation, asr",
+    "text-to-speech": "speak, voice, read aloud, synthesize, speech, tts, audio",
+    "audio-classification": "audio, sound, classify, sounds, music, genre",
+    "time-series-forecasting": "forecast, predict, future, time series, trend, demand",
+    "tabular-classification": "table, tabular, rows, columns, csv, classify",
+    "tabular-regression": "table, tabular, predict, value, regression, csv, price",
+}
+
+# words that say nothing about the goal
+STOPWORDS = set("""
+a an and are as at be by can for from has have i in into is it its me my need of on or our so some that the
+their them these this to use used using want we what which will with would you your model models
+""".split())
+
+_WORD = re.compile(r"[a-z0-9]+")
+_SUFFIXES = ("izations", "ization", "isations", "isation", "ations", "ation", "izing", "ising", "ized", "ised",
+             "izes", "ises", "ize", "ise", "ings", "ing", "ers", "er", "ies", "es", "s", "y", "e")
+
+def stem(word):
+    """Crude suffix stripping, enough to make word forms of the same goal meet."""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+def tokens(text):
+    return [stem(word) for word in _WORD.findall(str(text).lower()) if word not in STOPWORDS]
+
+# evidence classify() needs before its confidence counts: distinct matched words or keyword phrases of
+# the best goal, and the cosine similarity of the description to it
+MIN_EVIDENCE = 2
+MIN_SCORE = 0.2
+
+def describe_problem(problem_short_description, problem_definition):
+    """Text the classifier reads for a task: its descriptions, without the modalities.
+
+    The inputs and outputs ("text", "image") are goal name words, they would vote for every
+    goal of the modality whatever the task is; the goals are narrowed by modality instead.
+    """
+    parts = [problem_short_description, problem_definition]
+    return " ".join(str(part) for part in parts if part)
+
+def _normalized(weights):
+    norm = math.sqrt(sum(w * w for w in weights.values()))
+    return {term: w / norm for term, w in weights.items()} if norm else {}
+
+class GoalClassifier:
+    """TF-IDF scoring of a problem description against the candidate goals of a graph."""
+
+    def __init__(self, graph, goals=None):
+        self.version = graph_version(graph)
+        backend = as_backend(graph)
+        self.goals = sorted(str(goal) for goal in (get_problems(graph) if goals is None else goals))
+
+        documents = {}
+        # goal -> {term: phrase} for the words of keyword phrases, which are one piece of evidence together
+        self.phrases = {}
+        for goal in self.goals:
+            # the goal's own words count more than anything its models say
+            name_terms = tokens(goal.replace("-", " "))
+            keywords = [tokens(phrase) for phrase in KEYWORDS.get(goal, "").split(",")]
+            words = Counter({term: 3 for term in name_terms})
+            words.update({term: 2 for phrase in keywords for term in phrase})
+            # a word that is also a goal name word or a keyword of its own counts by itself
+            standalone = set(name_terms).union(*(phrase for phrase in keywords if len(phrase) == 1))
+            self.phrases[goal] = {term: " ".join(phrase) for phrase in keywords if len(phrase) > 1
+                                  for term in phrase if term not in standalone}
+            documents[goal] = words
+        # one scan per predicate, rather than lookups per model
+        problems_by_model = {}
+        for model, _, problem in backend.triples((None, CONN.hasProblem, None)):
+            if str(problem) in documents:
+                problems_by_model.setdefault(model, []).append(str(problem))
+        for predicate in (CONN.hasTag, CONN.model_name):
+            for model, _, value in backend.triples((None, predicate, None)):
+                for problem in problems_by_model.get(model, ()):
+                    for term in tokens(str(value).rsplit("/", 1)[-1]):
+                        # each model adds little; the log in the vectors keeps goals with many models
+                        # from drowning the others
+                        documents[problem][term] += 0.1
+
+        document_frequency = Counter(term for words in documents.values() for term in words)
+        self.idf = {term: math.log((1 + len(documents)) / (1 + df)) + 1 for term, df in document_frequency.items()}
+        self.vectors = {goal: _normalized({term: (1 + math.log(1 + count)) * self.idf[term]
+                                           for term, count in words.items()})
+                        for goal, words in documents.items()}
+
+    def _counts(self, text):
+        return Counter(term for term in tokens(text) if term in self.idf)
+
+    def scores(self, text, candidates=None):
+        """[(goal, cosine similarity)] for every candidate goal, best first."""
+        counts = self._counts(text)
+        query = _normalized({term: (1 + math.log(count)) * self.idf[term] for term, count in counts.items()})
+        goals = self.goals if candidates is None else [g for g in self.goals if g in set(map(str, candidates))]
+        scored = [(goal, sum(weight * self.vectors[goal].get(term, 0.0) for term, weight in query.items()))
+                  for goal in goals]
+        return sorted(scored, key=lambda item: (-item[1], item[0]))
+
+    def evidence(self, text, goal):
+        """Distinct words or keyword phrases of goal that text matches."""
+        vector, phrases = self.vectors[str(goal)], self.phrases[str(goal)]
+        return {phrases.get(term, term) for term in self._counts(text) if term in vector}
+
+    def classify(self, text, candidates=None):
+        """(goal, confidence) of the best goal for text.
+
+        Confidence is 0 when nothing matched, and when the best goal has less than MIN_EVIDENCE
+        or MIN_SCORE behind it.
+        """
+        scored = self.scores(text, candidates)
+        if not scored or scored[0][1] <= 0:
+            return None, 0.0
+        best, best_score = scored[0]
+        if best_score < MIN_SCORE or len(self.evidence(text, best)) < MIN_EVIDENCE:
+            return best, 0.0
+        runner_up = scored[1][1] if len(scored) > 1 else 0.0
+        return best, 1 - runner_up / best_score
+
+def goal_classifier(graph):
+    """Classifier of graph, built on first use and again whenever its version changes."""
+    return built_for_graph(graph, "_goal_classifier", GoalClassifier)
+
+def main():
+    from rdftool.rdfCode import load_graph
+
+    parser = argparse.ArgumentParser(description="Classify a problem description into a goal of a graph")
+    parser.add_argument("graph", help="path to the Turtle graph file")
+    parser.add_argument("text", help="problem description")
+    parser.add_argument("--top", type=int, default=5, help="number of goals to show")
+    args = parser.parse_args()
+
+    graph = load_graph(args.graph)
+    start = time.perf_counter()
+    classifier = GoalClassifier(graph)
+    print(f"Built for {len(classifier.goals)} goals in {(time.perf_counter() - start) * 1000:.1f} ms")
+    start = time.perf_counter()
+    goal, confidence = classifier.classify(args.text)
+    print(f"{goal} (confidence {confidence:.2f}) in {(time.perf_counter() - start) * 1000:.2f} ms")
+    for goal, score in classifier.scores(args.text)[:args.top]:
+        print(f"    {goal:<40} {score:.3f}")
+
+if __name__ == '__main__':
+    main()
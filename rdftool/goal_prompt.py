@@ -0,0 +1,127 @@
+"""Goal prompt with numbered candidates, and a tolerant parser for the answer.
+
+The metadata node used to ask the LLM for a goal name and retried whenever
+the answer was not exactly one of them, which a stray quote, a full stop or
+a sentence around the name was enough for. The prompt now lists the
+candidates as a numbered list and asks for the number alone, and
+parse_goal_answer() reads, in this order:
+
+    index   the first number in the answer that is one of the list's, unless
+            the answer names a different goal ("translation (2)")
+    name    a goal name standing on its own in the answer, spaces for hyphens
+    fuzzy   the answer's closest goal name, by difflib ratio
+
+GoalAnswerStats counts how answers were read, and the retries the parser
+saved: answers it read that are neither a bare number of the list nor
+exactly a goal name, which a strict reader of either prompt would have
+sent back to the LLM.
+"""
+
+import difflib
+import re
+import threading
+
+NO_GOAL = 0
+_NUMBER = re.compile(r"(?<![\w.-])(\d+)(?![\w-]|\.\d)")
+_FUZZY_CUTOFF = 0.8
+
+def numbered_goals(goals):
+    """The candidates as "1. goal" lines."""
+    return "\n".join(f"{number}. {goal}" for number, goal in enumerate(goals, 1))
+
+def goal_prompt(goals, modality="", inputs=(), outputs=(), minimum_samples=0, maximum_samples=0):
+    """Prompt asking for the number of the goal that solves the problem."""
+    prompt = ("Which of the following machine learning goals can be used to solve this problem?\n"
+              f"{numbered_goals(goals)}\n"
+              f"Answer with only the number of one goal, from 1 to {len(goals)}, and nothing else. "
+              f"If you are not sure, answer {NO_GOAL}.")
+    if modality:
+        prompt = f"{prompt} Using the modality {modality}."
+    if inputs:
+        prompt = f"{prompt} The user inputs known are {', '.join(inputs)}."
+    if outputs:
+        prompt = f"{prompt} The user outputs known are {', '.join(outputs)}."
+    if isinstance(minimum_samples, int) and minimum_samples > 0:
+        prompt = f"{prompt} Have into account that needs to have {minimum_samples} minimum samples."
+    if isinstance(maximum_samples, int) and maximum_samples > 0:
+        prompt = f"{prompt} Have into account that needs to have {maximum_samples} maximum samples."
+    return prompt
+
+def retry_prompt(answer, goals, prompt):
+    """Prompt for another attempt after an answer that could not be read."""
+    return (f"Your previous answer '{answer}' was not valid. "
+            f"Answer with only a number from 1 to {len(goals)}. {prompt}")
+
+def _named_goals(text, goals):
+    # goals named in text, in the order they appear; longest first, so "text2text-generation" is not
+    # also read as "text-generation" and "visual question answering" not as "question answering"
+    found, taken = [], []
+    for goal in sorted(goals, key=len, reverse=True):
+        name = r"[\s_-]".join(re.escape(word) for word in re.split(r"[\s_-]+", goal.lower()))
+        for match in re.finditer(rf"(?<![\w-]){name}(?![\w-])", text):
+            if not any(start < match.end() and match.start() < end for start, end in taken):
+                taken.append(match.span())
+                found.append((match.start(), goal))
+    return [goal for _, goal in sorted(found)]
+
+def parse_goal_answer(answer, goals):
+    """(goal, how) read from an LLM answer, how being "index", "name" or "fuzzy"; (None, None) if none fits."""
+    if not answer:
+        return None, None
+    text = answer.strip().lower()
+
+    numbers = [int(number) for number in _NUMBER.findall(text)]
+    # "with 1000 samples I would pick 2": numbers out of the list's range are not goal numbers
+    indexed = [goals[number - 1] for number in numbers if 1 <= number <= len(goals)]
+    named = _named_goals(text, goals)
+    if named:
+        # a name says which goal is meant more surely than a number, which may count anything
+        agreeing = [goal for goal in indexed if goal in named]
+        return (agreeing[0], "index") if agreeing else (named[0], "name")
+    if indexed:
+        return indexed[0], "index"
+    if NO_GOAL in numbers:
+        return None, None
+
+    # "Text generation." or "summarisation" still name a goal
+    cleaned = re.sub(r"[^\w\s-]", "", text).strip()
+    by_name = {goal.lower(): goal for goal in goals}
+    for candidate in (cleaned, cleaned.replace(" ", "-")):
+        close = difflib.get_close_matches(candidate, list(by_name), n=1, cutoff=_FUZZY_CUTOFF)
+        if close:
+            return by_name[close[0]], "fuzzy"
+    return None, None
+
+def is_exact_answer(answer, goals):
+    """Whether answer is just a number of the list or just a goal name, all a strict reader accepts."""
+    text = (answer or "").strip().lower()
+    if text.isdigit():
+        return 1 <= int(text) <= len(goals)
+    return text in (goal.lower() for goal in goals)
+
+class GoalAnswerStats:
+    """Counts of LLM answers by how they were read, and of the retries the parser saved."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.answers = 0
+        self.by_method = {"index": 0, "name": 0, "fuzzy": 0, "unreadable": 0}
+        self.retries_saved = 0
+
+    def record(self, answer, goal, how, goals):
+        with self._lock:
+            self.answers += 1
+            self.by_method[how or "unreadable"] += 1
+            # read, where the exact name comparison used before the numbered prompt, or an exact
+            # number comparison for it, would have asked again
+            if goal is not None and not is_exact_answer(answer, goals):
+                self.retries_saved += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "answers": self.answers,
+                "by_method": dict(self.by_method),
+                "retries_saved": self.retries_saved,
+                "unreadable_rate": self.by_method["unreadable"] / self.answers if self.answers else 0.0,
+            }
@@ -0,0 +1,222 @@
+"""Graph backends the rdfCode functions run against.
+
+rdfCode never calls graph.query directly: run_query and friends go through
+as_backend(graph), which exposes the small interface below. Three
+backends implement it:
+
+    rdflib    the loaded rdflib Graph, queried by rdflib's SPARQL engine
+    oxigraph  an embedded pyoxigraph store holding a copy of the graph
+    index     CatalogIndex, answering the catalog lookups from dicts and
+              falling back to the backend it wraps for everything else
+
+open_backend(graph, name) builds one from a loaded graph; the nodes pick
+it with the SUSTAINML_GRAPH_BACKEND environment variable.
+"""
+
+import re
+
+from rdflib import BNode, Literal, URIRef
+from rdflib.namespace import XSD
+from rdflib.plugins.sparql import prepareQuery
+
+from rdftool.schema import NAMESPACES
+
+BACKENDS = ("rdflib", "oxigraph", "index")
+
+class GraphBackend:
+    """Interface of a queryable graph: prepared SELECT queries plus triple patterns."""
+
+    # prepared queries are cached per kind, see rdfCode.prepared_query
+    kind = None
+    # whether threads can run the same prepared query concurrently
+    shared_queries = True
+
+    def prepare(self, text):
+        """Compile query text into whatever select() takes."""
+        raise NotImplementedError
+
+    def select(self, query, bindings=None):
+        """Iterate the rows of a prepared SELECT query as tuples of rdflib terms."""
+        raise NotImplementedError
+
+    def render(self, term):
+        """SPARQL text of an rdflib term, for query text built per call."""
+        return term.n3()
+
+    def triples(self, triple_pattern):
+        raise NotImplementedError
+
+    def namespaces(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+class RdflibBackend(GraphBackend):
+    """rdflib Graph queried with rdflib's SPARQL engine."""
+
+    kind = "rdflib"
+    # rdflib keeps evaluation state on the parsed query, concurrent runs of one lose rows
+    shared_queries = False
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def prepare(self, text):
+        return prepareQuery(text, initNs=NAMESPACES)
+
+    def select(self, query, bindings=None):
+        return self.graph.query(query, initBindings=bindings or {})
+
+    def triples(self, triple_pattern):
+        return self.graph.triples(triple_pattern)
+
+    def namespaces(self):
+        return self.graph.namespaces()
+
+    def __len__(self):
+        return len(self.graph)
+
+# RDF does not allow literal subjects, which the catalog uses for problems and models;
+# in the oxigraph store those literals are IRIs under this prefix. The IRI holds what
+# rdflib orders string literals by, in that order: datatype (xsd:string for plain and
+# language-tagged literals), language, lexical form, then plain before typed. Each is
+# hex-encoded and ends at a "." that sorts before every hex digit, so the IRIs sort like
+# the literals do in rdflib (ORDER BY ?model)
+_LITERAL_NODE = "urn:sustainml:literal:"
+
+_WHERE = re.compile(r"WHERE\s*{", re.IGNORECASE)
+_PREFIXES = {prefix: str(namespace) for prefix, namespace in NAMESPACES.items()}
+
+def _hex(text):
+    return str(text).encode("utf-8").hex()
+
+def _literal_node(literal):
+    # IRI standing for a literal subject in the oxigraph store
+    return (f"{_LITERAL_NODE}{_hex(literal.datatype or XSD.string)}.{_hex(literal.language or '')}."
+            f"{_hex(literal)}.{int(literal.datatype is not None)}")
+
+def _node_literal(iri):
+    # the literal _literal_node encoded into iri
+    datatype, language, lexical, typed = (bytes.fromhex(part).decode("utf-8") if i < 3 else part
+                                          for i, part in enumerate(iri[len(_LITERAL_NODE):].split(".")))
+    return Literal(lexical, lang=language or None, datatype=URIRef(datatype) if typed == "1" else None)
+
+class OxigraphBackend(GraphBackend):
+    """Copy of a graph in an embedded pyoxigraph store, queried by oxigraph's SPARQL engine.
+
+    Oxigraph has no plain literals, it types them xsd:string as RDF 1.1 does. Plain object
+    literals come back plain, but lookups of a model named by a plain literal, rather than an
+    xsd:string one as in the catalog, can answer differently from rdflib.
+    """
+
+    kind = "oxigraph"
+
+    def __init__(self, store, node_literals, untyped_strings, namespaces=()):
+        self.store = store
+        self._node_literals = node_literals
+        self._untyped_strings = untyped_strings
+        self._namespaces = list(namespaces)
+        # len() of a pyoxigraph store scans it; the store is filled once and never written after
+        self._length = None
+
+    @classmethod
+    def from_graph(cls, graph):
+        """Load every triple of an rdflib graph into a new in-memory store."""
+        try:
+            import pyoxigraph
+        except ImportError as e:
+            raise ImportError("The oxigraph graph backend needs the pyoxigraph package") from e
+
+        node_literals = set()
+        untyped_strings = set()
+        for s, _, o in graph.triples((None, None, None)):
+            if isinstance(s, Literal):
+                node_literals.add(s)
+            if isinstance(o, Literal) and o.datatype is None and not o.language:
+                untyped_strings.add(str(o))
+        backend = cls(pyoxigraph.Store(), node_literals, untyped_strings, graph.namespaces())
+        backend.store.bulk_extend(
+            pyoxigraph.Quad(backend._to_oxigraph(s), backend._to_oxigraph(p), backend._to_oxigraph(o))
+            for s, p, o in graph.triples((None, None, None))
+        )
+        return backend
+
+    def _to_oxigraph(self, term):
+        import pyoxigraph
+        if isinstance(term, Literal):
+            if term in self._node_literals:
+                return pyoxigraph.NamedNode(_literal_node(term))
+            if term.language:
+                return pyoxigraph.Literal(str(term), language=term.language)
+            return pyoxigraph.Literal(str(term), datatype=pyoxigraph.NamedNode(term.datatype or XSD.string))
+        if isinstance(term, BNode):
+            return pyoxigraph.BlankNode(str(term))
+        return pyoxigraph.NamedNode(str(term))
+
+    def _to_rdflib(self, term):
+        import pyoxigraph
+        if term is None:
+            return None
+        if isinstance(term, pyoxigraph.NamedNode):
+            if term.value.startswith(_LITERAL_NODE):
+                return _node_literal(term.value)
+            return URIRef(term.value)
+        if isinstance(term, pyoxigraph.BlankNode):
+            return BNode(term.value)
+        if term.language:
+            return Literal(term.value, lang=term.language)
+        if term.datatype.value == str(XSD.string) and term.value in self._untyped_strings:
+            # oxigraph types every simple literal as xsd:string, rdflib keeps them untyped
+            return Literal(term.value)
+        return Literal(term.value, datatype=URIRef(term.datatype.value))
+
+    def prepare(self, text):
+        # pyoxigraph parses the query text on every call, there is no compiled form to keep
+        return text
+
+    def select(self, query, bindings=None):
+        if bindings:
+            # oxigraph only substitutes projected variables; rdflib's initBindings also binds the
+            # others, so the bindings go in a VALUES block at the top of the WHERE group instead
+            names = " ".join(f"?{name}" for name in bindings)
+            terms = " ".join(self.render(term) for term in bindings.values())
+            query = _WHERE.sub(lambda m: f"{m.group(0)} VALUES ({names}) {{ ({terms}) }}", query, count=1)
+        solutions = self.store.query(query, prefixes=_PREFIXES)
+        variables = solutions.variables
+        for solution in solutions:
+            yield tuple(self._to_rdflib(solution[variable]) for variable in variables)
+
+    def render(self, term):
+        return str(self._to_oxigraph(term))
+
+    def triples(self, triple_pattern):
+        s, p, o = (None if term is None else self._to_oxigraph(term) for term in triple_pattern)
+        for quad in self.store.quads_for_pattern(s, p, o):
+            yield self._to_rdflib(quad.subject), self._to_rdflib(quad.predicate), self._to_rdflib(quad.object)
+
+    def namespaces(self):
+        return iter(self._namespaces)
+
+    def __len__(self):
+        if self._length is None:
+            self._length = len(self.store)
+        return self._length
+
+def as_backend(graph):
+    """graph itself if it is a backend, otherwise the rdflib backend over it."""
+    if isinstance(graph, GraphBackend):
+        return graph
+    return RdflibBackend(graph)
+
+def open_backend(graph, name="index"):
+    """Backend of the given name (one of BACKENDS) over a loaded rdflib graph."""
+    if name == "rdflib":
+        return graph
+    if name == "oxigraph":
+        return OxigraphBackend.from_graph(graph)
+    if name == "index":
+        # catalog_index builds on this module
+        from rdftool.catalog_index import CatalogIndex
+        return CatalogIndex(graph)
+    raise ValueError(f"Unknown graph backend {name!r}, expected one of {', '.join(BACKENDS)}")
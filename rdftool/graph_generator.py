@@ -0,0 +1,119 @@
+"""Synthetic graphs with the graph_v2.ttl schema, at any scale.
+
+Models, Problems, CoverTags, metrics with scores on datasets, input/output
+modalities, downloads, likes and parameter counts are generated from a
+seed, so the same arguments always give the same file. Triples are
+written as they are generated, so millions of models need no more memory
+than a handful.
+
+    python -m rdftool.graph_generator 100000 graph_100k.ttl
+    python -m rdftool.graph_generator 1000000 graph_1m.ttl --seed 7
+"""
+
+import argparse
+import random
+
+# cover tag -> [(problem, input modality, output modality)]
+COVER_TAGS = {
+    "nlp": [
+        ("text-generation", "text", "text"),
+        ("summarization", "text", "text"),
+        ("translation", "text", "text"),
+        ("fill-mask", "text", "text"),
+        ("text-classification", "text", "label"),
+        ("question-answering", "text", "text"),
+        ("token-classification", "text", "label"),
+    ],
+    "cv": [
+        ("image-classification", "image", "label"),
+        ("object-detection", "image", "boxes"),
+        ("image-segmentation", "image", "mask"),
+        ("text-to-image", "text", "image"),
+    ],
+    "audio": [
+        ("automatic-speech-recognition", "audio", "text"),
+        ("text-to-speech", "text", "audio"),
+        ("audio-classification", "audio", "label"),
+    ],
+    "multimodal": [
+        ("image-to-text", "image", "text"),
+        ("visual-question-answering", "image", "text"),
+    ],
+}
+TAGS = ["transformers", "pytorch", "tensorflow", "onnx", "gguf", "safetensors"]
+LIBRARIES = ["transformers", "diffusers", "timm", "sentence-transformers", "llama.cpp"]
+METRICS = ["accuracy", "f1", "bleu", "rouge", "wer", "precision", "recall"]
+DATASETS = ["glue", "squad", "imagenet", "coco", "librispeech", "wmt14"]
+
+PREFIXES = """@prefix conn: <http://example.org/conn/> .
+@prefix metric: <http://example.org/metric/> .
+@prefix modality: <http://example.org/modality/> .
+@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+"""
+
+def _string(value):
+    return f'"{value}"^^xsd:string'
+
+def generate_graph(out, models, seed=1, metrics_per_model=3):
+    """Write a Turtle graph with the given number of models to the text stream out; returns the triple count."""
+    rng = random.Random(seed)
+    triples = 0
+    out.write(PREFIXES + "\n")
+
+    problems = []
+    for cover_tag, cover_problems in COVER_TAGS.items():
+        out.write(f"{_string(cover_tag)} a conn:CoverTag .\n")
+        triples += 1
+        for problem, input_modality, output_modality in cover_problems:
+            out.write(f"{_string(problem)} a conn:Problem ; conn:hasCoverTag {_string(cover_tag)} ; "
+                      f"modality:hasInput {_string(input_modality)} ; "
+                      f"modality:hasOutput {_string(output_modality)} .\n")
+            triples += 4
+            problems.append((cover_tag, problem))
+
+    metric_nodes = [f"metric:{name}_{dataset}" for name in METRICS for dataset in DATASETS]
+    for name in METRICS:
+        for dataset in DATASETS:
+            out.write(f'metric:{name}_{dataset} a metric:Metric ; metric:metricName "{name}" ; '
+                      f'metric:onDataset "{dataset}" ; metric:hasScore {_string(round(rng.random(), 3))} .\n')
+            triples += 4
+
+    for k in range(models):
+        cover_tag, problem = rng.choice(problems)
+        name = f"org{k % 997}/model-{k}"
+        # download counts are heavy-tailed, like on a real model hub
+        downloads = int(rng.paretovariate(1.2) * 10) - 10
+        properties = [
+            f"{_string(name)} a conn:Model",
+            f"conn:model_name {_string(name)}",
+            f"conn:model_id {_string(f'id-{k}')}",
+            f"conn:hasProblem {_string(problem)}",
+            f"conn:hasCoverTag {_string(cover_tag)}",
+            f"conn:usesLibrary {_string(rng.choice(LIBRARIES))}",
+            f"conn:hasTag {_string(rng.choice(TAGS))}",
+            f"conn:downloads {_string(downloads)}",
+            f"conn:likes {_string(downloads // rng.randint(50, 500))}",
+            f'conn:lastModified "20{rng.randint(20, 25)}-{rng.randint(1, 12):02d}-01T00:00:00"^^xsd:dateTime',
+            f"conn:parameters {_string(int(10 ** rng.uniform(6, 11)))}",
+        ]
+        properties += [f"metric:hasMetric {metric}"
+                       for metric in rng.sample(metric_nodes, rng.randint(0, metrics_per_model))]
+        out.write(" ;\n    ".join(properties) + " .\n")
+        triples += len(properties)
+    return triples
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic graph with the graph_v2.ttl schema")
+    parser.add_argument("models", type=int, help="number of models")
+    parser.add_argument("output", help="path of the Turtle file to write")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--metrics-per-model", type=int, default=3,
+                        help="maximum number of metrics linked to each model")
+    args = parser.parse_args()
+
+    with open(args.output, "w", encoding="utf-8") as out:
+        triples = generate_graph(out, args.models, args.seed, args.metrics_per_model)
+    print(f"Wrote {args.models} models, {triples} triples to {args.output}")
+
+if __name__ == '__main__':
+    main()
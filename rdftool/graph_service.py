@@ -0,0 +1,106 @@
+"""The graph a node serves, from its first load to every hot reload.
+
+Both nodes serve one graph file the same way; GraphService is that part,
+and a node only passes the function that loads its catalog. It owns the
+SnapshotHolder the callbacks read, the initial load, either before the
+node joins the bus or in a background thread that retries a failed load,
+and the GraphWatcher that swaps in a new snapshot when the file changes.
+
+    graph_service = GraphService(load_catalog)
+    graph_service.start(graph_path)
+    graph = graph_service.current_graph()
+    if graph is None:
+        raise Exception(graph_service.unavailable_message())
+
+Settings come from the environment unless given:
+
+    SUSTAINML_GRAPH_BACKGROUND_LOAD      1 joins the bus first and loads concurrently (default 0)
+    SUSTAINML_GRAPH_WAIT_TIMEOUT         seconds a request waits for a loading graph (default 30)
+    SUSTAINML_GRAPH_LOAD_RETRY_INTERVAL  seconds between background load attempts (default 30)
+    SUSTAINML_GRAPH_RELOAD_INTERVAL      seconds between checks of the file, 0 disables (default 5)
+"""
+
+import os
+import threading
+import time
+
+from rdftool.graph_snapshot import SnapshotHolder
+from rdftool.graph_watcher import GraphWatcher
+
+def _env_seconds(name, default, value):
+    return float(os.environ.get(name, default)) if value is None else value
+
+class GraphService:
+    """Published snapshots of one graph file, with its initial load, load retries and hot reload."""
+
+    def __init__(self, load, wait_timeout=None, retry_interval=None, reload_interval=None):
+        self.load = load
+        # Published once loaded and again on every reload, never modified in place
+        self.snapshots = SnapshotHolder()
+        self.wait_timeout = _env_seconds("SUSTAINML_GRAPH_WAIT_TIMEOUT", "30", wait_timeout)
+        self.retry_interval = _env_seconds("SUSTAINML_GRAPH_LOAD_RETRY_INTERVAL", "30", retry_interval)
+        self.reload_interval = _env_seconds("SUSTAINML_GRAPH_RELOAD_INTERVAL", "5", reload_interval)
+        # Why the last load failed, until one succeeds
+        self.load_error = None
+        self.watcher = None
+
+    def start(self, graph_path, background=None):
+        """Load graph_path now, or in a background thread with SUSTAINML_GRAPH_BACKGROUND_LOAD=1."""
+        if background is None:
+            background = os.environ.get("SUSTAINML_GRAPH_BACKGROUND_LOAD", "0") == "1"
+        if background:
+            threading.Thread(target=self.initial_load, args=(graph_path, True), name="GraphLoad",
+                             daemon=True).start()
+        else:
+            self.initial_load(graph_path)
+
+    def initial_load(self, graph_path, retry=False):
+        """Load and publish the first graph, then watch the file for changes.
+
+        With retry (the background load), a failed load is logged and tried again instead of
+        leaving the node without a graph for good; without, its exception is raised.
+        """
+        while True:
+            try:
+                catalog = self.load(graph_path)
+                break
+            except Exception as e:
+                self.load_error = f"{type(e).__name__}: {e}"
+                print(f"Failed to load the graph {graph_path}: {self.load_error}")
+                if not retry or self.retry_interval <= 0:
+                    raise
+                time.sleep(self.retry_interval)
+        self.load_error = None
+        self.snapshots.publish(catalog)
+
+        if self.reload_interval > 0:
+            self.watcher = GraphWatcher(graph_path, self.load, self.swap_graph, interval=self.reload_interval)
+            self.watcher.start()
+
+    def swap_graph(self, new_graph, info):
+        """Publish a reloaded graph; called by the GraphWatcher thread once it is fully built."""
+        self.snapshots.publish(new_graph, info)
+        print(f"Graph reloaded: version {info['version']} ({info['key']}) loaded in {info['seconds']:.2f} s")
+
+    def current_graph(self, wait=True):
+        """The current graph, waiting up to wait_timeout while it is still loading; None if not ready.
+
+        Callbacks pin the graph once, so a reload never changes it under them, and query it without
+        locks since a published snapshot is read-only. wait=False returns at once, for requests that
+        can answer without the graph, and so does a failed load, which unavailable_message() reports.
+        """
+        if wait and self.load_error is None:
+            snapshot = self.snapshots.wait(self.wait_timeout)
+        else:
+            snapshot = self.snapshots.current()
+        return snapshot.graph if snapshot else None
+
+    def unavailable_message(self):
+        """Why current_graph() returned None."""
+        if self.load_error is not None:
+            return f"The graph failed to load ({self.load_error}), retrying every {self.retry_interval:g} s"
+        return "The graph is still loading, try again later"
+
+    def stop(self):
+        if self.watcher is not None:
+            self.watcher.stop()
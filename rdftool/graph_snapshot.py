@@ -0,0 +1,78 @@
+"""Immutable graph snapshots shared by the callback threads of a node.
+
+A node answers task and configuration callbacks on different threads. They
+never take a lock around the graph: each callback pins the current
+snapshot once and queries it for as long as it runs. A snapshot is never
+modified after it is published; reloads and deltas build a complete new
+graph, which replaces the current one in a single reference assignment.
+
+freeze_graph() makes that hold: any write to a frozen graph raises
+ReadOnlyGraphError instead of changing triples under a concurrent reader.
+
+    snapshots = SnapshotHolder()
+    snapshots.publish(open_backend(load_graph(path)))
+    graph = snapshots.wait(timeout).graph
+"""
+
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from rdflib.graph import ModificationException
+
+# Graph methods that change triples, namespaces or the store
+_WRITE_METHODS = ("add", "addN", "remove", "set", "parse", "update", "bind",
+                  "open", "close", "destroy", "commit", "rollback")
+
+class ReadOnlyGraphError(ModificationException):
+    def __str__(self):
+        return "The graph is a published snapshot and cannot be modified; build a new one instead"
+
+def _read_only(*args, **kwargs):
+    raise ReadOnlyGraphError()
+
+def freeze_graph(graph):
+    """Make graph, or the rdflib graph under a backend, reject every write; returns graph."""
+    # CatalogIndex keeps the rdflib graph it was built from in .graph
+    rdflib_graph = getattr(graph, "graph", graph)
+    for method in _WRITE_METHODS:
+        if hasattr(rdflib_graph, method):
+            # instance attributes shadow the methods, += and -= go through addN and remove
+            setattr(rdflib_graph, method, _read_only)
+    rdflib_graph._frozen = True
+    return graph
+
+def is_frozen(graph):
+    return getattr(getattr(graph, "graph", graph), "_frozen", False)
+
+Snapshot = namedtuple("Snapshot", ["graph", "version", "published_at", "info"])
+
+class SnapshotHolder:
+    """The current snapshot of a node; reading it is a plain attribute read, publishing swaps it."""
+
+    def __init__(self):
+        self._snapshot = None
+        self._ready = threading.Event()
+        # only serializes publishers, readers never take it
+        self._publish_lock = threading.Lock()
+
+    def current(self):
+        """The snapshot published last, or None before the first one."""
+        return self._snapshot
+
+    def wait(self, timeout=None):
+        """The current snapshot, waiting up to timeout for the first one; None if there is none by then."""
+        if not self._ready.wait(timeout):
+            return None
+        return self._snapshot
+
+    def publish(self, graph, info=None):
+        """Freeze graph and make it the current snapshot; returns the new snapshot."""
+        freeze_graph(graph)
+        with self._publish_lock:
+            version = self._snapshot.version + 1 if self._snapshot else 1
+            snapshot = Snapshot(graph, version, time.time(), MappingProxyType(dict(info or {})))
+            self._snapshot = snapshot
+        self._ready.set()
+        return snapshot
@@ -0,0 +1,281 @@
+"""Incremental updates of a graph file from a local model catalog dump.
+
+The dump is a JSONL file, one model record per line:
+
+    {"id": "...", "name": "org/model", "problem": "text-generation",
+     "tags": ["pytorch"], "library": "transformers", "downloads": 120,
+     "likes": 4, "lastModified": "2024-05-01T00:00:00", "parameters": 7000000,
+     "metrics": ["accuracy_glue"]}
+
+Only the models whose record changed since the last run are turned into
+triples. Their differences against the current graph are appended to the
+delta file next to the graph (see rdfCode.graph_delta_path), which
+load_graph applies on top of the graph file, so running nodes pick the
+change up on their next reload. A manifest next to the graph keeps the
+record hash and the triples of every model, so the graph itself is only
+loaded again when the graph file changed behind the updater's back.
+
+    python -m rdftool.graph_updater graph_v2.ttl models.jsonl
+    python -m rdftool.graph_updater graph_v2.ttl models.jsonl --prune
+    python -m rdftool.graph_updater graph_v2.ttl --fold
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from rdflib import RDF, Literal, URIRef
+from rdflib.namespace import XSD
+from rdflib.util import from_n3
+
+from rdftool.rdfCode import graph_delta_path, graph_file_key, load_graph
+from rdftool.schema import CONN, METRIC
+
+MANIFEST_SUFFIX = ".manifest.sqlite"
+
+def manifest_path(file_path):
+    """Path of the updater manifest of a graph file."""
+    return str(file_path) + MANIFEST_SUFFIX
+
+def record_hash(record):
+    """Stable hash of a dump record."""
+    return hashlib.sha256(json.dumps(record, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def _string(value):
+    return Literal(str(value), datatype=XSD.string)
+
+def record_triples(record, subject=None, cover_tags_by_problem=None):
+    """Triples describing the model of a dump record; subject defaults to the model name literal."""
+    name = record["name"]
+    model = subject if subject is not None else _string(name)
+    triples = {(model, RDF.type, CONN.Model), (model, CONN.model_name, _string(name))}
+    if record.get("id") is not None:
+        triples.add((model, CONN.model_id, _string(record["id"])))
+    for problem in _as_list(record.get("problem")):
+        triples.add((model, CONN.hasProblem, _string(problem)))
+        # the cover tag of a model is the one of its problem unless the record says otherwise
+        if "cover_tag" not in record:
+            for cover_tag in (cover_tags_by_problem or {}).get(str(problem), ()):
+                triples.add((model, CONN.hasCoverTag, cover_tag))
+    for cover_tag in _as_list(record.get("cover_tag")):
+        triples.add((model, CONN.hasCoverTag, _string(cover_tag)))
+    for library in _as_list(record.get("library")):
+        triples.add((model, CONN.usesLibrary, _string(library)))
+    for tag in _as_list(record.get("tags")):
+        triples.add((model, CONN.hasTag, _string(tag)))
+    # numbers are stored the way normalize_numeric_literals leaves them
+    for key, predicate in (("downloads", CONN.downloads), ("likes", CONN.likes), ("parameters", CONN.parameters)):
+        if record.get(key) is not None:
+            triples.add((model, predicate, Literal(int(record[key]), datatype=XSD.integer)))
+    if record.get("lastModified") is not None:
+        triples.add((model, CONN.lastModified, Literal(str(record["lastModified"]), datatype=XSD.dateTime)))
+    for metric in _as_list(record.get("metrics")):
+        metric = URIRef(metric) if "://" in metric else METRIC[metric]
+        triples.add((model, METRIC.hasMetric, metric))
+    return triples
+
+def _encode(triple):
+    return tuple(term.n3() for term in triple)
+
+class Manifest:
+    """SQLite file next to the graph with the record hash and the triples of every model.
+
+    Lookups and updates touch only the models of the dump, so an update does
+    not read or rewrite the whole catalog.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.db = sqlite3.connect(manifest_path(file_path))
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS models (name TEXT PRIMARY KEY, hash TEXT, triples TEXT);
+            CREATE TABLE IF NOT EXISTS cover_tags (problem TEXT, cover_tag TEXT);
+        """)
+
+    def graph_key(self):
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'graph_key'").fetchone()
+        return row[0] if row else None
+
+    def set_graph_key(self):
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES ('graph_key', ?)", (graph_file_key(self.file_path),))
+
+    def rebuild(self):
+        """Fill the manifest from the graph as it is loaded now; record hashes are unknown."""
+        graph = load_graph(self.file_path)
+        self.db.execute("DELETE FROM models")
+        self.db.execute("DELETE FROM cover_tags")
+        rows = []
+        for model, _, _ in graph.triples((None, RDF.type, CONN.Model)):
+            names = list(graph.objects(model, CONN.model_name))
+            if names:
+                rows.append((str(names[0]), None, json.dumps([_encode(t) for t in graph.triples((model, None, None))])))
+        self.db.executemany("INSERT OR REPLACE INTO models VALUES (?, ?, ?)", rows)
+        self.db.executemany("INSERT INTO cover_tags VALUES (?, ?)", [
+            (str(problem), cover_tag.n3())
+            for problem, _, cover_tag in graph.triples((None, CONN.hasCoverTag, None))
+            if (problem, RDF.type, CONN.Problem) in graph
+        ])
+        self.set_graph_key()
+        self.db.commit()
+
+    def cover_tags_by_problem(self):
+        cover_tags = {}
+        for problem, cover_tag in self.db.execute("SELECT problem, cover_tag FROM cover_tags"):
+            cover_tags.setdefault(problem, []).append(from_n3(cover_tag))
+        return cover_tags
+
+    def get(self, name):
+        """(hash, set of n3-encoded triples) of a model, or None if it is not in the graph."""
+        row = self.db.execute("SELECT hash, triples FROM models WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        return row[0], {tuple(encoded) for encoded in json.loads(row[1])}
+
+    def put(self, name, digest, encoded_triples):
+        self.db.execute("INSERT OR REPLACE INTO models VALUES (?, ?, ?)",
+                        (name, digest, json.dumps(sorted(encoded_triples))))
+
+    def remove_all_but(self, names):
+        """Remove the models not in names; returns {name: set of n3-encoded triples} of the removed ones."""
+        removed = {}
+        for name, triples in self.db.execute("SELECT name, triples FROM models").fetchall():
+            if name not in names:
+                removed[name] = {tuple(encoded) for encoded in json.loads(triples)}
+        self.db.executemany("DELETE FROM models WHERE name = ?", [(name,) for name in removed])
+        return removed
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+def open_manifest(file_path):
+    """Manifest of file_path, rebuilt from the graph when it is new or out of date."""
+    manifest = Manifest(file_path)
+    key = manifest.graph_key()
+    if key != graph_file_key(file_path):
+        if key is None:
+            print(f"No manifest for {file_path}, building it from the graph")
+        else:
+            print(f"{file_path} changed since the last update, rebuilding the manifest")
+        manifest.rebuild()
+    return manifest
+
+def read_dump(dump_path):
+    """Yield the records of a JSONL dump."""
+    with open(dump_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "name" not in record:
+                raise ValueError(f"{dump_path}:{line_number}: record without a name")
+            yield record
+
+def update_graph(file_path, dump_path, prune=False):
+    """Append the changes of a dump to the graph's delta; returns counters of what changed."""
+    manifest = open_manifest(file_path)
+    try:
+        cover_tags_by_problem = manifest.cover_tags_by_problem()
+        stats = {"records": 0, "unchanged": 0, "added": 0, "updated": 0, "removed": 0,
+                 "triples_added": 0, "triples_removed": 0}
+        delta = []
+        seen = set()
+
+        for record in read_dump(dump_path):
+            stats["records"] += 1
+            name = str(record["name"])
+            seen.add(name)
+            digest = record_hash(record)
+            entry = manifest.get(name)
+            if entry is not None and entry[0] == digest:
+                stats["unchanged"] += 1
+                continue
+
+            old = entry[1] if entry else set()
+            # keep the subject the model already has in the graph
+            subject = from_n3(next(iter(old))[0]) if old else None
+            new = {_encode(triple) for triple in record_triples(record, subject, cover_tags_by_problem)}
+            delta += [("-", encoded) for encoded in sorted(old - new)]
+            delta += [("+", encoded) for encoded in sorted(new - old)]
+            manifest.put(name, digest, new)
+            if entry is None:
+                stats["added"] += 1
+            elif old != new:
+                stats["updated"] += 1
+            else:
+                stats["unchanged"] += 1
+
+        if prune:
+            removed = manifest.remove_all_but(seen)
+            for name, old in removed.items():
+                delta += [("-", encoded) for encoded in sorted(old)]
+            stats["removed"] = len(removed)
+
+        stats["triples_added"] = sum(1 for op, _ in delta if op == "+")
+        stats["triples_removed"] = len(delta) - stats["triples_added"]
+        if delta:
+            with open(graph_delta_path(file_path), "a", encoding="utf-8") as f:
+                for op, encoded in delta:
+                    f.write(json.dumps([op, *encoded]) + "\n")
+        manifest.set_graph_key()
+        manifest.commit()
+        return stats
+    finally:
+        manifest.close()
+
+def fold_graph_delta(file_path):
+    """Rewrite the graph file with its delta applied and drop the delta."""
+    delta_path = graph_delta_path(file_path)
+    if not os.path.exists(delta_path):
+        return False
+    graph = load_graph(file_path)
+    tmp_path = str(file_path) + ".tmp"
+    graph.serialize(tmp_path, format="turtle")
+    os.replace(tmp_path, file_path)
+    os.remove(delta_path)
+    # the manifest still describes the same triples, only the key of the graph changed
+    if os.path.exists(manifest_path(file_path)):
+        manifest = Manifest(file_path)
+        manifest.set_graph_key()
+        manifest.commit()
+        manifest.close()
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental graph updates from a model catalog dump")
+    parser.add_argument("graph", help="path to the Turtle graph file")
+    parser.add_argument("dump", nargs="?", help="JSONL dump of model records")
+    parser.add_argument("--prune", action="store_true",
+                        help="remove the models that are not in the dump")
+    parser.add_argument("--fold", action="store_true",
+                        help="rewrite the graph file with the delta applied and remove the delta")
+    args = parser.parse_args()
+
+    if args.dump:
+        start = time.perf_counter()
+        stats = update_graph(args.graph, args.dump, args.prune)
+        print(f"{stats['records']} records: {stats['added']} added, {stats['updated']} updated, "
+              f"{stats['removed']} removed, {stats['unchanged']} unchanged")
+        print(f"Delta: +{stats['triples_added']} -{stats['triples_removed']} triples "
+              f"in {time.perf_counter() - start:.2f} s")
+    if args.fold:
+        if fold_graph_delta(args.graph):
+            print(f"Folded the delta into {args.graph}")
+        else:
+            print(f"No delta to fold for {args.graph}")
+    if not args.dump and not args.fold:
+        parser.error("give a dump to apply and/or --fold")
+
+if __name__ == '__main__':
+    main()
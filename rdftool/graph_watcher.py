@@ -0,0 +1,70 @@
+"""Hot reload of a graph file without restarting the node.
+
+GraphWatcher polls the graph file and the delta graph_updater writes next
+to it; when either changes it builds the new graph in its own thread and
+hands it to a callback, which swaps it in.
+Callbacks that are already running keep the graph they started with.
+"""
+
+import os
+import threading
+import time
+
+from rdftool.rdfCode import graph_delta_path, graph_file_key
+
+class GraphWatcher(threading.Thread):
+    """Reload file_path with load() whenever it changes and pass the result to on_reload()."""
+
+    def __init__(self, file_path, load, on_reload, interval=5.0):
+        super().__init__(name="GraphWatcher", daemon=True)
+        self.file_path = file_path
+        self.load = load
+        self.on_reload = on_reload
+        self.interval = interval
+        self.version = 1
+        self._stop_event = threading.Event()
+        self._stat = self._file_stat()
+        self._key = graph_file_key(file_path) if self._stat else None
+
+    def _file_stat(self):
+        try:
+            st = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        try:
+            delta = os.stat(graph_delta_path(self.file_path))
+            delta_stat = (delta.st_mtime_ns, delta.st_size, delta.st_ino)
+        except FileNotFoundError:
+            delta_stat = None
+        return (st.st_mtime_ns, st.st_size, st.st_ino, delta_stat)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            stat = self._file_stat()
+            if stat is None or stat == self._stat:
+                continue
+            # Wait for the file to settle so a file still being written is not loaded
+            time.sleep(min(self.interval, 1.0))
+            if self._file_stat() != stat:
+                continue
+            self._stat = stat
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Error reloading graph {self.file_path}, keeping the current one: {e}")
+
+    def check(self):
+        """Reload now if the file content differs from the loaded one; return True if it did."""
+        key = graph_file_key(self.file_path)
+        if key == self._key:
+            return False
+        start = time.perf_counter()
+        graph = self.load(self.file_path)
+        seconds = time.perf_counter() - start
+        self._key = key
+        self.version += 1
+        self.on_reload(graph, {"version": self.version, "key": key.split(":")[0][:12], "seconds": seconds})
+        return True
@@ -0,0 +1,280 @@
+"""Where the memory of a graph-backed node goes.
+
+memory_report(graph) breaks the footprint of the process down into the
+loaded graph, the indexes and query caches built over it and the ML
+frameworks it imported. It is what the "stats, memory" configuration
+request of the nodes returns.
+
+Two sources feed it:
+
+    RSS         the resident set size from /proc, sampled in the background
+                by RssSampler so the report shows the range it moved in,
+                not only the value at request time
+    tracemalloc Python allocations grouped by the module that made them
+                (rdflib stores, rdflib terms, rdftool indexes, each
+                framework); only collected when tracing was started before
+                the graph was loaded, SUSTAINML_TRACE_MEMORY=1 in the nodes
+
+Native memory (oxigraph, torch, onnxruntime buffers) never shows up in
+tracemalloc; it is the part of RSS the traced total does not explain.
+"""
+
+import collections
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+# module -> category of its allocations, first match wins
+TRACED_CATEGORIES = (
+    ("rdflib/plugins/stores/", "graph_store"),
+    ("rdftool/compact_store.py", "graph_store"),
+    ("rdflib/term.py", "terms"),
+    ("rdflib/plugins/parsers/", "terms"),
+    ("rdftool/catalog_index.py", "indexes"),
+    ("rdftool/metric_views.py", "indexes"),
+    ("rdftool/query_cache.py", "query_caches"),
+    ("rdftool/rdfCode.py", "query_results"),
+    ("rdflib/", "rdflib_other"),
+)
+FRAMEWORKS = ("rdflib", "torch", "tensorflow", "transformers", "onnx", "onnxruntime", "ultralytics",
+              "cv2", "PIL", "numpy", "ollama", "pyoxigraph")
+
+def rss_bytes():
+    """Resident set size of this process, from /proc."""
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def peak_rss_bytes():
+    """Highest resident set size of this process so far, or None where /proc does not report it."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+# fields of /proc/<pid>/smaps summed by smaps_memory
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+def smaps_memory(pid="self", path=None):
+    """Rss, Pss and the shared/private split of a process from /proc/<pid>/smaps, in bytes.
+
+    With path, only the mappings of that file count. None where /proc has no smaps.
+    """
+    path = path and os.path.realpath(path)
+    totals = dict.fromkeys(SMAPS_FIELDS, 0)
+    counted = path is None
+    try:
+        with open(f"/proc/{pid}/smaps") as smaps:
+            for line in smaps:
+                name, _, rest = line.partition(":")
+                if " " in name:
+                    # a mapping header: address range, permissions, offset, device, inode, pathname
+                    fields = line.split(None, 5)
+                    counted = path is None or (len(fields) == 6 and fields[5].strip() == path)
+                elif counted and name in totals:
+                    totals[name] += int(rest.split()[0]) * 1024
+    except OSError:
+        return None
+    return {name.lower() + "_bytes": value for name, value in totals.items()}
+
+def start_tracing(frames=1):
+    """Start tracemalloc; only allocations made from now on are attributed."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+class RssSampler:
+    """Daemon thread keeping the last samples of the resident set size."""
+
+    def __init__(self, interval=10.0, samples=360):
+        self.interval = interval
+        self._samples = collections.deque(maxlen=samples)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self.sample()
+            time.sleep(self.interval)
+
+    def sample(self):
+        with self._lock:
+            self._samples.append((time.time(), rss_bytes()))
+
+    def summary(self):
+        with self._lock:
+            samples = list(self._samples)
+        if not samples:
+            return {"count": 0}
+        values = [rss for _, rss in samples]
+        return {
+            "count": len(samples),
+            "interval_seconds": self.interval,
+            "since": samples[0][0],
+            "min_bytes": min(values),
+            "max_bytes": max(values),
+            "last_bytes": values[-1],
+        }
+
+rss_sampler = RssSampler()
+
+def start_from_env():
+    """Start tracing and RSS sampling as the SUSTAINML_* environment variables ask."""
+    # tracemalloc slows every allocation down, so it is off unless asked for
+    if os.environ.get("SUSTAINML_TRACE_MEMORY", "0") == "1":
+        start_tracing()
+    rss_sampler.interval = float(os.environ.get("SUSTAINML_RSS_SAMPLE_INTERVAL", "10"))
+    if rss_sampler.interval > 0:
+        rss_sampler.start()
+
+def deep_sizeof(obj, seen=None):
+    """Bytes held by obj and every container, term and attribute it reaches, each object counted once."""
+    seen = set() if seen is None else seen
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, collections.deque)):
+            stack.extend(obj)
+        elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+            stack.append(vars(obj))
+    return size
+
+def graph_memory(graph):
+    """What holds the graph: backend, store, triple count and any memory-mapped bytes."""
+    # CatalogIndex wraps another backend, which may wrap the rdflib graph
+    backend = graph
+    while hasattr(backend, "backend"):
+        backend = backend.backend
+    rdflib_graph = getattr(graph, "graph", graph)
+    info = {
+        "backend": type(graph).__name__,
+        "query_engine": getattr(graph, "kind", None) or "rdflib",
+        "triples": len(graph),
+    }
+    store = getattr(backend, "store", None) or getattr(rdflib_graph, "store", None)
+    if store is not None:
+        info["store"] = type(store).__name__
+        if hasattr(store, "mapped_bytes"):
+            # the pages of the file are shared with the other processes mapping it; what they hold
+            # decoded (terms, indexes) is not, see smaps_memory of the whole process
+            info["mapped_bytes"] = store.mapped_bytes()
+            info["mapping"] = smaps_memory(path=store.path)
+    return info
+
+def cache_memory(graph):
+    """Size and counters of the caches and indexes built over the graph."""
+    # imported here so the module can be loaded without rdfCode's dependencies
+    from rdftool.catalog_index import CatalogIndex
+    from rdftool.rdfCode import query_cache, _prepared_queries
+
+    caches = {
+        "query_cache": dict(query_cache.stats(), bytes=deep_sizeof(query_cache.values())),
+        "prepared_queries": {"size": len(_prepared_queries)},
+    }
+    # metric_views(), model_search() and goal_classifier() keep (version, built) on the graph
+    for name in ("metric_views", "model_search", "goal_classifier"):
+        built = getattr(graph, f"_{name}", None)
+        if built is not None:
+            caches[name] = {"bytes": deep_sizeof(built[1])}
+    if isinstance(graph, CatalogIndex):
+        # the index refers to the graph's terms, so they are counted here too
+        # what the builders above keep on the graph is reported on its own
+        skipped = ("graph", "backend", "_metric_views", "_model_search", "_goal_classifier")
+        indexes = [value for name, value in vars(graph).items() if name not in skipped]
+        caches["catalog_index"] = {"bytes": deep_sizeof(indexes)}
+    return caches
+
+def loaded_frameworks():
+    """Versions of the ML and graph libraries this process imported."""
+    frameworks = {}
+    for name in FRAMEWORKS:
+        module = sys.modules.get(name)
+        if module is not None:
+            frameworks[name] = getattr(module, "__version__", None)
+    return frameworks
+
+def _category(filename):
+    path = filename.replace(os.sep, "/")
+    for fragment, category in TRACED_CATEGORIES:
+        if fragment in path:
+            return category
+    for name in FRAMEWORKS:
+        if f"/{name}/" in path:
+            return name
+    return "other"
+
+def traced_memory(top=10):
+    """Python allocations still alive, by category and by the modules allocating the most."""
+    if not tracemalloc.is_tracing():
+        return {"enabled": False}
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)])
+    by_category = collections.Counter()
+    by_file = snapshot.statistics("filename")
+    for stat in by_file:
+        by_category[_category(stat.traceback[0].filename)] += stat.size
+    return {
+        "enabled": True,
+        "current_bytes": current,
+        "peak_bytes": peak,
+        "by_category": dict(by_category.most_common()),
+        "top_files": [{"file": stat.traceback[0].filename, "bytes": stat.size, "blocks": stat.count}
+                      for stat in by_file[:top]],
+    }
+
+def memory_report(graph=None):
+    """Memory footprint of this process, broken down as far as it can be."""
+    rss = rss_bytes()
+    report = {
+        "pid": os.getpid(),
+        "rss_bytes": rss,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "rss_samples": rss_sampler.summary(),
+        "frameworks": loaded_frameworks(),
+        "traced": traced_memory(),
+    }
+    if report["traced"]["enabled"]:
+        report["untraced_bytes"] = max(rss - report["traced"]["current_bytes"], 0)
+    if graph is not None:
+        report["graph"] = graph_memory(graph)
+        report["caches"] = cache_memory(graph)
+    return report
+
+def main():
+    import argparse
+    import json
+
+    from rdftool.graph_backends import BACKENDS, open_backend
+    from rdftool.rdfCode import load_graph
+
+    parser = argparse.ArgumentParser(description="Memory footprint of a loaded graph and its caches")
+    parser.add_argument("graph", help="path to the Turtle graph file")
+    parser.add_argument("--backend", default="index", choices=BACKENDS)
+    parser.add_argument("--compact", action="store_true", help="serve the graph from the compact store")
+    args = parser.parse_args()
+
+    start_tracing()
+    graph = open_backend(load_graph(args.graph, compact=args.compact), args.backend)
+    rss_sampler.sample()
+    print(json.dumps(memory_report(graph), indent=2))
+
+if __name__ == '__main__':
+    main()
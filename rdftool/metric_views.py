@@ -0,0 +1,69 @@
+"""Materialized metric views over a loaded graph.
+
+The "metrics" configuration requests ask for the distinct metrics of the
+models behind a cover tag, a modality pair or a problem. MetricViews works
+those sets out once per graph, sorted and deduplicated, so a request is a
+dict lookup. metric_views() keeps the views on the graph they were built
+for and rebuilds them whenever its version changes.
+"""
+
+from rdftool.query_cache import built_for_graph, graph_version
+from rdftool.rdfCode import (
+    get_all_metrics, get_cover_tags, get_modalities_input, get_modalities_output, get_problems,
+    get_problems_for_cover_tag, find_problem_by_modalities, search_metrics_for_problems
+)
+from rdftool.schema import CONN
+
+def _merge(metric_sets):
+    merged = set()
+    for metrics in metric_sets:
+        merged.update(metrics)
+    return tuple(sorted(merged))
+
+class MetricViews:
+    """Sorted, distinct metric names per cover tag, modality pair, problem and (problem, tag)."""
+
+    def __init__(self, graph):
+        self.version = graph_version(graph)
+
+        # problem -> model -> [metrics] for the whole catalog, in a fixed number of queries
+        metrics_by_problem = search_metrics_for_problems(graph, [str(p) for p in get_problems(graph)])
+
+        self.by_problem = {}
+        by_problem_and_tag = {}
+        for problem, models in metrics_by_problem.items():
+            self.by_problem[problem] = _merge(models.values())
+            for model, metrics in models.items():
+                for _, _, tag in graph.triples((model, CONN.hasTag, None)):
+                    by_problem_and_tag.setdefault((problem, str(tag)), []).append(metrics)
+        self.by_problem_and_tag = {key: _merge(sets) for key, sets in by_problem_and_tag.items()}
+
+        self.by_cover_tag = {}
+        for cover_tag in get_cover_tags(graph):
+            problems = get_problems_for_cover_tag(graph, cover_tag)
+            self.by_cover_tag[str(cover_tag)] = _merge(self.by_problem.get(str(p), ()) for p in problems)
+
+        self.by_modalities = {}
+        for input_modality in get_modalities_input(graph):
+            for output_modality in get_modalities_output(graph):
+                problems = find_problem_by_modalities(graph, input_modality, output_modality)
+                if problems:
+                    self.by_modalities[(str(input_modality), str(output_modality))] = _merge(
+                        self.by_problem.get(str(p), ()) for p in problems)
+
+        self.all = tuple(sorted(set(get_all_metrics(graph))))
+
+    def for_cover_tag(self, cover_tag):
+        return self.by_cover_tag.get(cover_tag, ())
+
+    def for_modalities(self, input_modality, output_modality):
+        return self.by_modalities.get((input_modality, output_modality), ())
+
+    def for_problem(self, problem, tag=None):
+        if tag is None:
+            return self.by_problem.get(problem, ())
+        return self.by_problem_and_tag.get((problem, tag), ())
+
+def metric_views(graph):
+    """Views of graph, built on first use and again whenever its version changes."""
+    return built_for_graph(graph, "_metric_views", MetricViews)
@@ -0,0 +1,188 @@
+"""Search over model names, ids and tags, for search-as-you-type.
+
+ModelSearch is built once per graph version and answers four kinds of
+lookups without touching the graph:
+
+    exact       a dict from the lower-cased key, O(1)
+    prefix      bisect over the sorted keys
+    substring   trigrams of the query narrow the keys down, each candidate
+                is then checked with `in`
+    fuzzy       keys sharing the most trigrams with the query are ranked by
+                edit distance, the k closest are returned
+
+search() runs them in that order and returns the k best models, most
+downloaded first among equally good matches.
+
+    python -m rdftool.model_search graph_v2.ttl "llama 3" --k 5
+"""
+
+import argparse
+import heapq
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from rdftool.graph_backends import as_backend
+from rdftool.query_cache import built_for_graph, graph_version
+from rdftool.schema import CONN
+
+def _trigrams(text):
+    # padded so one and two character keys still have trigrams
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def edit_distance(a, b, limit=None):
+    """Levenshtein distance between a and b; anything above limit is returned as limit + 1."""
+    if limit is not None and abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+class ModelSearch:
+    """Exact, prefix, substring and edit-distance lookups over model names, ids and tags."""
+
+    def __init__(self, graph):
+        self.version = graph_version(graph)
+        backend = as_backend(graph)
+
+        # one scan per predicate, rather than a lookup per model
+        names = {model: str(name) for model, _, name in backend.triples((None, CONN.model_name, None))}
+        keys = {}
+        for name in names.values():
+            keys.setdefault(name.lower(), set()).add(name)
+            # "org/model" is also found as "model"
+            if "/" in name:
+                keys.setdefault(name.rsplit("/", 1)[1].lower(), set()).add(name)
+        for predicate in (CONN.model_id, CONN.hasTag):
+            for model, _, value in backend.triples((None, predicate, None)):
+                if model in names:
+                    keys.setdefault(str(value).lower(), set()).add(names[model])
+        self.downloads = {}
+        for model, _, downloads in backend.triples((None, CONN.downloads, None)):
+            if model in names:
+                try:
+                    self.downloads[names[model]] = int(float(downloads))
+                except ValueError:
+                    pass
+
+        self._models = {key: tuple(sorted(models)) for key, models in keys.items()}
+        self._keys = sorted(self._models)
+        self._trigram_keys = {}
+        for position, key in enumerate(self._keys):
+            for trigram in _trigrams(key):
+                self._trigram_keys.setdefault(trigram, []).append(position)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def exact(self, query, k=None):
+        query = query.lower()
+        return self._rank([query] if query in self._models else [], k)
+
+    def _prefix_keys(self, query):
+        start = bisect_left(self._keys, query)
+        for key in self._keys[start:]:
+            if not key.startswith(query):
+                break
+            yield key
+
+    def prefix(self, query):
+        return self._rank(self._prefix_keys(query.lower()))
+
+    def _substring_keys(self, query):
+        if len(query) < 3:
+            return [key for key in self._keys if query in key]
+        # every key containing the query contains all of its inner trigrams
+        inner = [query[i:i + 3] for i in range(len(query) - 2)]
+        postings = sorted((self._trigram_keys.get(trigram, []) for trigram in inner), key=len)
+        candidates = set(postings[0])
+        for positions in postings[1:]:
+            candidates.intersection_update(positions)
+            if not candidates:
+                break
+        return [self._keys[position] for position in sorted(candidates) if query in self._keys[position]]
+
+    def substring(self, query):
+        return self._rank(self._substring_keys(query.lower()))
+
+    def fuzzy(self, query, k=10, max_distance=None, candidates=200):
+        """[(model, distance)] of the k models closest to query by edit distance."""
+        query = query.lower()
+        if max_distance is None:
+            max_distance = max(1, len(query) // 3)
+        shared = Counter()
+        for trigram in _trigrams(query):
+            shared.update(self._trigram_keys.get(trigram, ()))
+        scored = []
+        for position, _ in shared.most_common(candidates):
+            key = self._keys[position]
+            distance = edit_distance(query, key, max_distance)
+            if distance <= max_distance:
+                scored.append((distance, key))
+        best = {}
+        for distance, key in sorted(scored):
+            for model in self._models[key]:
+                best.setdefault(model, distance)
+        ranked = sorted(best.items(), key=lambda item: (item[1], -self.downloads.get(item[0], 0), item[0]))
+        return ranked[:k]
+
+    def _rank(self, keys, k=None):
+        models = {model for key in keys for model in self._models[key]}
+        order = lambda model: (-self.downloads.get(model, 0), model)
+        return sorted(models, key=order) if k is None else heapq.nsmallest(k, models, key=order)
+
+    def search(self, query, k=10):
+        """[{"model", "match", "distance"}] of the k best matches: exact first, then prefix, substring and fuzzy."""
+        query = query.strip().lower()
+        if not query or k <= 0:
+            return []
+        results = {}
+
+        def add(match, ranked):
+            for model, distance in ranked:
+                if len(results) >= k:
+                    return
+                if model not in results:
+                    results[model] = {"model": model, "match": match, "distance": distance}
+
+        add("exact", [(model, 0) for model in self.exact(query, k)])
+        add("prefix", [(model, None) for model in self._rank(self._prefix_keys(query), k + len(results))])
+        if len(results) < k:
+            add("substring", [(model, None) for model in self._rank(self._substring_keys(query), k + len(results))])
+        if len(results) < k:
+            add("fuzzy", self.fuzzy(query, k + len(results)))
+        return list(results.values())
+
+def model_search(graph):
+    """Search index of graph, built on first use and again whenever its version changes."""
+    return built_for_graph(graph, "_model_search", ModelSearch)
+
+def main():
+    from rdftool.rdfCode import load_graph
+
+    parser = argparse.ArgumentParser(description="Search model names, ids and tags of a graph")
+    parser.add_argument("graph", help="path to the Turtle graph file")
+    parser.add_argument("query")
+    parser.add_argument("--k", type=int, default=10, help="number of models to return")
+    args = parser.parse_args()
+
+    graph = load_graph(args.graph)
+    start = time.perf_counter()
+    search = ModelSearch(graph)
+    print(f"Indexed {len(search)} keys in {(time.perf_counter() - start) * 1000:.1f} ms")
+    start = time.perf_counter()
+    results = search.search(args.query, args.k)
+    print(f"Searched in {(time.perf_counter() - start) * 1000:.2f} ms")
+    for result in results:
+        distance = "" if result["distance"] is None else f" (distance {result['distance']})"
+        print(f"{result['match']:<10} {result['model']}{distance}")
+
+if __name__ == '__main__':
+    main()
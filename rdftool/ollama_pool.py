@@ -0,0 +1,124 @@
+"""Long-lived Ollama client shared by the callbacks of a node.
+
+One ollama.Client is created per node and kept for its lifetime, so its
+httpx connection pool keeps sockets to the Ollama server open between
+tasks instead of connecting for every one. Concurrent callbacks share it
+through OllamaPool.chat(), which lets at most max_connections requests
+run at once. The others wait for a free socket here rather than in the
+queue of the httpx pool, which failed waiting requests with read errors
+when more threads than sockets were busy.
+
+The pool counts the requests it sends and the TCP connections it opens,
+from httpcore's trace events; requests minus connections is how many
+requests went over a socket that was already open.
+
+The SUSTAINML_OLLAMA_* environment variables configure it:
+
+    SUSTAINML_OLLAMA_HOST              server URL (http://localhost:11434)
+    SUSTAINML_OLLAMA_TIMEOUT           seconds to wait for a response (300)
+    SUSTAINML_OLLAMA_CONNECT_TIMEOUT   seconds to wait for a connection (5)
+    SUSTAINML_OLLAMA_MAX_CONNECTIONS   sockets open at once (4)
+    SUSTAINML_OLLAMA_KEEPALIVE         seconds an idle socket is kept (300)
+"""
+
+import os
+import threading
+import time
+
+import httpx
+from ollama import Client
+
+class _CountingTransport(httpx.HTTPTransport):
+    """httpx transport counting requests and the connections opened for them."""
+
+    def __init__(self, on_request, on_trace, **kwargs):
+        super().__init__(**kwargs)
+        self._on_request = on_request
+        self._on_trace = on_trace
+
+    def handle_request(self, request):
+        self._on_request()
+        request.extensions = dict(request.extensions, trace=self._on_trace)
+        return super().handle_request(request)
+
+class OllamaPool:
+    """Lazily created, shared ollama.Client with connection reuse counters."""
+
+    def __init__(self, host="http://localhost:11434", timeout=300.0, connect_timeout=5.0,
+                 max_connections=4, keepalive_expiry=300.0):
+        self.host = host
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self._client = None
+        self._transport = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self.requests = 0
+        self.connections_opened = 0
+        self.created_at = None
+
+    @property
+    def client(self):
+        """The shared ollama.Client, created on first use."""
+        with self._lock:
+            if self._client is None:
+                # ollama.Client builds its httpx.Client itself, the pool keeps the transport holding
+                # its sockets so close() can shut them without reaching into the client
+                self._transport = _CountingTransport(
+                    self._count_request, self._trace,
+                    limits=httpx.Limits(max_connections=self.max_connections,
+                                        max_keepalive_connections=self.max_connections,
+                                        keepalive_expiry=self.keepalive_expiry),
+                )
+                self._client = Client(
+                    host=self.host,
+                    timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                    transport=self._transport,
+                )
+                self.created_at = time.time()
+            return self._client
+
+    def chat(self, **kwargs):
+        """ollama.Client.chat on the shared client, once a connection slot is free."""
+        with self._slots:
+            return self.client.chat(**kwargs)
+
+    def _count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def _trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connections_opened += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "host": self.host,
+                "max_connections": self.max_connections,
+                "created_at": self.created_at,
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "requests_on_reused_connections": max(self.requests - self.connections_opened, 0),
+                "reuse_rate": 1 - self.connections_opened / self.requests if self.requests else 0.0,
+            }
+
+    def close(self):
+        """Close the pooled sockets; the next use of client creates a new pool."""
+        with self._lock:
+            transport, self._transport, self._client = self._transport, None, None
+        if transport is not None:
+            transport.close()
+
+def pool_from_env():
+    """OllamaPool configured by the SUSTAINML_OLLAMA_* environment variables."""
+    return OllamaPool(
+        host=os.environ.get("SUSTAINML_OLLAMA_HOST", "http://localhost:11434"),
+        timeout=float(os.environ.get("SUSTAINML_OLLAMA_TIMEOUT", "300")),
+        connect_timeout=float(os.environ.get("SUSTAINML_OLLAMA_CONNECT_TIMEOUT", "5")),
+        max_connections=int(os.environ.get("SUSTAINML_OLLAMA_MAX_CONNECTIONS", "4")),
+        keepalive_expiry=float(os.environ.get("SUSTAINML_OLLAMA_KEEPALIVE", "300")),
+    )
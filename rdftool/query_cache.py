@@ -0,0 +1,140 @@
+"""Versioned LRU cache for rdfCode query results.
+
+Entries are keyed by function name, graph version and arguments. Every
+graph gets a version token the first time it is seen; mark_graph_changed()
+gives it a new one and drops every cached entry at once, which is what
+load_graph and anything that mutates a loaded graph call.
+"""
+
+import functools
+import itertools
+import threading
+from collections import OrderedDict
+
+_versions = itertools.count(1)
+_caches = []
+
+def graph_version(graph):
+    """Version token of a graph; changes whenever the graph is reloaded or modified."""
+    version = getattr(graph, "_graph_version", None)
+    if version is None:
+        version = graph._graph_version = next(_versions)
+    # len() catches changes nobody announced; it is O(1) on rdflib graphs, the compact store and
+    # the indexes, and the oxigraph backend counts its store once, as nothing writes to it
+    return (version, len(graph))
+
+def mark_graph_changed(graph):
+    """Give graph a new version and invalidate every query cache."""
+    graph._graph_version = next(_versions)
+    for cache in _caches:
+        cache.clear()
+    return graph._graph_version
+
+def copy_result(value):
+    """Copy of a query result: its dicts, lists, sets and tuples all the way down.
+
+    The rdflib terms, strings and numbers in them are immutable and shared with the original.
+    """
+    kind = type(value)
+    if kind is dict:
+        return {key: copy_result(item) for key, item in value.items()}
+    if kind is list:
+        return [copy_result(item) for item in value]
+    if kind is tuple:
+        return tuple(copy_result(item) for item in value)
+    if kind is set:
+        return {copy_result(item) for item in value}
+    return value
+
+_built_lock = threading.Lock()
+
+def built_for_graph(graph, name, build):
+    """build(graph), kept on the graph itself under name and built again when its version changes.
+
+    Each graph carries its own, so while a reload builds the next graph the one still being
+    served keeps what was built for it, and it goes away with the graph.
+    """
+    version = graph_version(graph)
+    built = getattr(graph, name, None)
+    if built is None or built[0] != version:
+        with _built_lock:
+            built = getattr(graph, name, None)
+            if built is None or built[0] != version:
+                built = (version, build(graph))
+                setattr(graph, name, built)
+    return built[1]
+
+class QueryCache:
+    """Thread-safe, bounded LRU cache with hit/miss/eviction counters."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        _caches.append(self)
+
+    def get(self, key):
+        """Return (True, value) on a hit and (False, None) on a miss."""
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def values(self):
+        """Snapshot of the cached values, least recently used first."""
+        with self._lock:
+            return list(self._entries.values())
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def cached(self, func):
+        """Decorator caching func(graph, *args) per graph version."""
+        @functools.wraps(func)
+        def wrapper(graph, *args, **kwargs):
+            try:
+                key = (func.__name__, graph_version(graph), args, tuple(sorted(kwargs.items())))
+                hash(key)
+            except (TypeError, AttributeError):
+                # unhashable arguments, or a graph that cannot carry a version
+                return func(graph, *args, **kwargs)
+
+            found, value = self.get(key)
+            if not found:
+                value = func(graph, *args, **kwargs)
+                self.put(key, value)
+            # callers get their own containers down to the terms, the cached ones stay intact
+            return copy_result(value)
+        return wrapper
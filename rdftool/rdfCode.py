@@ -1,218 +1,746 @@
-from rdflib import Graph, Namespace, RDF, Literal
+import hashlib
+import itertools
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+
+import rdflib
+from rdflib import Graph, RDF, Literal, URIRef, BNode
 from rdflib.namespace import XSD
-
-def load_graph(file_path):
+from rdflib.util import from_n3
+
+from rdftool.catalog_index import CatalogIndex
+from rdftool.compact_store import CompactStore, compact_path, read_compact_key, write_compact_store
+from rdftool.graph_backends import as_backend
+from rdftool.query_cache import QueryCache, mark_graph_changed
+from rdftool.schema import CONN, METRIC
+
+def _to_int(text):
+    try:
+        return int(text)
+    except ValueError:
+        return int(float(text))
+
+# Properties converted to native numeric literals when a graph is loaded
+NUMERIC_PREDICATES = {
+    CONN.downloads: (XSD.integer, _to_int),
+    CONN.likes: (XSD.integer, _to_int),
+    CONN.parameters: (XSD.integer, _to_int),
+    METRIC.hasScore: (XSD.double, float),
+}
+
+# Results of the query functions below, per graph version
+query_cache = QueryCache(maxsize=1024)
+
+# Bump when the layout of the binary snapshot, or what is done to the graph
+# before it is written (e.g. normalize_numeric_literals), changes
+SNAPSHOT_FORMAT = 3
+SNAPSHOT_SUFFIX = ".snapshot"
+# magic | header length (uint32) | JSON header (key, namespaces, terms) | uint32 term ids
+SNAPSHOT_MAGIC = b"SMLSNP03"
+# Changes written by graph_updater, applied on top of the graph file when it is loaded
+DELTA_SUFFIX = ".delta"
+
+def load_graph(file_path, use_snapshot=True, compact=False, include_problems=None, exclude_problems=None):
+    ###########################################################
+    ### load and parse the graph file. A binary snapshot    ###
+    ### stored next to it is used instead of the Turtle     ###
+    ### parser while the file content does not change.      ###
+    ### With compact=True the queried predicates are served ###
+    ### from a read-only memory-mapped store instead (see   ###
+    ### compact_store). A delta written by graph_updater is ###
+    ### applied on top.                                     ###
+    ### The include/exclude lists keep only the problems    ###
+    ### that pass them and their models (filter_graph):     ###
+    ###########################################################
+    filters = graph_filters(include_problems, exclude_problems)
+    key = None
+    if use_snapshot or compact:
+        key = graph_file_key(file_path)
+
+    if compact:
+        # a filtered graph gets its own store, keyed by the filters as well
+        store_path = compact_path(file_path, filters and filters_digest(filters))
+        store_key = key if not filters else f"{key}:{filters_digest(filters)}"
+        if read_compact_key(store_path) == store_key:
+            return _loaded(Graph(store=CompactStore(store_path)))
+
+    # the snapshot always holds the whole file without its delta, so every filter
+    # combination and every delta can share it
+    g = None
+    if use_snapshot:
+        base_key = graph_file_key(file_path, include_delta=False)
+        g = load_graph_snapshot(snapshot_path(file_path), base_key)
+
+    if g is None:
+        g = Graph()
+        g.parse(file_path, format="turtle")
+        normalize_numeric_literals(g)
+        if use_snapshot:
+            try:
+                write_graph_snapshot(g, snapshot_path(file_path), base_key)
+            except OSError as e:
+                print(f"Could not write graph snapshot for {file_path}: {e}")
+
+    if os.path.exists(graph_delta_path(file_path)):
+        apply_graph_delta(g, graph_delta_path(file_path))
+
+    if filters:
+        filter_graph(g, **filters)
+
+    if compact:
+        write_compact_store(g, store_path, store_key)
+        return _loaded(Graph(store=CompactStore(store_path)))
+    return _loaded(g)
+
+def graph_filters(include_problems=None, exclude_problems=None):
+    ###########################################################
+    ### the given load filters as a dict of sorted lists,   ###
+    ### empty when nothing is filtered:                     ###
+    ###########################################################
+    filters = {
+        "include_problems": include_problems,
+        "exclude_problems": exclude_problems,
+    }
+    return {name: sorted({str(value) for value in values}) for name, values in filters.items() if values is not None}
+
+def filters_digest(filters):
+    ###########################################################
+    ### short stable digest of a graph_filters() dict:      ###
     ###########################################################
-    ### load and parse the graph file:                      ###
+    return hashlib.sha256(repr(sorted(filters.items())).encode()).hexdigest()[:12]
+
+def filter_graph(graph, include_problems=None, exclude_problems=None):
     ###########################################################
+    ### drop the problems that do not pass the filters,     ###
+    ### with every model that only solves those problems    ###
+    ### and the metrics only those models use. Returns the  ###
+    ### number of triples removed:                          ###
+    ###########################################################
+    def passes(value, include, exclude):
+        value = str(value)
+        return (include is None or value in include) and (exclude is None or value not in exclude)
+
+    include_problems = include_problems and set(map(str, include_problems))
+    exclude_problems = exclude_problems and set(map(str, exclude_problems))
+
+    dropped = {problem for problem, _, _ in graph.triples((None, RDF.type, CONN.Problem))
+               if not passes(problem, include_problems, exclude_problems)}
+
+    # models that solve no problem that is kept
+    models = {m for m, _, _ in graph.triples((None, RDF.type, CONN.Model))}
+    dropped_models = set()
+    for model in models:
+        problems = set(graph.objects(model, CONN.hasProblem))
+        if problems and problems <= dropped:
+            dropped_models.add(model)
+
+    # metrics that only dropped models use
+    kept_metrics = {o for m, _, o in graph.triples((None, METRIC.hasMetric, None)) if m not in dropped_models}
+    dropped_metrics = {o for m, _, o in graph.triples((None, METRIC.hasMetric, None))
+                       if m in dropped_models and o not in kept_metrics}
+
+    removed = 0
+    for subject in dropped | dropped_models | dropped_metrics:
+        for triple in list(graph.triples((subject, None, None))):
+            graph.remove(triple)
+            removed += 1
+    # links from what is kept to what was dropped
+    for triple in list(graph.triples((None, CONN.hasProblem, None))):
+        if triple[2] in dropped:
+            graph.remove(triple)
+            removed += 1
+    return removed
+
+def _loaded(graph):
+    # a freshly loaded graph replaces whatever the cached results were computed on
+    mark_graph_changed(graph)
+    return graph
+
+def normalize_numeric_literals(graph):
+    ###########################################################
+    ### store downloads, likes, parameters and scores as    ###
+    ### native numeric literals, once, at load time, so     ###
+    ### queries sort and filter them without casting:       ###
+    ###########################################################
+    changed = 0
+    for predicate, (datatype, convert) in NUMERIC_PREDICATES.items():
+        for s, p, o in list(graph.triples((None, predicate, None))):
+            if not isinstance(o, Literal) or o.datatype == datatype:
+                continue
+            try:
+                value = convert(str(o).strip())
+            except ValueError:
+                # leave values that are not numbers untouched
+                continue
+            graph.remove((s, p, o))
+            graph.add((s, p, Literal(value, datatype=datatype)))
+            changed += 1
+    return changed
+
+def snapshot_path(file_path):
+    ###########################################################
+    ### path of the binary snapshot of a graph file:        ###
+    ###########################################################
+    return str(file_path) + SNAPSHOT_SUFFIX
+
+def graph_delta_path(file_path):
+    ###########################################################
+    ### path of the delta graph_updater writes for a file:  ###
+    ###########################################################
+    return str(file_path) + DELTA_SUFFIX
+
+def graph_file_key(file_path, include_delta=True):
+    ###########################################################
+    ### key identifying a graph file (and its delta, if     ###
+    ### any) and the way it is parsed: content hash, rdflib ###
+    ### and snapshot version:                               ###
+    ###########################################################
+    digest = hashlib.sha256()
+    paths = [file_path]
+    if include_delta and os.path.exists(graph_delta_path(file_path)):
+        paths.append(graph_delta_path(file_path))
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return f"{digest.hexdigest()}:{rdflib.__version__}:{SNAPSHOT_FORMAT}"
+
+def read_graph_delta(path):
+    ###########################################################
+    ### yield (op, triple) from a delta file; op is "+" to  ###
+    ### add the triple and "-" to remove it:                ###
+    ###########################################################
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                op, s, p, o = json.loads(line)
+                if op not in ("+", "-"):
+                    raise ValueError(f"unknown operation {op!r}")
+                yield op, (from_n3(s), from_n3(p), from_n3(o))
+            except ValueError as e:
+                raise ValueError(f"{path}:{line_number}: bad delta line: {e}") from e
+
+def apply_graph_delta(graph, path):
+    ###########################################################
+    ### apply a delta file to a graph in order, so a later  ###
+    ### line wins over an earlier one. Returns the number   ###
+    ### of triples added and removed:                       ###
+    ###########################################################
+    added = removed = 0
+    for op, triple in read_graph_delta(path):
+        if op == "+":
+            graph.add(triple)
+            added += 1
+        else:
+            graph.remove(triple)
+            removed += 1
+    mark_graph_changed(graph)
+    return added, removed
+
+def _encode_term(term):
+    if isinstance(term, Literal):
+        return ("L", str(term), str(term.datatype or ""), term.language or "")
+    if isinstance(term, BNode):
+        return ("B", str(term))
+    return ("U", str(term))
+
+def _decode_term(encoded):
+    if encoded[0] == "L":
+        return Literal(encoded[1], datatype=encoded[2] or None, lang=encoded[3] or None)
+    if encoded[0] == "B":
+        return BNode(encoded[1])
+    return URIRef(encoded[1])
+
+def write_graph_snapshot(graph, path, key):
+    ###########################################################
+    ### write the graph as interned terms plus an array of  ###
+    ### term ids, three per triple. Plain JSON and integers ###
+    ### only, so reading a snapshot never runs its content: ###
+    ###########################################################
+    term_ids = {}
+    terms = []
+    triples = array("I")
+    for triple in graph:
+        for term in triple:
+            term_id = term_ids.get(term)
+            if term_id is None:
+                term_id = term_ids[term] = len(terms)
+                terms.append(_encode_term(term))
+            triples.append(term_id)
+
+    header = json.dumps({
+        "key": key,
+        "namespaces": [(prefix, str(namespace)) for prefix, namespace in graph.namespaces()],
+        "terms": terms,
+    }).encode("utf-8")
+    if sys.byteorder != "little":
+        triples.byteswap()
+    # Write to a temporary file first so readers never see a partial snapshot
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        triples.tofile(f)
+    os.replace(tmp_path, path)
+
+def load_graph_snapshot(path, key):
+    ###########################################################
+    ### load a snapshot written by write_graph_snapshot.    ###
+    ### Returns None when it is missing or out of date:     ###
+    ###########################################################
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                return None
+            (length,) = struct.unpack("<I", f.read(4))
+            snapshot = json.loads(f.read(length))
+            if not isinstance(snapshot, dict) or snapshot.get("key") != key:
+                return None
+            ids = array("I", f.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, struct.error) as e:
+        print(f"Ignoring unreadable graph snapshot {path}: {e}")
+        return None
+    if sys.byteorder != "little":
+        ids.byteswap()
+
     g = Graph()
-    g.parse(file_path, format="turtle")
+    for prefix, namespace in snapshot["namespaces"]:
+        g.bind(prefix, namespace, override=True, replace=True)
+    terms = [_decode_term(encoded) for encoded in snapshot["terms"]]
+    g.addN((terms[ids[i]], terms[ids[i + 1]], terms[ids[i + 2]], g) for i in range(0, len(ids), 3))
     return g
 
-def get_cover_tags(graph):
-    ###########################################################
-    ### get cover tags (modalities) of machine learning:    ###
-    ###########################################################
-    query = """
+# SPARQL used by the functions below. Each query is parsed and translated to
+# algebra once, the first time it runs, and then executed with initBindings.
+QUERIES = {
+    "cover_tags": """
     PREFIX conn: <http://example.org/conn/>
     SELECT ?coverTag
     WHERE {
       ?coverTag a conn:CoverTag .
     }
-    """
-    results = graph.query(query)
+    """,
+    "problems": """
+    PREFIX conn: <http://example.org/conn/>
+    SELECT ?problem
+    WHERE {
+      ?problem a conn:Problem .
+    }
+    """,
+    "problems_for_cover_tag": """
+    PREFIX conn: <http://example.org/conn/>
+    PREFIX problem: <http://example.org/problem/>
+    SELECT ?problem
+    WHERE {
+      ?problem a conn:Problem .
+      ?problem conn:hasCoverTag ?coverTag .
+      FILTER (?coverTag = ?cover_tag)
+    }
+    """,
+    "modalities_input": """
+    PREFIX modality: <http://example.org/modality/>
+    PREFIX conn: <http://example.org/conn/>
+
+    SELECT DISTINCT ?modality
+    WHERE {
+        ?type modality:hasInput ?modality ;
+    }
+    """,
+    "modalities_output": """
+    PREFIX modality: <http://example.org/modality/>
+    PREFIX conn: <http://example.org/conn/>
+    SELECT DISTINCT ?modality
+    WHERE {
+        ?type modality:hasOutput ?modality .
+    }
+    """,
+    "all_metrics": """
+    PREFIX conn: <http://example.org/conn/>
+    PREFIX metric: <http://example.org/metric/>
+    SELECT DISTINCT ?metric
+    WHERE {
+        ?metric a metric:Metric.
+    }
+    """,
+    "metrics_by_model": """
+    PREFIX metric: <http://example.org/metric/>
+    PREFIX conn: <http://example.org/conn/>
+
+    SELECT DISTINCT ?metric
+    WHERE {
+        ?model a conn:Model ;
+               conn:model_name ?model_name ;
+               metric:hasMetric ?metric .
+    }
+    """,
+    "all_model_metrics": """
+    PREFIX metric: <http://example.org/metric/>
+    PREFIX conn: <http://example.org/conn/>
+    SELECT DISTINCT ?name ?metric
+    WHERE {
+        ?model a conn:Model ;
+               conn:model_name ?name ;
+               metric:hasMetric ?metric .
+    }
+    """,
+    "models_with_higher_score": """
+    PREFIX conn: <http://example.org/conn/>
+    PREFIX metric: <http://example.org/metric/>
+    SELECT ?model
+    WHERE {
+        ?model a conn:Model .
+        ?metric a metric:Metric .
+        ?model metric:hasMetric ?metric .
+        ?metric metric:metricName ?metricName .
+        ?metric metric:onDataset ?dataset .
+        ?metric metric:hasScore ?score .
+        FILTER (?score > ?score_threshold)
+    }
+    """,
+    "problems_by_modalities": """
+    PREFIX modality: <http://example.org/modality/>
+    PREFIX conn: <http://example.org/conn/>
+
+    SELECT DISTINCT ?problem
+    WHERE {
+        ?problem a conn:Problem ;
+                 modality:hasInput ?input_modality ;
+                 modality:hasOutput ?output_modality .
+    }
+    """,
+    "problems_by_input_modality": """
+    PREFIX modality: <http://example.org/modality/>
+    PREFIX conn: <http://example.org/conn/>
+
+    SELECT DISTINCT ?problem
+    WHERE {
+        ?problem a conn:Problem ;
+               modality:hasInput ?input_modality .
+    }
+    """,
+    "models_with_parameters": """
+    PREFIX conn: <http://example.org/conn/>
+    SELECT ?model
+    WHERE {
+        ?model a conn:Model .
+        ?model conn:parameters ?parameters .
+    }
+    """,
+    "models_with_max_size": """
+    PREFIX conn: <http://example.org/conn/>
+    SELECT ?model
+    WHERE {
+        ?model a conn:Model .
+        ?model conn:parameters ?parameters .
+        FILTER (?parameters <= ?max_parameters)
+    }
+    """,
+    "models_for_problem": """
+    PREFIX conn: <http://example.org/conn/>
+    PREFIX model: <http://example.org/model/>
+    SELECT ?model ?downloads
+    WHERE {
+      ?model a conn:Model .
+      ?model conn:hasProblem ?problem .
+      ?model conn:downloads ?downloads .
+      FILTER (?problem = ?problem_literal)
+    }
+    ORDER BY DESC(?downloads) ?model
+    """,
+    "models_for_problem_and_tag": """
+    PREFIX conn: <http://example.org/conn/>
+    PREFIX model: <http://example.org/model/>
+    SELECT ?model ?downloads
+    WHERE {
+      ?model a conn:Model .
+      ?model conn:hasProblem ?problem .
+      ?model conn:hasTag ?modelTag .
+      ?model conn:downloads ?downloads .
+      FILTER (?problem = ?problem_literal && ?modelTag = ?tag_literal)
+    }
+    ORDER BY DESC(?downloads) ?model
+    """,
+    # {values} is replaced by the requested problems, see run_values_query; they are
+    # joined on rather than compared in a FILTER, which tests every (model, problem) pair
+    "models_for_problems": """
+    PREFIX conn: <http://example.org/conn/>
+    SELECT ?problem_literal ?model ?downloads
+    WHERE {
+      VALUES ?problem_literal { {values} }
+      ?model conn:hasProblem ?problem_literal .
+      ?model a conn:Model .
+      ?model conn:downloads ?downloads .
+    }
+    ORDER BY DESC(?downloads) ?model
+    """,
+    "models_for_problems_and_tag": """
+    PREFIX conn: <http://example.org/conn/>
+    SELECT ?problem_literal ?model ?downloads
+    WHERE {
+      VALUES ?problem_literal { {values} }
+      ?model conn:hasProblem ?problem_literal .
+      ?model a conn:Model .
+      ?model conn:hasTag ?modelTag .
+      ?model conn:downloads ?downloads .
+      FILTER (?modelTag = ?tag_literal)
+    }
+    ORDER BY DESC(?downloads) ?model
+    """,
+    "model_details": """
+    PREFIX conn: <http://example.org/conn/>
+    PREFIX model: <http://example.org/model/>
+    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
+    SELECT ?model ?id ?name ?problem ?coverTag ?library ?downloads ?likes ?lastModified
+    WHERE {
+      ?model a conn:Model .
+      ?model conn:model_name ?name .
+      ?model conn:model_id ?id .
+      ?model conn:hasProblem ?problem .
+      ?model conn:hasCoverTag ?coverTag .
+      ?model conn:usesLibrary ?library .
+      ?model conn:downloads ?downloads .
+      ?model conn:likes ?likes .
+      ?model conn:lastModified ?lastModified .
+      FILTER (?name = ?model_literal)
+    }
+    ORDER BY ?model ?id ?name ?problem ?coverTag ?library ?downloads ?likes ?lastModified
+    LIMIT 1
+    """,
+}
+
+_prepared_queries = {}
+# prepared queries of backends that cannot run one on several threads at once, per thread
+_thread_prepared_queries = threading.local()
+_query_stats = {}
+_query_stats_lock = threading.Lock()
+
+def prepared_query(name, backend):
+    ###########################################################
+    ### get the compiled form of a registered query for a   ###
+    ### kind of backend, compiling it on first use, once    ###
+    ### per thread where the backend cannot share it:       ###
+    ###########################################################
+    prepared = _prepared_queries if backend.shared_queries else _thread_prepared_queries.__dict__
+    query = prepared.get((backend.kind, name))
+    if query is None:
+        start = time.perf_counter()
+        query = backend.prepare(QUERIES[name])
+        elapsed = time.perf_counter() - start
+        with _query_stats_lock:
+            _query_stats.setdefault(name, _new_query_stats())["prepare_seconds"] += elapsed
+        prepared[(backend.kind, name)] = query
+    return query
+
+def run_query(graph, name, bindings=None):
+    ###########################################################
+    ### run a registered query and return all its rows,     ###
+    ### recording the execution time:                       ###
+    ###########################################################
+    backend = as_backend(graph)
+    query = prepared_query(name, backend)
+    start = time.perf_counter()
+    rows = list(backend.select(query, bindings))
+    _record_execution(name, time.perf_counter() - start)
+    return rows
+
+def run_values_query(graph, name, values, bindings=None):
+    ###########################################################
+    ### run a registered query with its VALUES block filled ###
+    ### with the given terms; the text depends on them, so  ###
+    ### it is parsed on every call:                         ###
+    ###########################################################
+    backend = as_backend(graph)
+    start = time.perf_counter()
+    query = backend.prepare(QUERIES[name].replace("{values}", " ".join(backend.render(term) for term in values)))
+    rows = list(backend.select(query, bindings))
+    _record_execution(name, time.perf_counter() - start)
+    return rows
+
+def iter_query(graph, name, bindings=None):
+    ###########################################################
+    ### run a registered query and yield its rows as the    ###
+    ### caller consumes them; the time recorded is the time ###
+    ### spent in the query until the caller stops:          ###
+    ###########################################################
+    backend = as_backend(graph)
+    query = prepared_query(name, backend)
+    elapsed = 0.0
+    start = time.perf_counter()
+    try:
+        for row in backend.select(query, bindings):
+            elapsed += time.perf_counter() - start
+            yield row
+            start = time.perf_counter()
+        elapsed += time.perf_counter() - start
+    finally:
+        _record_execution(name, elapsed)
+
+def _record_execution(name, elapsed):
+    with _query_stats_lock:
+        stats = _query_stats.setdefault(name, _new_query_stats())
+        stats["executions"] += 1
+        stats["execute_seconds"] += elapsed
+
+def _new_query_stats():
+    return {"prepare_seconds": 0.0, "executions": 0, "execute_seconds": 0.0}
+
+def query_stats():
+    ###########################################################
+    ### per query: time spent parsing and translating it    ###
+    ### (once) against time spent executing it:             ###
+    ###########################################################
+    with _query_stats_lock:
+        return {name: dict(stats) for name, stats in _query_stats.items()}
+
+@query_cache.cached
+def get_cover_tags(graph):
+    ###########################################################
+    ### get cover tags (modalities) of machine learning:    ###
+    ###########################################################
+    results = run_query(graph, "cover_tags")
     cover_tags = [row[0] for row in results]
     return cover_tags
 
+@query_cache.cached
 def get_problems(graph):
     ###########################################################
     ### get types of machine learning problem:              ###
     ###########################################################
-    query = """
-    PREFIX conn: <http://example.org/conn/>
-    SELECT ?problem
-    WHERE {
-      ?problem a conn:Problem .
-    }
-    """
-    results = graph.query(query)
+    results = run_query(graph, "problems")
     problems = [row[0] for row in results]
     return problems
 
+@query_cache.cached
 def get_problems_for_cover_tag(graph, cover_tag):
     ###########################################################
     ### get problem type from modality:                     ###
     ###########################################################
-    CONN = Namespace("http://example.org/conn/")
-    cover_tag_literal = Literal(cover_tag, datatype=XSD.string)
+    if isinstance(graph, CatalogIndex):
+        return graph.get_problems_for_cover_tag(cover_tag)
 
-    query = """
-    PREFIX conn: <http://example.org/conn/>
-    PREFIX problem: <http://example.org/problem/>
-    SELECT ?problem
-    WHERE {
-      ?problem a conn:Problem .
-      ?problem conn:hasCoverTag ?coverTag .
-      FILTER (?coverTag = ?cover_tag)
-    }
-    """
+    cover_tag_literal = Literal(cover_tag, datatype=XSD.string)
 
-    results = graph.query(query, initBindings={'cover_tag': cover_tag_literal})
+    results = run_query(graph, "problems_for_cover_tag", {'cover_tag': cover_tag_literal})
     problems = [row[0] for row in results]
     return problems
 
+@query_cache.cached
 def get_modalities_input(graph):
     ###########################################################
     ### get modalities inputs machine learning:             ###
     ###########################################################
-    query = """
-    PREFIX modality: <http://example.org/modality/>
-    PREFIX conn: <http://example.org/conn/>
-
-    SELECT DISTINCT ?modality
-    WHERE {
-        ?type modality:hasInput ?modality ;
-    }
-    """
-    results = graph.query(query)
+    results = run_query(graph, "modalities_input")
     modalities_input = [row[0] for row in results]
     return modalities_input
 
+@query_cache.cached
 def get_modalities_output(graph):
     ###########################################################
     ### get modalities outputs machine learning:            ###
     ###########################################################
-    query = """
-    PREFIX conn: <http://example.org/conn/>
-    SELECT DISTINCT ?modality
-    WHERE {
-        ?type modality:hasOutput ?modality .
-    }
-    """
-    results = graph.query(query)
+    results = run_query(graph, "modalities_output")
     modalities_output = [row[0] for row in results]
     return modalities_output
 
+@query_cache.cached
 def get_all_metrics(graph):
     ###########################################################
     ### get all types of metrics:                           ###
     ###########################################################
-    query = """
-    PREFIX conn: <http://example.org/conn/>  # Add conn prefix
-    PREFIX metric: <http://example.org/metric/>
-    SELECT DISTINCT ?metric
-    WHERE {
-        ?metric a metric:Metric.
-    }
-    """
-    results = graph.query(query)
+    results = run_query(graph, "all_metrics")
     metrics = {str(metric[0]) for metric in results}
     return metrics
 
 
+@query_cache.cached
 def find_metrics_by_model(graph, model_name):
     ###########################################################
     ### get metrics for a model:                            ###
     ###########################################################
-    query = f"""
-    PREFIX metric: <http://example.org/metric/>
-    PREFIX conn: <http://example.org/conn/>
-
-    SELECT DISTINCT ?metric
-    WHERE {{
-        ?model a conn:Model ;
-               conn:model_name "{model_name}"^^xsd:string ;
-               metric:hasMetric ?metric .
-    }}
-    """
-    results = graph.query(query)
+    if isinstance(graph, CatalogIndex):
+        return graph.find_metrics_by_model(model_name)
 
+    results = run_query(graph, "metrics_by_model",
+                        {'model_name': Literal(model_name, datatype=XSD.string)})
 
     metrics = [str(row[0]) for row in results]
     return metrics
 
-def search_metrics_by_cover_tag(graph, cover_tag):
+def search_metrics_for_problems(graph, problems):
     ###########################################################
-    ### get metrics for a specific cover tag:               ###
+    ### get metrics of the models of several problems as    ###
+    ### {problem: {model: [metrics]}} with a fixed number   ###
+    ### of queries, whatever the number of models:          ###
     ###########################################################
-    problems = get_problems_for_cover_tag(graph, cover_tag)
-    metrics_for_all_problems = {}
-    for problem in problems:
-        models = get_models_for_problem(graph, problem)
-        models_with_metrics = {}
+    if isinstance(graph, CatalogIndex):
+        return graph.search_metrics_for_problems(problems)
+    if not problems:
+        return {}
 
-        for model,downloads in models:
+    # Models of every problem in one query, already in download order
+    models_by_problem = get_models_for_problems(graph, tuple(problems))
 
-            metrics = find_metrics_by_model(graph, model)
-            models_with_metrics[model] = metrics
-
-        metrics_for_all_problems[problem] = models_with_metrics
+    # All (model name, metric) pairs in one query
+    metrics_by_name = {}
+    for row in run_query(graph, "all_model_metrics"):
+        metrics_by_name.setdefault(str(row[0]), []).append(str(row[1]))
 
+    metrics_for_all_problems = {}
+    for problem in problems:
+        metrics_for_all_problems[problem] = {model: list(metrics_by_name.get(str(model), ()))
+                                             for model, downloads in models_by_problem[problem]}
     return metrics_for_all_problems
 
+@query_cache.cached
+def search_metrics_by_cover_tag(graph, cover_tag):
+    ###########################################################
+    ### get metrics for a specific cover tag:               ###
+    ###########################################################
+    problems = get_problems_for_cover_tag(graph, cover_tag)
+    return search_metrics_for_problems(graph, problems)
+
+@query_cache.cached
 def search_metrics_by_input_modalities(graph, input_modality):
     ###########################################################
     ### get metrics for a input modality:                  ###
     ###########################################################
     problems = find_problem_by_input_modality(graph, input_modality)
-    metrics_for_all_problems = {}
-
-    for problem in problems:
-        models = get_models_for_problem(graph, problem)
-        models_with_metrics = {}
-
-        for model,downloads in models:
-            metrics = find_metrics_by_model(graph, model)
-            models_with_metrics[model] = metrics
-
-        metrics_for_all_problems[problem] = models_with_metrics
-
-    return metrics_for_all_problems
+    return search_metrics_for_problems(graph, problems)
 
+@query_cache.cached
 def search_metrics_by_modalities(graph, input_modality, output_modality):
     ###########################################################
     ### get metrics for a modality:                         ###
     ###########################################################
     problems = find_problem_by_modalities(graph, input_modality, output_modality)
-    metrics_for_all_problems = {}
-
-    for problem in problems:
-        models = get_models_for_problem(graph, problem)
-        models_with_metrics = {}
-
-        for model,downloads in models:
-            metrics = find_metrics_by_model(graph, model)
-            models_with_metrics[model] = metrics
-
-        metrics_for_all_problems[problem] = models_with_metrics
-
-    return metrics_for_all_problems
+    return search_metrics_for_problems(graph, problems)
 
+@query_cache.cached
 def get_models_with_higher_score(graph, metric_name, dataset, score_threshold):
     ###########################################################
     ### get models with the higher scores:                  ###
     ###########################################################
-    query = """
-    PREFIX conn: <http://example.org/conn/>
-    PREFIX metric: <http://example.org/metric/>
-    SELECT ?model
-    WHERE {
-        ?model a conn:Model .
-        ?metric a metric:Metric .
-        ?model metric:hasMetric ?metric .
-        ?metric metric:metricName ?metricName .
-        ?metric metric:onDataset ?dataset .
-        ?metric metric:hasScore ?score .
-        FILTER (xsd:float(?score) > ?score_threshold)
-    }
-    """
+    if isinstance(graph, CatalogIndex):
+        return graph.get_models_with_higher_score(metric_name, dataset, score_threshold)
 
-    # convert score to literal
-    score_threshold_literal = Literal(score_threshold, datatype=XSD.float)
+    # convert score to literal; a double like the scores normalize_numeric_literals stores, an
+    # xsd:float threshold makes oxigraph compare in single precision and keep scores equal to it
+    score_threshold_literal = Literal(score_threshold, datatype=XSD.double)
 
-    results = graph.query(
-        query,
-        initBindings={
+    results = run_query(
+        graph,
+        "models_with_higher_score",
+        {
             'metricName': Literal(metric_name),
             'dataset': Literal(dataset),
             'score_threshold': score_threshold_literal
@@ -222,145 +750,194 @@ def get_models_with_higher_score(graph, metric_name, dataset, score_threshold):
     models = [str(row[0]) for row in results]
     return models
 
+@query_cache.cached
 def find_problem_by_modalities(graph, input_modality, output_modality):
     ###########################################################
     ### get problem from modalities:                        ###
     ###########################################################
-    query = f"""
-    PREFIX modality: <http://example.org/modality/>
-    PREFIX conn: <http://example.org/conn/>
-
-    SELECT DISTINCT ?problem
-    WHERE {{
-        ?problem a conn:Problem ;
-                 modality:hasInput "{input_modality}"^^xsd:string ;
-                 modality:hasOutput "{output_modality}"^^xsd:string .
-    }}
-    """
-    results = graph.query(query)
+    results = run_query(graph, "problems_by_modalities", {
+        'input_modality': Literal(input_modality, datatype=XSD.string),
+        'output_modality': Literal(output_modality, datatype=XSD.string)
+    })
 
     problems = [str(row[0]) for row in results]
     return problems
 
+@query_cache.cached
 def find_problem_by_input_modality(graph, input_modality):
     ###########################################################
     ### get problem from input_modality:                    ###
     ###########################################################
-    query = f"""
-    PREFIX modality: <http://example.org/modality/>
-    PREFIX conn: <http://example.org/conn/>
-
-    SELECT DISTINCT ?problem
-    WHERE {{
-        ?problem a conn:Problem ;
-               modality:hasInput "{input_modality}"^^xsd:string .
-    }}
-    """
-    results = graph.query(query)
+    results = run_query(graph, "problems_by_input_modality",
+                        {'input_modality': Literal(input_modality, datatype=XSD.string)})
 
     problems = [str(row[0]) for row in results]
     return problems
 
+def narrow_problems(graph, problems, cover_tag=None, inputs=(), outputs=()):
+    ###########################################################
+    ### narrow problems down to the ones that fit a cover   ###
+    ### tag and input/output modalities; a constraint no    ###
+    ### problem fits is skipped rather than leaving none:   ###
+    ###########################################################
+    candidates = [str(problem) for problem in problems]
+
+    constraints = []
+    if cover_tag:
+        constraints.append({str(p) for p in get_problems_for_cover_tag(graph, cover_tag)})
+    inputs = [str(i) for i in inputs or () if i]
+    outputs = [str(o) for o in outputs or () if o]
+    if outputs:
+        # there is no lookup by output alone, every known input stands in when none was given
+        for_inputs = inputs or [str(i) for i in get_modalities_input(graph)]
+        constraints.append({p for i in for_inputs for o in outputs for p in find_problem_by_modalities(graph, i, o)})
+    elif inputs:
+        constraints.append({p for i in inputs for p in find_problem_by_input_modality(graph, i)})
+
+    for fitting in constraints:
+        narrowed = [problem for problem in candidates if problem in fitting]
+        if narrowed:
+            candidates = narrowed
+    return candidates
+
+@query_cache.cached
 def get_models_with_max_size(graph, max_parameters=None):
     ###########################################################
     ### get models threshold by the size:                   ###
     ###########################################################
-    query = """
-    PREFIX conn: <http://example.org/conn/>
-    SELECT ?model
-    WHERE {
-        ?model a conn:Model .
-        ?model conn:parameters ?parameters .
-        FILTER (xsd:integer(?parameters) >= ?min_parameters)
-        """
+    if isinstance(graph, CatalogIndex):
+        return graph.get_models_with_max_size(max_parameters)
 
     if max_parameters is not None:
-        query += "FILTER (xsd:integer(?parameters) <= ?max_parameters)"
-
-    query += "}"  # Close the WHERE clause
-
-    max_parameters_literal = Literal(max_parameters, datatype=XSD.integer)
-
-    results = graph.query(query, initBindings={'max_parameters': max_parameters_literal})
+        max_parameters_literal = Literal(max_parameters, datatype=XSD.integer)
+        results = run_query(graph, "models_with_max_size", {'max_parameters': max_parameters_literal})
+    else:
+        results = run_query(graph, "models_with_parameters")
     models = [str(row[0]) for row in results]
     return models
 
+@query_cache.cached
 def get_models_for_problem(graph, problem_literal_text):
     ###########################################################
     ### get models with correct machine learning goal:      ###
     ###########################################################
-    problem_literal = Literal(problem_literal_text, datatype=XSD.string)
+    if isinstance(graph, CatalogIndex):
+        return graph.get_models_for_problem(problem_literal_text)
 
-    query = """
-    PREFIX conn: <http://example.org/conn/>
-    PREFIX model: <http://example.org/model/>
-    SELECT ?model ?downloads
-    WHERE {
-      ?model a conn:Model .
-      ?model conn:hasProblem ?problem .
-      ?model conn:downloads ?downloads .
-      FILTER (?problem = ?problem_literal)
-    }
-    ORDER BY DESC(?downloads)
-    """
+    problem_literal = Literal(problem_literal_text, datatype=XSD.string)
 
-    results = graph.query(query, initBindings={'problem_literal': problem_literal})
+    results = run_query(graph, "models_for_problem", {'problem_literal': problem_literal})
 
     models = [(row[0], row[1]) for row in results]
     return models
 
+@query_cache.cached
 def get_models_for_problem_and_tag(graph, problem_literal_text, tag):
     ###########################################################
     ### get models with correct machine learning goal and   ###
     ### with the specified tag (e.g., transformers)         ###
     ###########################################################
+    if isinstance(graph, CatalogIndex):
+        return graph.get_models_for_problem_and_tag(problem_literal_text, tag)
+
     problem_literal = Literal(problem_literal_text, datatype=XSD.string)
     tag_literal = Literal(tag, datatype=XSD.string)
 
-    query = """
-    PREFIX conn: <http://example.org/conn/>
-    PREFIX model: <http://example.org/model/>
-    SELECT ?model ?downloads
-    WHERE {
-      ?model a conn:Model .
-      ?model conn:hasProblem ?problem .
-      ?model conn:hasTag ?modelTag .
-      ?model conn:downloads ?downloads .
-      FILTER (?problem = ?problem_literal && ?modelTag = ?tag_literal)
-    }
-    ORDER BY DESC(?downloads)
-    """
-
-    results = graph.query(query, initBindings={'problem_literal': problem_literal, 'tag_literal': tag_literal})
+    results = run_query(graph, "models_for_problem_and_tag",
+                        {'problem_literal': problem_literal, 'tag_literal': tag_literal})
     models = [(row[0], row[1]) for row in results]
     return models
 
+@query_cache.cached
+def get_models_for_problems(graph, problems, tag=None):
+    ###########################################################
+    ### get models for several machine learning goals at    ###
+    ### once, as {problem: [(model, downloads)]} in         ###
+    ### download order, optionally limited to a tag:        ###
+    ###########################################################
+    if isinstance(graph, CatalogIndex):
+        return graph.get_models_for_problems(problems, tag)
+
+    models_by_problem = {problem: [] for problem in problems}
+    if not models_by_problem:
+        return models_by_problem
+    requested = {str(problem): problem for problem in models_by_problem}
+    values = [literal for problem in requested
+              for literal in (Literal(problem, datatype=XSD.string), Literal(problem))]
+
+    if tag is None:
+        results = run_values_query(graph, "models_for_problems", values)
+    else:
+        results = run_values_query(graph, "models_for_problems_and_tag", values,
+                                   {'tag_literal': Literal(tag, datatype=XSD.string)})
+    for row in results:
+        models_by_problem[requested[str(row[0])]].append((row[1], row[2]))
+    return models_by_problem
+
+def iter_models_for_problem(graph, problem_literal_text):
+    ###########################################################
+    ### yield (model, downloads) for a machine learning     ###
+    ### goal in download order, one at a time:              ###
+    ###########################################################
+    if isinstance(graph, CatalogIndex):
+        yield from graph.iter_models_for_problem(problem_literal_text)
+        return
+
+    problem_literal = Literal(problem_literal_text, datatype=XSD.string)
+    for row in iter_query(graph, "models_for_problem", {'problem_literal': problem_literal}):
+        yield (row[0], row[1])
+
+def iter_models_for_problem_and_tag(graph, problem_literal_text, tag):
+    ###########################################################
+    ### yield (model, downloads) for a machine learning     ###
+    ### goal and tag in download order, one at a time:      ###
+    ###########################################################
+    if isinstance(graph, CatalogIndex):
+        yield from graph.iter_models_for_problem_and_tag(problem_literal_text, tag)
+        return
+
+    problem_literal = Literal(problem_literal_text, datatype=XSD.string)
+    tag_literal = Literal(tag, datatype=XSD.string)
+    for row in iter_query(graph, "models_for_problem_and_tag",
+                          {'problem_literal': problem_literal, 'tag_literal': tag_literal}):
+        yield (row[0], row[1])
+
+@query_cache.cached
+def get_models_for_problem_page(graph, problem_literal_text, offset=0, limit=None):
+    ###########################################################
+    ### one page of get_models_for_problem:                 ###
+    ###########################################################
+    if isinstance(graph, CatalogIndex):
+        return graph.get_models_for_problem_page(problem_literal_text, offset, limit)
+
+    stop = None if limit is None else offset + limit
+    return list(itertools.islice(iter_models_for_problem(graph, problem_literal_text), offset, stop))
+
+@query_cache.cached
+def get_models_for_problem_and_tag_page(graph, problem_literal_text, tag, offset=0, limit=None):
+    ###########################################################
+    ### one page of get_models_for_problem_and_tag:         ###
+    ###########################################################
+    if isinstance(graph, CatalogIndex):
+        return graph.get_models_for_problem_and_tag_page(problem_literal_text, tag, offset, limit)
+
+    stop = None if limit is None else offset + limit
+    return list(itertools.islice(iter_models_for_problem_and_tag(graph, problem_literal_text, tag), offset, stop))
+
+@query_cache.cached
 def get_model_details(graph, model_name):
     ###########################################################
-    ### get info about model                                ###
+    ### get info about model. Of several values of one      ###
+    ### property the first in ORDER BY order is reported,   ###
+    ### and of several models with the name the first one;  ###
+    ### a model without every property is not found:        ###
     ###########################################################
-    model_literal = Literal(model_name, datatype=XSD.string)
+    if isinstance(graph, CatalogIndex):
+        return graph.get_model_details(model_name)
 
-    query = """
-    PREFIX conn: <http://example.org/conn/>
-    PREFIX model: <http://example.org/model/>
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-    SELECT ?model ?id ?name ?problem ?coverTag ?library ?downloads ?likes ?lastModified
-    WHERE {
-      ?model a conn:Model .
-      ?model conn:model_name ?name .
-      ?model conn:model_id ?id .
-      ?model conn:hasProblem ?problem .
-      ?model conn:hasCoverTag ?coverTag .
-      ?model conn:usesLibrary ?library .
-      ?model conn:downloads ?downloads .
-      ?model conn:likes ?likes .
-      ?model conn:lastModified ?lastModified .
-      FILTER (?name = ?model_literal)
-    }
-    """
+    model_literal = Literal(model_name, datatype=XSD.string)
 
-    results = graph.query(query, initBindings={'model_literal': model_literal})
+    results = run_query(graph, "model_details", {'model_literal': model_literal})
     details = {}
     for row in results:
         details = {
@@ -0,0 +1,39 @@
+from rdflib import Namespace, RDF
+from rdflib.namespace import XSD
+
+# Namespaces used by graph_v2.ttl
+CONN = Namespace("http://example.org/conn/")
+METRIC = Namespace("http://example.org/metric/")
+MODALITY = Namespace("http://example.org/modality/")
+MODEL = Namespace("http://example.org/model/")
+PROBLEM = Namespace("http://example.org/problem/")
+
+NAMESPACES = {
+    "conn": CONN,
+    "metric": METRIC,
+    "modality": MODALITY,
+    "model": MODEL,
+    "problem": PROBLEM,
+    "xsd": XSD,
+}
+
+# Predicates read by the rdfCode queries; anything else in the graph is never queried
+QUERIED_PREDICATES = frozenset([
+    RDF.type,
+    CONN.model_name,
+    CONN.model_id,
+    CONN.hasProblem,
+    CONN.hasCoverTag,
+    CONN.hasTag,
+    CONN.usesLibrary,
+    CONN.downloads,
+    CONN.likes,
+    CONN.lastModified,
+    CONN.parameters,
+    METRIC.hasMetric,
+    METRIC.metricName,
+    METRIC.onDataset,
+    METRIC.hasScore,
+    MODALITY.hasInput,
+    MODALITY.hasOutput,
+])
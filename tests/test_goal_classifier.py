@@ -0,0 +1,53 @@
+import pytest
+from rdflib import Graph
+
+from rdftool.goal_classifier import GoalClassifier, describe_problem
+
+GOALS = [
+    "audio-classification", "automatic-speech-recognition", "fill-mask", "image-classification",
+    "image-segmentation", "image-to-text", "object-detection", "question-answering", "summarization",
+    "text-classification", "text-generation", "text-to-image", "text-to-speech", "token-classification",
+    "translation", "visual-question-answering",
+]
+
+# the metadata node's default SUSTAINML_GOAL_CLASSIFIER_THRESHOLD
+THRESHOLD = 0.6
+
+@pytest.fixture(scope="module")
+def classifier():
+    return GoalClassifier(Graph(), GOALS)
+
+@pytest.mark.parametrize("text, goal", [
+    ("Summarize long news articles into short digests", "summarization"),
+    ("Translate product descriptions from English to German", "translation"),
+    ("Classify the sentiment of product reviews", "text-classification"),
+])
+def test_clear_cut_descriptions_skip_the_llm(classifier, text, goal):
+    guess, confidence = classifier.classify(text)
+    assert guess == goal
+    assert confidence >= THRESHOLD
+
+@pytest.mark.parametrize("text", [
+    "Write software to detect fraud in bank transactions",
+    "Classify customer emails by language",
+    "Estimate the key points where a robot arm should move",
+])
+def test_off_topic_descriptions_go_to_the_llm(classifier, text):
+    # each matches a single word or phrase of one goal, a margin without evidence
+    assert classifier.classify(text)[1] < THRESHOLD
+
+@pytest.mark.parametrize("short, definition", [
+    ("x", ""),
+    ("x", None),
+    ("", ""),
+    ("Summarize", ""),
+])
+def test_near_empty_descriptions_go_to_the_llm(classifier, short, definition):
+    assert classifier.classify(describe_problem(short, definition))[1] < THRESHOLD
+
+def test_modalities_are_not_read():
+    assert describe_problem("x", "") == "x"
+
+def test_keyword_phrase_is_one_piece_of_evidence(classifier):
+    assert classifier.evidence("the key points", "summarization") == {"key point"}
+    assert classifier.evidence("summarize the key points", "summarization") == {"summar", "key point"}
@@ -0,0 +1,27 @@
+import pytest
+
+from rdftool.goal_prompt import GoalAnswerStats, parse_goal_answer
+
+GOALS = ["summarization", "text-generation", "translation", "question-answering", "visual-question-answering",
+         "text2text-generation"]
+
+@pytest.mark.parametrize("answer, goal, how", [
+    ("2", "text-generation", "index"),
+    ("I'd say 3.", "translation", "index"),
+    ("With 1000 samples I would pick 2", "text-generation", "index"),
+    ("2. text-generation", "text-generation", "index"),
+    ("translation (2)", "translation", "name"),
+    ("visual question answering", "visual-question-answering", "name"),
+    ("text2text generation", "text2text-generation", "name"),
+    ("summarisation", "summarization", "fuzzy"),
+    ("0", None, None),
+    ("Answer: 7", None, None),
+])
+def test_parse_goal_answer(answer, goal, how):
+    assert parse_goal_answer(answer, GOALS) == (goal, how)
+
+def test_only_answers_a_strict_reader_rejects_are_saved_retries():
+    stats = GoalAnswerStats()
+    for answer in ["2", "2", "translation", "The best is 2", "Translation."]:
+        stats.record(answer, *parse_goal_answer(answer, GOALS), GOALS)
+    assert stats.stats()["retries_saved"] == 2
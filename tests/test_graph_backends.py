@@ -0,0 +1,149 @@
+import io
+
+import pytest
+
+from rdftool import rdfCode
+from rdftool.graph_backends import open_backend
+from rdftool.graph_generator import generate_graph
+from rdftool.rdfCode import load_graph
+from rdftool.schema import CONN, METRIC
+
+# Cases the generated graph does not have: untyped and language-tagged literals next to the
+# xsd:string ones, several models with the same downloads on one problem, which only the
+# ?model tie-breaker of ORDER BY DESC(?downloads) ?model puts in one order on every backend,
+# and for get_model_details a model with several values of its properties, a name two models
+# have, and a model without a library, which the details query does not find.
+# Models are not named by plain literals: oxigraph has no plain literals, see graph_backends
+EXTRA = """
+"plain/model-a"^^xsd:string a conn:Model ; conn:model_name "plain/model-a"^^xsd:string ; conn:model_id "plain-a" ;
+    conn:hasProblem "summarization"^^xsd:string ; conn:hasCoverTag "nlp"^^xsd:string ;
+    conn:usesLibrary "transformers" ; conn:hasTag "pytorch" ; conn:downloads "7"^^xsd:string ;
+    conn:likes "1"^^xsd:string ; conn:lastModified "2024-01-01T00:00:00"^^xsd:dateTime ;
+    conn:parameters "1000"^^xsd:string ; metric:hasMetric metric:f1_glue .
+"plain/model-b"@en a conn:Model ; conn:model_name "plain/model-b"@en ; conn:model_id "plain-b" ;
+    conn:hasProblem "summarization"^^xsd:string ; conn:hasCoverTag "nlp"^^xsd:string ;
+    conn:usesLibrary "transformers"^^xsd:string ; conn:hasTag "pytorch"^^xsd:string ;
+    conn:downloads "7"^^xsd:string ; conn:likes "1"^^xsd:string ;
+    conn:lastModified "2024-01-01T00:00:00"^^xsd:dateTime ; conn:parameters "1000"^^xsd:string ;
+    metric:hasMetric metric:f1_glue .
+"tie/model-c"^^xsd:string a conn:Model ; conn:model_name "tie/model-c"^^xsd:string ;
+    conn:hasProblem "summarization"^^xsd:string ; conn:hasTag "pytorch"^^xsd:string ;
+    conn:downloads "7"^^xsd:string .
+"tie/a"^^xsd:string a conn:Model ; conn:model_name "tie/a"^^xsd:string ;
+    conn:hasProblem "summarization"^^xsd:string ; conn:hasTag "pytorch"^^xsd:string ;
+    conn:downloads "7"^^xsd:string .
+"tie-a"^^xsd:string a conn:Model ; conn:model_name "tie-a"^^xsd:string ;
+    conn:hasProblem "summarization"^^xsd:string ; conn:hasTag "pytorch"^^xsd:string ;
+    conn:downloads "7"^^xsd:string .
+"multi/model-d"^^xsd:string a conn:Model ; conn:model_name "multi/model-d"^^xsd:string, "multi/model-d" ;
+    conn:model_id "multi-d2", "multi-d1" ; conn:hasProblem "translation"^^xsd:string, "summarization"^^xsd:string ;
+    conn:hasCoverTag "nlp"^^xsd:string, "multimodal"^^xsd:string ;
+    conn:usesLibrary "transformers"^^xsd:string, "peft"^^xsd:string ; conn:downloads "90"^^xsd:string, "12"^^xsd:string ;
+    conn:likes "3"^^xsd:string ; conn:lastModified "2024-02-01T00:00:00"^^xsd:dateTime .
+"shared/model-f"^^xsd:string a conn:Model ; conn:model_name "shared-name"^^xsd:string ; conn:model_id "shared-f" ;
+    conn:hasProblem "translation"^^xsd:string ; conn:hasCoverTag "nlp"^^xsd:string ;
+    conn:usesLibrary "transformers"^^xsd:string ; conn:downloads "5"^^xsd:string ; conn:likes "2"^^xsd:string ;
+    conn:lastModified "2024-03-01T00:00:00"^^xsd:dateTime .
+"shared/model-e"^^xsd:string a conn:Model ; conn:model_name "shared-name"^^xsd:string ; conn:model_id "shared-e" ;
+    conn:hasProblem "translation"^^xsd:string ; conn:hasCoverTag "nlp"^^xsd:string ;
+    conn:usesLibrary "peft"^^xsd:string ; conn:downloads "4"^^xsd:string ; conn:likes "2"^^xsd:string ;
+    conn:lastModified "2024-03-01T00:00:00"^^xsd:dateTime .
+"shared/model-a"^^xsd:string a conn:Model ; conn:model_name "shared-name"^^xsd:string ; conn:model_id "shared-a" ;
+    conn:hasProblem "translation"^^xsd:string ; conn:hasCoverTag "nlp"^^xsd:string ; conn:downloads "3"^^xsd:string ;
+    conn:likes "2"^^xsd:string ; conn:lastModified "2024-03-01T00:00:00"^^xsd:dateTime .
+"""
+
+# lookups whose results come in ORDER BY order; the order is part of what they return
+ORDERED = {"get_models_for_problem", "get_models_for_problem_and_tag", "get_models_for_problems",
+           "iter_models_for_problem", "iter_models_for_problem_and_tag", "get_models_for_problem_page",
+           "get_models_for_problem_and_tag_page"}
+
+@pytest.fixture(scope="module")
+def graph(tmp_path_factory):
+    text = io.StringIO()
+    generate_graph(text, 60, seed=3)
+    path = tmp_path_factory.mktemp("graph") / "graph.ttl"
+    path.write_text(text.getvalue() + EXTRA, encoding="utf-8")
+    return load_graph(str(path), use_snapshot=False)
+
+def lookups(graph):
+    """(name, args) for every public rdfCode lookup, with arguments taken from graph."""
+    problems = [str(p) for p in rdfCode.get_problems(graph)]
+    cover_tags = [str(c) for c in rdfCode.get_cover_tags(graph)]
+    inputs = [str(m) for m in rdfCode.get_modalities_input(graph)]
+    outputs = [str(m) for m in rdfCode.get_modalities_output(graph)]
+    tags = sorted({str(o) for _, _, o in graph.triples((None, CONN.hasTag, None))})
+    names = sorted({str(o) for _, _, o in graph.triples((None, CONN.model_name, None))})
+    parameters = sorted(o.value for _, _, o in graph.triples((None, CONN.parameters, None)))
+    scores = sorted(float(o) for _, _, o in graph.triples((None, METRIC.hasScore, None)))
+    metrics = sorted({(str(n), str(d)) for m, _, n in graph.triples((None, METRIC.metricName, None))
+                      for d in graph.objects(m, METRIC.onDataset)})
+
+    calls = [(name, ()) for name in ("get_cover_tags", "get_problems", "get_modalities_input",
+                                     "get_modalities_output", "get_all_metrics", "get_models_with_max_size")]
+    calls += [("get_problems_for_cover_tag", (c,)) for c in cover_tags]
+    calls += [("search_metrics_by_cover_tag", (c,)) for c in cover_tags]
+    calls += [("find_problem_by_input_modality", (i,)) for i in inputs]
+    calls += [("search_metrics_by_input_modalities", (i,)) for i in inputs]
+    calls += [(name, (i, o)) for name in ("find_problem_by_modalities", "search_metrics_by_modalities")
+              for i in inputs for o in outputs]
+    calls += [("search_metrics_for_problems", (problems[:3],)), ("search_metrics_for_problems", (problems,))]
+    calls += [("narrow_problems", (problems, "nlp", ["text"], ["text"])), ("narrow_problems", (problems, "cv"))]
+    for problem in problems:
+        calls += [(name, (problem,)) for name in ("get_models_for_problem", "iter_models_for_problem")]
+        calls += [("get_models_for_problem_page", (problem, 2, 5))]
+        for tag in tags:
+            calls += [(name, (problem, tag)) for name in ("get_models_for_problem_and_tag",
+                                                          "iter_models_for_problem_and_tag")]
+            calls += [("get_models_for_problem_and_tag_page", (problem, tag, 1, 3))]
+    calls += [("get_models_for_problems", (problems,)), ("get_models_for_problems", (problems[:4], "pytorch"))]
+    calls += [(name, (n,)) for name in ("find_metrics_by_model", "get_model_details") for n in names]
+    calls += [("get_models_with_max_size", (parameters[i * (len(parameters) - 1) // 4],)) for i in range(5)]
+    calls += [("get_models_with_higher_score", (n, d, scores[i * (len(scores) - 1) // 4]))
+              for n, d in metrics[:6] for i in range(5)]
+    return calls
+
+def comparable(result, ordered):
+    # same terms in the same order where the order is part of the answer, in any order elsewhere
+    if isinstance(result, dict):
+        return sorted((str(key), comparable(value, ordered)) for key, value in result.items())
+    if not isinstance(result, (str, bytes)) and hasattr(result, "__iter__"):
+        values = [comparable(value, False) for value in result]
+        return values if ordered else sorted(values, key=repr)
+    return str(result)
+
+@pytest.mark.parametrize("backend", ["oxigraph", "index"])
+def test_backend_answers_every_lookup_like_rdflib(graph, backend):
+    if backend == "oxigraph":
+        pytest.importorskip("pyoxigraph")
+    other = open_backend(graph, backend)
+    calls = lookups(graph)
+    mismatches = []
+    for name, args in calls:
+        func = getattr(rdfCode, name)
+        expected = comparable(func(graph, *args), name in ORDERED)
+        if comparable(func(other, *args), name in ORDERED) != expected:
+            mismatches.append((name, args))
+    assert mismatches == [], f"{len(mismatches)} of {len(calls)} lookups differ"
+
+@pytest.mark.parametrize("backend", ["rdflib", "oxigraph", "index"])
+def test_download_ties_are_ordered_by_model(graph, backend):
+    if backend == "oxigraph":
+        pytest.importorskip("pyoxigraph")
+    models = [str(model) for model, downloads in
+              rdfCode.get_models_for_problem(open_backend(graph, backend), "summarization") if downloads.value == 7]
+    # xsd:string names in code point order, "-" before "/", then the language-tagged one
+    assert models == ["plain/model-a", "tie-a", "tie/a", "tie/model-c", "plain/model-b"]
+
+@pytest.mark.parametrize("backend", ["rdflib", "oxigraph", "index"])
+def test_model_details_take_the_first_value_in_order(graph, backend):
+    if backend == "oxigraph":
+        pytest.importorskip("pyoxigraph")
+    catalog = open_backend(graph, backend)
+    details = {key: str(value) for key, value in rdfCode.get_model_details(catalog, "multi/model-d").items()}
+    # downloads are numbers once loaded, so 12 comes before 90
+    assert details == {"model_uri": "multi/model-d", "id": "multi-d1", "name": "multi/model-d",
+                       "problem": "summarization", "coverTag": "multimodal", "library": "peft",
+                       "downloads": "12", "likes": "3", "lastModified": "2024-02-01T00:00:00"}
+    # shared/model-a comes first but has no library
+    assert str(rdfCode.get_model_details(catalog, "shared-name")["model_uri"]) == "shared/model-e"
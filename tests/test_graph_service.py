@@ -0,0 +1,71 @@
+import threading
+import time
+
+import pytest
+from rdflib import Graph
+
+from rdftool.graph_service import GraphService
+
+TRIPLE = "<urn:a> <urn:b> <urn:c> ."
+
+class FlakyLoad:
+    """A load that fails the first `failures` times, then parses the graph file."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+        self.failed = threading.Event()
+
+    def __call__(self, graph_path):
+        self.calls += 1
+        if self.calls <= self.failures:
+            self.failed.set()
+            raise FileNotFoundError(graph_path)
+        return Graph().parse(graph_path, format="turtle")
+
+@pytest.fixture
+def graph_path(tmp_path):
+    path = tmp_path / "graph.ttl"
+    path.write_text(TRIPLE)
+    return path
+
+def test_background_load_retries_and_reports_why_until_it_succeeds(graph_path):
+    load = FlakyLoad(failures=1)
+    service = GraphService(load, wait_timeout=5, retry_interval=1, reload_interval=0)
+    service.start(str(graph_path), background=True)
+    assert load.failed.wait(5)
+    deadline = time.time() + 5
+    while service.load_error is None and time.time() < deadline:
+        time.sleep(0.01)
+    # a failed load answers at once rather than after wait_timeout
+    assert service.current_graph() is None
+    assert f"FileNotFoundError: {graph_path}" in service.unavailable_message()
+
+    assert service.snapshots.wait(5) is not None
+    assert len(service.current_graph()) == 1
+    assert service.load_error is None
+    assert load.calls == 2
+
+def test_foreground_load_raises(graph_path):
+    service = GraphService(FlakyLoad(failures=1), retry_interval=0.01, reload_interval=0)
+    with pytest.raises(FileNotFoundError):
+        service.start(str(graph_path), background=False)
+    assert service.current_graph(wait=False) is None
+
+def test_still_loading_without_waiting():
+    service = GraphService(FlakyLoad(failures=0), reload_interval=0)
+    assert service.current_graph(wait=False) is None
+    assert service.unavailable_message() == "The graph is still loading, try again later"
+
+def test_changed_file_is_published_as_a_new_version(graph_path):
+    service = GraphService(FlakyLoad(failures=0), reload_interval=0.05)
+    service.start(str(graph_path), background=False)
+    try:
+        graph_path.write_text(TRIPLE + "\n<urn:a> <urn:b> <urn:d> .")
+        deadline = time.time() + 10
+        while service.snapshots.current().version == 1 and time.time() < deadline:
+            time.sleep(0.05)
+        assert service.snapshots.current().version == 2
+        assert len(service.current_graph()) == 2
+    finally:
+        service.stop()
@@ -0,0 +1,120 @@
+import io
+import threading
+import time
+
+import pytest
+from rdflib import Graph
+
+from rdftool import rdfCode
+from rdftool.graph_backends import open_backend
+from rdftool.graph_generator import generate_graph
+from rdftool.graph_snapshot import ReadOnlyGraphError, SnapshotHolder
+from rdftool.rdfCode import load_graph
+from rdftool.schema import CONN
+
+READERS = 8
+PUBLISHES = 6
+
+@pytest.fixture(scope="module")
+def graph_path(tmp_path_factory):
+    text = io.StringIO()
+    generate_graph(text, 40, seed=5)
+    path = tmp_path_factory.mktemp("graph") / "graph.ttl"
+    path.write_text(text.getvalue(), encoding="utf-8")
+    return str(path)
+
+def lookups(graph):
+    problems = [str(p) for p in rdfCode.get_problems(graph)]
+    names = sorted({str(o) for _, _, o in graph.triples((None, CONN.model_name, None))})[:5]
+    calls = [(rdfCode.get_problems, ()), (rdfCode.get_cover_tags, ()), (rdfCode.get_all_metrics, ()),
+             (rdfCode.get_models_with_max_size, ())]
+    calls += [(rdfCode.get_models_for_problem, (p,)) for p in problems]
+    calls += [(rdfCode.search_metrics_for_problems, (problems,))]
+    calls += [(func, (n,)) for func in (rdfCode.get_model_details, rdfCode.find_metrics_by_model) for n in names]
+    return calls
+
+def answer(result, ordered):
+    # the same answer from any snapshot of the same file, whatever objects hold it; lookups without
+    # ORDER BY list in the order the graph was loaded in, which differs between loads
+    if isinstance(result, dict):
+        return sorted((str(key), answer(value, ordered)) for key, value in result.items())
+    if isinstance(result, (list, tuple, set)):
+        values = [answer(value, False) for value in result]
+        return values if ordered else sorted(values, key=repr)
+    return str(result)
+
+def ordered(func):
+    return func is rdfCode.get_models_for_problem
+
+@pytest.mark.parametrize("backend", ["rdflib", "oxigraph", "index"])
+def test_readers_get_the_same_answers_while_snapshots_are_swapped(graph_path, backend):
+    if backend == "oxigraph":
+        pytest.importorskip("pyoxigraph")
+    loaded = load_graph(graph_path)
+    snapshots = SnapshotHolder()
+    first = snapshots.publish(open_backend(loaded, backend))
+    calls = lookups(loaded)
+    expected = [answer(func(first.graph, *args), ordered(func)) for func, args in calls]
+    # built beforehand, so publishing is only the swap the readers race with
+    graphs = [open_backend(load_graph(graph_path), backend) for _ in range(PUBLISHES)]
+
+    published = threading.Event()
+    mismatches, errors, versions = [], [], set()
+
+    def reader(worker):
+        position = worker
+        # keep reading until the last snapshot is out, then once more through every lookup
+        for _ in range(2):
+            while not published.is_set() or position < len(calls) * 2:
+                # pinned for the whole lookup, as the node callbacks do
+                snapshot = snapshots.current()
+                versions.add(snapshot.version)
+                func, args = calls[position % len(calls)]
+                try:
+                    if answer(func(snapshot.graph, *args), ordered(func)) != expected[position % len(calls)]:
+                        mismatches.append((func.__name__, args, snapshot.version))
+                except Exception as e:
+                    errors.append((func.__name__, args, repr(e)))
+                position += READERS
+            position = worker
+
+    def publisher():
+        try:
+            for graph in graphs:
+                time.sleep(0.02)
+                snapshots.publish(graph)
+        except Exception as e:
+            errors.append(("publish", (), repr(e)))
+        finally:
+            published.set()
+
+    threads = [threading.Thread(target=reader, args=(worker,)) for worker in range(READERS)]
+    threads.append(threading.Thread(target=publisher))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=300)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert errors == []
+    assert mismatches == []
+    assert snapshots.current().version == PUBLISHES + 1
+    assert len(versions) > 1
+
+@pytest.mark.parametrize("backend", ["rdflib", "index"])
+@pytest.mark.parametrize("write", [
+    lambda graph: graph.add((CONN.Model, CONN.Model, CONN.Model)),
+    lambda graph: graph.remove((None, None, None)),
+    lambda graph: graph.parse(data="<urn:a> <urn:b> <urn:c> .", format="turtle"),
+    lambda graph: graph.__iadd__(Graph().parse(data="<urn:a> <urn:b> <urn:c> .", format="turtle")),
+    lambda graph: graph.__isub__(graph),
+], ids=["add", "remove", "parse", "+=", "-="])
+def test_published_graph_rejects_writes(graph_path, backend, write):
+    loaded = load_graph(graph_path)
+    triples = len(loaded)
+    snapshot = SnapshotHolder().publish(open_backend(loaded, backend))
+    # the index keeps the rdflib graph it answers from in .graph
+    graph = getattr(snapshot.graph, "graph", snapshot.graph)
+    with pytest.raises(ReadOnlyGraphError):
+        write(graph)
+    assert len(graph) == triples
@@ -0,0 +1,22 @@
+from rdflib import Graph, Literal
+
+from rdftool.query_cache import QueryCache
+
+def test_callers_cannot_change_a_cached_result():
+    cache = QueryCache()
+    calls = []
+
+    @cache.cached
+    def lookup(graph, problem):
+        calls.append(problem)
+        return {problem: {"model": [Literal("f1")], "pairs": [(Literal("model"), Literal(7))]}}
+
+    graph = Graph()
+    result = lookup(graph, "summarization")
+    result["summarization"]["model"].append("junk")
+    result["summarization"]["pairs"][0] = None
+    result["other"] = {}
+
+    assert lookup(graph, "summarization") == {
+        "summarization": {"model": [Literal("f1")], "pairs": [(Literal("model"), Literal(7))]}}
+    assert calls == ["summarization"]